@@ -1,15 +1,39 @@
 import os
 import requests
 import re # Adicionado para expressões regulares
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, stream_with_context
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
-from dados import extrair_dados_nota_fiscal, analisar_imagem_comprovante
+from dados import extrair_dados_nota_fiscal, extrair_chave_acesso, analisar_imagem_comprovante, estatisticas_cache_ocr, estatisticas_cache_categorias, registrar_armazenamento_categorias
+from dados import LISTA_DE_CATEGORIAS, CLASSIFICADOR_LIMIAR, categorizar_com_classificador_local
+from classificador import ClassificadorNaiveBayes, ClassificadorEmCamadas
+from recorrencia import matriz_custos_fixos, matriz_receitas, filtrar_do_mes, meses_do_intervalo, indice_do_mes, somar_por_mes, somar_por_grupo_e_mes
+from recorrencia import calendario_diario, distribuir_nos_dias
+from extratos import gerar_csv, gerar_ofx, ler_csv, ler_ofx, com_impressoes_digitais
+import numpy as np
 from datetime import datetime, timedelta, timezone, date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 import secrets
+import base64
+import json
+import uuid
+import random
+import calendar
+import codecs
+import csv
+import heapq
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cachetools import TTLCache, LRUCache
+import click
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql, sqlite
+import sqlite3
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
@@ -17,11 +41,116 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if not (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('sqlite'):
+    # Pool por processo: com workers gthread cada thread segura no máximo uma conexão, então o padrão
+    # acompanha GUNICORN_THREADS; o overflow cobre as threads dos jobs de OCR e do lote de NFC-e
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', os.getenv('GUNICORN_THREADS', '4'))),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '4')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+# Limite do corpo da requisição; o Werkzeug lê o upload em streaming e recusa com 413 ao ultrapassar
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', '10')) * 1024 * 1024
 db = SQLAlchemy(app)
+
+@event.listens_for(Engine, 'connect')
+def ativar_chaves_estrangeiras_sqlite(conexao_dbapi, registro_conexao):
+    # O SQLite só aplica ON DELETE CASCADE com foreign_keys ligado (no Postgres é sempre aplicado)
+    if isinstance(conexao_dbapi, sqlite3.Connection):
+        cursor = conexao_dbapi.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
 
+LIMITE_PADRAO_PAGINA = 100
+LIMITE_MAXIMO_PAGINA = 500
+TAMANHO_LOTE_STREAMING = 500
+TAMANHO_LOTE_INSERCAO = 1000
+TAMANHO_BLOCO_UPLOAD = 64 * 1024
+NFCE_LOTE_WORKERS = int(os.getenv('NFCE_LOTE_WORKERS', '4'))
+# A consulta é sempre montada a partir da chave de acesso validada, nunca com a URL enviada pelo cliente
+NFCE_URL_CONSULTA = os.getenv('NFCE_URL_CONSULTA', 'https://www.sefaz.rs.gov.br/NFCON/consultanfce.aspx?chNFe={chave}')
+MAXIMO_NOTAS_POR_LOTE = 100
+IMAGEM_MAX_BYTES = int(os.getenv('IMAGEM_MAX_MB', '8')) * 1024 * 1024
+EXTRATO_MAX_BYTES = int(os.getenv('EXTRATO_MAX_MB', '50')) * 1024 * 1024
+MAXIMO_ERROS_IMPORTACAO = 50
+MAXIMO_ITENS_POR_LOTE = 10000
+MAXIMO_MESES_SERIE = 120
+MAXIMO_MESES_PREVISAO = 60
+MAXIMO_MESES_HISTORICO = 24
+OCR_JOB_WORKERS = int(os.getenv('OCR_JOB_WORKERS', '2'))
+OCR_JOB_FILA = int(os.getenv('OCR_JOB_FILA', '8'))
+
+# Pool de processamento em segundo plano (por processo, criado sob demanda após o fork do gunicorn)
+_executor_jobs = None
+_executor_jobs_pid = None
+_executor_jobs_lock = threading.Lock()
+_vagas_jobs = threading.BoundedSemaphore(OCR_JOB_WORKERS + OCR_JOB_FILA)
+
+# Classificador local de categorias (por usuário e global), retreinado a cada CLASSIFICADOR_TTL segundos
+CATEGORIAS_TREINAVEIS = [c for c in LISTA_DE_CATEGORIAS if c != 'Não Categorizado']
+CLASSIFICADOR_TTL = int(os.getenv('CLASSIFICADOR_TTL', '600'))
+CLASSIFICADOR_MAX_EXEMPLOS_USUARIO = int(os.getenv('CLASSIFICADOR_MAX_EXEMPLOS_USUARIO', '5000'))
+CLASSIFICADOR_MAX_EXEMPLOS_GLOBAL = int(os.getenv('CLASSIFICADOR_MAX_EXEMPLOS_GLOBAL', '50000'))
+# O global (até 50 mil exemplos) tem cache próprio para não ser despejado pela rotatividade de usuários
+_classificadores = TTLCache(maxsize=256, ttl=CLASSIFICADOR_TTL)
+_classificador_global = TTLCache(maxsize=1, ttl=CLASSIFICADOR_TTL)
+_classificadores_lock = threading.Lock()
+_treinos_em_andamento = {}  # chave -> Lock: só uma thread treina cada modelo, as demais esperam por ele
+
+# Respostas serializadas das coleções com ETag (categorias, custos fixos, receitas), por (rota, usuário, ETag)
+ETAG_CACHE_TAMANHO = int(os.getenv('ETAG_CACHE_TAMANHO', '512'))
+_respostas_por_etag = LRUCache(maxsize=ETAG_CACHE_TAMANHO)
+_respostas_por_etag_lock = threading.Lock()
+_respostas_por_etag_contadores = {'hits': 0, 'misses': 0, 'nao_modificado': 0}
+USUARIO_CATALOGO_GLOBAL = 0  # user_id usado nas versões do catálogo global de categorias
+COLECOES_COM_ETAG = ('categorias', 'custos-fixos', 'receitas')
+
+# Hash de senhas: método/custo configuráveis (formato do werkzeug, ex.: 'scrypt:32768:8:1' ou
+# 'pbkdf2:sha256:600000') e, opcionalmente, execução em um pool de processos com fila limitada
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_PROCESSOS = int(os.getenv('PASSWORD_HASH_PROCESSOS', '0'))
+PASSWORD_HASH_FILA = int(os.getenv('PASSWORD_HASH_FILA', '16'))
+PASSWORD_HASH_ESPERA = float(os.getenv('PASSWORD_HASH_ESPERA', '5'))
+_pool_hash = None
+_pool_hash_pid = None
+_pool_hash_lock = threading.Lock()
+_vagas_hash = threading.BoundedSemaphore(PASSWORD_HASH_FILA)
+_metodo_hash_efetivo = None
+
+class FilaDeHashCheia(Exception):
+    pass
+
+def obter_pool_hash():
+    global _pool_hash, _pool_hash_pid
+    with _pool_hash_lock:
+        if _pool_hash is None or _pool_hash_pid != os.getpid():
+            # spawn: os processos de hash não herdam as threads/conexões do worker
+            _pool_hash = ProcessPoolExecutor(max_workers=PASSWORD_HASH_PROCESSOS, mp_context=multiprocessing.get_context('spawn'))
+            _pool_hash_pid = os.getpid()
+        return _pool_hash
+
+def executar_hash(funcao, *args):
+    if PASSWORD_HASH_PROCESSOS <= 0:
+        return funcao(*args)
+    if not _vagas_hash.acquire(timeout=PASSWORD_HASH_ESPERA):
+        raise FilaDeHashCheia()
+    try:
+        return obter_pool_hash().submit(funcao, *args).result()
+    finally:
+        _vagas_hash.release()
+
+def metodo_hash_efetivo():
+    # Prefixo que o werkzeug grava para o método configurado (com os parâmetros padrão preenchidos)
+    global _metodo_hash_efetivo
+    if _metodo_hash_efetivo is None:
+        _metodo_hash_efetivo = generate_password_hash('', PASSWORD_HASH_METHOD).split('$', 1)[0]
+    return _metodo_hash_efetivo
+
 # --- Modelos do Banco de Dados ---
 class User(db.Model):
     __tablename__ = 'users'
@@ -30,30 +159,34 @@ class User(db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     reset_token = db.Column(db.String(100), unique=True, nullable=True)
     reset_token_expiration = db.Column(db.DateTime(timezone=True), nullable=True)
-    compras = db.relationship('Compra', backref='user', lazy=True, cascade="all, delete-orphan")
-    custos_fixos = db.relationship('CustoFixo', backref='user', lazy=True, cascade="all, delete-orphan")
-    categorias = db.relationship('Categoria', backref='user', lazy=True, cascade="all, delete-orphan")
-    receitas = db.relationship('Receita', backref='user', lazy=True, cascade="all, delete-orphan")
-    def set_password(self, password): self.password_hash = generate_password_hash(password)
-    def check_password(self, password): return check_password_hash(self.password_hash, password)
+    compras = db.relationship('Compra', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    custos_fixos = db.relationship('CustoFixo', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    categorias = db.relationship('Categoria', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    receitas = db.relationship('Receita', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    gastos_mensais = db.relationship('GastoMensal', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    notas_importadas = db.relationship('NotaImportada', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    jobs = db.relationship('JobProcessamento', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    def set_password(self, password): self.password_hash = executar_hash(generate_password_hash, password, PASSWORD_HASH_METHOD)
+    def check_password(self, password): return executar_hash(check_password_hash, self.password_hash, password)
+    def precisa_rehash(self): return self.password_hash.split('$', 1)[0] != metodo_hash_efetivo()
 
 class Receita(db.Model):
     __tablename__ = 'receitas'
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.String(100), nullable=False)
-    valor = db.Column(db.Float, nullable=False)
+    valor = db.Column(db.Numeric(12, 2), nullable=False)
     tipo_recorrencia = db.Column(db.String(20), nullable=False) 
     dia_do_mes = db.Column(db.Integer, nullable=True)
     mes_de_inicio = db.Column(db.Integer, nullable=True)
     ano_de_inicio = db.Column(db.Integer, nullable=True)
     data_unica = db.Column(db.String(10), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     
     def to_dict(self):
         return {
             'id': self.id,
             'descricao': self.descricao,
-            'valor': self.valor,
+            'valor': float(self.valor),
             'tipoRecorrencia': self.tipo_recorrencia,
             'diaDoMes': self.dia_do_mes,
             'mesDeInicio': self.mes_de_inicio,
@@ -65,28 +198,83 @@ class Compra(db.Model):
     __tablename__ = 'compras'
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
-    quantidade = db.Column(db.Float, nullable=False)
-    valor_unitario = db.Column(db.Float, nullable=False)
-    data = db.Column(db.String(10), nullable=False)
+    quantidade = db.Column(db.Numeric(12, 3), nullable=False)
+    valor_unitario = db.Column(db.Numeric(12, 2), nullable=False)
+    data = db.Column(db.Date, nullable=False)
     categoria = db.Column(db.String(50))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # sha256 do lançamento de extrato importado (data, valor, descrição, ocorrência); nulo nas demais compras
+    fingerprint = db.Column(db.String(64))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    __table_args__ = (db.Index('ix_compras_user_id_data', 'user_id', 'data'),
+                      db.Index('ix_compras_user_id_fingerprint', 'user_id', 'fingerprint', unique=True))
     def to_dict(self):
-        return {'id': self.id, 'nome': self.nome, 'quantidade': self.quantidade, 'valorUnitario': self.valor_unitario, 'data': self.data, 'categoria': self.categoria}
+        return {'id': self.id, 'nome': self.nome, 'quantidade': float(self.quantidade), 'valorUnitario': float(self.valor_unitario), 'data': self.data.strftime('%d/%m/%Y'), 'categoria': self.categoria}
+
+class GastoMensal(db.Model):
+    # Totais de compras variáveis por (usuário, ano, mês, categoria), mantidos na mesma transação das compras
+    __tablename__ = 'gastos_mensais'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    ano = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Integer, primary_key=True)
+    categoria = db.Column(db.String(50), primary_key=True)
+    # Soma exata de quantidade * valor_unitario (3 + 2 casas decimais)
+    total = db.Column(db.Numeric(16, 5), nullable=False, default=0)
+
+class JobProcessamento(db.Model):
+    # Processamento assíncrono de comprovantes; o estado fica no banco para qualquer worker responder
+    __tablename__ = 'jobs_processamento'
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    resultado = db.Column(db.Text, nullable=True)
+    erro = db.Column(db.String(255), nullable=True)
+    criado_em = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    atualizado_em = db.Column(db.DateTime(timezone=True), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    def to_dict(self):
+        return {
+            'id': self.id, 'status': self.status,
+            'resultado': json.loads(self.resultado) if self.resultado else None,
+            'erro': self.erro,
+            'criadoEm': self.criado_em.isoformat(),
+            'atualizadoEm': self.atualizado_em.isoformat() if self.atualizado_em else None
+        }
+
+class NotaImportada(db.Model):
+    # Chaves de acesso já importadas por usuário (evita importar a mesma NFC-e duas vezes)
+    __tablename__ = 'notas_importadas'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    chave = db.Column(db.String(44), primary_key=True)
+    importada_em = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+class ClassificacaoCache(db.Model):
+    # Camada persistente do cache de categorias/tipos de estabelecimento usado por dados.py
+    __tablename__ = 'cache_classificacoes'
+    chave = db.Column(db.String(200), primary_key=True)
+    contexto = db.Column(db.String(200), primary_key=True)
+    valor = db.Column(db.String(100), nullable=False)
+
+class VersaoColecao(db.Model):
+    # Contador por (usuário, coleção) incrementado a cada escrita: é a ETag das rotas GET.
+    # Sem FK de propósito: user_id 0 é o catálogo global e a contagem sobrevive à exclusão da conta
+    __tablename__ = 'versoes_colecoes'
+    user_id = db.Column(db.Integer, primary_key=True)
+    colecao = db.Column(db.String(30), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
 
 class CustoFixo(db.Model):
     __tablename__ = 'custos_fixos'
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
-    valor = db.Column(db.Float, nullable=False)
+    valor = db.Column(db.Numeric(12, 2), nullable=False)
     categoria = db.Column(db.String(50), nullable=False)
     tipo_recorrencia = db.Column(db.String(20), nullable=False)
     dia_do_mes = db.Column(db.Integer, nullable=False)
     mes_de_inicio = db.Column(db.Integer, nullable=False, default=1)
     ano_de_inicio = db.Column(db.Integer, nullable=False, server_default='2025')
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     def to_dict(self):
         return {
-            'id': self.id, 'nome': self.nome, 'valor': self.valor, 'categoria': self.categoria,
+            'id': self.id, 'nome': self.nome, 'valor': float(self.valor), 'categoria': self.categoria,
             'tipoRecorrencia': self.tipo_recorrencia, 'diaDoMes': self.dia_do_mes,
             'mesDeInicio': self.mes_de_inicio,
             'anoDeInicio': self.ano_de_inicio
@@ -97,14 +285,86 @@ class Categoria(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     pictogram = db.Column(db.Integer, nullable=False)
-    parent_id = db.Column(db.Integer, db.ForeignKey('categorias.id'), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    subcategorias = db.relationship('Categoria', backref=db.backref('parent', remote_side=[id]), cascade="all, delete-orphan")
+    parent_id = db.Column(db.Integer, db.ForeignKey('categorias.id', ondelete='CASCADE'), nullable=True)
+    # user_id nulo = categoria do catálogo global; origem_id/oculta = cópia ou ocultação de uma global pelo usuário
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    origem_id = db.Column(db.Integer, db.ForeignKey('categorias.id', ondelete='SET NULL'), nullable=True)
+    oculta = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    subcategorias = db.relationship('Categoria', backref=db.backref('parent', remote_side=[id]), foreign_keys=[parent_id], cascade="all, delete-orphan", passive_deletes=True)
     def to_dict(self):
-        return {'id': self.id, 'nome': self.nome, 'pictogram': self.pictogram, 'parentId': self.parent_id}
+        return {'id': self.id, 'nome': self.nome, 'pictogram': self.pictogram, 'parentId': self.parent_id, 'global': self.user_id is None}
+
 
+CATEGORIAS_PADRAO = [
+    {'nome': 'Alimentação', 'pictogram': 0xe25a}, {'nome': 'Assinaturas e serviços', 'pictogram': 0xe638},
+    {'nome': 'Bares e restaurantes', 'pictogram': 0xe37a}, {'nome': 'Carro', 'pictogram': 0xe1d7},
+    {'nome': 'Casa', 'pictogram': 0xe318}, {'nome': 'Compras', 'pictogram': 0xe59c},
+    {'nome': 'Cuidados pessoais', 'pictogram': 0xeaae}, {'nome': 'Dívidas e empréstimos', 'pictogram': 0xe424},
+    {'nome': 'Educação', 'pictogram': 0xea3c}, {'nome': 'Família e filhos', 'pictogram': 0xe23a},
+    {'nome': 'Impostos e Taxas', 'pictogram': 0xe03f}, {'nome': 'Investimentos', 'pictogram': 0xe67d},
+    {'nome': 'Lazer e hobbies', 'pictogram': 0xe13d}, {'nome': 'Mercado', 'pictogram': 0xe59c},
+    {'nome': 'Outros', 'pictogram': 0xe148}, {'nome': 'Pets', 'pictogram': 0xe4a1},
+    {'nome': 'Presentes e doações', 'pictogram': 0xe503}, {'nome': 'Roupas', 'pictogram': 0xe15f},
+    {'nome': 'Saúde', 'pictogram': 0xe38e}, {'nome': 'Trabalho', 'pictogram': 0xe6e9},
+    {'nome': 'Transporte', 'pictogram': 0xe1d5}, {'nome': 'Viagem', 'pictogram': 0xe071},
+]
+# Com CATEGORIAS_GLOBAIS=1 o cadastro não copia o catálogo: todos leem as globais (flask criar-categorias-globais)
+CATEGORIAS_GLOBAIS = os.getenv('CATEGORIAS_GLOBAIS', '0') == '1'
 
 # --- FUNÇÕES AUXILIARES ---
+def converter_data_br(data_str):
+    # Converte 'dd/mm/yyyy' para date; retorna None se o formato for inválido
+    try:
+        return datetime.strptime(data_str, '%d/%m/%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+def para_decimal(valor, casas=2):
+    # Valores do JSON (float/str) para Decimal exato com as casas da coluna; levanta ValueError se inválido
+    try:
+        return Decimal(str(valor)).quantize(Decimal(1).scaleb(-casas), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, TypeError) as erro:
+        raise ValueError(valor) from erro
+
+def cabe_na_coluna(valor, coluna):
+    # Numeric(p, s) guarda valores menores que 10^(p-s) em módulo (12,2 -> 10 bilhões); NaN não cabe
+    return valor.is_finite() and abs(valor) < Decimal(10) ** (coluna.type.precision - coluna.type.scale)
+
+def valor_monetario(valor):
+    # Decimal (somado exato no banco/Python) para o float de 2 casas que vai no JSON
+    return float(para_decimal(valor))
+
+def converter_mes_ano(texto):
+    # Converte 'MM/YYYY' para (mes, ano); retorna None se o formato for inválido
+    try:
+        data_mes = datetime.strptime(texto, '%m/%Y')
+    except (TypeError, ValueError):
+        return None
+    return data_mes.month, data_mes.year
+
+def centavos(valor):
+    # Valor Numeric(…, 2) em centavos inteiros, para somar em vetores NumPy sem erro de ponto flutuante
+    return int(para_decimal(valor) * 100)
+
+def dia_de_vencimento_receita(receita):
+    # Receita única cai no dia de data_unica; as recorrentes, em dia_do_mes (1 se não informado)
+    if receita.tipo_recorrencia == 'unico':
+        data_unica = converter_data_br(receita.data_unica)
+        return data_unica.day if data_unica else 1
+    return receita.dia_do_mes or 1
+
+def intervalo_do_mes(mes, ano):
+    # Intervalo semiaberto [inicio, fim) usado nos filtros por mês (aproveita o índice (user_id, data))
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fim
+
+def filtro_compras_do_mes(user_id, mes, ano):
+    inicio, fim = intervalo_do_mes(mes, ano)
+    return (Compra.user_id == user_id, Compra.data >= inicio, Compra.data < fim)
+
+# deve_incluir_custo_fixo/deve_incluir_receita avaliam um modelo em um mês; as rotas usam o
+# motor vetorizado de recorrencia.py, que deve produzir exatamente o mesmo resultado.
 def deve_incluir_custo_fixo(custo, mes_alvo, ano_alvo):
     data_inicio = date(custo.ano_de_inicio, custo.mes_de_inicio, 1)
     data_alvo = date(ano_alvo, mes_alvo, 1)
@@ -141,6 +401,136 @@ def deve_incluir_receita(receita, mes_alvo, ano_alvo):
         return meses_de_diferenca % 12 == 0
     return False
 
+def categoria_ou_padrao(categoria):
+    return categoria if categoria else 'Não Categorizado'
+
+def insert_com_upsert(modelo):
+    # INSERT ... ON CONFLICT do dialeto em uso (Postgres em produção, SQLite em desenvolvimento)
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(modelo)
+    return sqlite.insert(modelo)
+
+def incrementar_versao(user_id, colecao):
+    # Na mesma transação da escrita: a nova ETag só fica visível junto com os dados
+    stmt = insert_com_upsert(VersaoColecao).values(user_id=user_id, colecao=colecao, versao=1)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'colecao'], set_={'versao': VersaoColecao.versao + 1}))
+
+def responder_com_etag(nome, user_id, colecao, montar_dados, incluir_global=False):
+    # Só lê o contador (consulta por chave primária); a coleção é consultada apenas se a ETag mudou
+    # e o payload não estiver no cache do processo
+    usuarios = [user_id, USUARIO_CATALOGO_GLOBAL] if incluir_global else [user_id]
+    versoes = dict(db.session.execute(db.select(VersaoColecao.user_id, VersaoColecao.versao)
+                                      .where(VersaoColecao.user_id.in_(usuarios), VersaoColecao.colecao == colecao)).all())
+    etag = '-'.join([nome] + [str(versoes.get(u, 0)) for u in usuarios])
+    if request.if_none_match.contains(etag):
+        with _respostas_por_etag_lock:
+            _respostas_por_etag_contadores['nao_modificado'] += 1
+        resposta = app.response_class(status=304)
+    else:
+        chave = (nome, user_id, etag)
+        with _respostas_por_etag_lock:
+            corpo = _respostas_por_etag.get(chave)
+            _respostas_por_etag_contadores['hits' if corpo is not None else 'misses'] += 1
+        if corpo is None:
+            corpo = app.json.dumps(montar_dados())
+            with _respostas_por_etag_lock:
+                _respostas_por_etag[chave] = corpo
+        resposta = app.response_class(corpo, mimetype='application/json')
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+def acumular_gasto_mensal(deltas, data_compra, categoria, valor):
+    chave = (data_compra.year, data_compra.month, categoria_ou_padrao(categoria))
+    deltas[chave] = deltas.get(chave, 0) + valor
+
+def registrar_gastos_mensais(user_id, deltas):
+    # Aplica os deltas {(ano, mes, categoria): valor} em gastos_mensais dentro da transação corrente
+    if not deltas: return
+    stmt = insert_com_upsert(GastoMensal)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'ano', 'mes', 'categoria'],
+        set_={'total': GastoMensal.total + stmt.excluded.total}
+    )
+    db.session.execute(stmt, [
+        {'user_id': user_id, 'ano': ano, 'mes': mes, 'categoria': categoria, 'total': valor}
+        for (ano, mes, categoria), valor in deltas.items()
+    ])
+
+def validar_item_compra(item):
+    # Valida um item de compra vindo do cliente; retorna (valores_da_linha, mensagem_de_erro)
+    if not isinstance(item, dict) or not all(k in item for k in ['nome', 'quantidade', 'valor_unitario', 'data']):
+        return None, 'Dados da compra estão incompletos.'
+    if not isinstance(item['nome'], str) or not item['nome'].strip():
+        return None, 'Nome inválido.'
+    try:
+        quantidade, valor_unitario = para_decimal(item['quantidade'], 3), para_decimal(item['valor_unitario'])
+    except ValueError:
+        return None, 'Quantidade e valor unitário devem ser numéricos.'
+    if not (cabe_na_coluna(quantidade, Compra.quantidade) and cabe_na_coluna(valor_unitario, Compra.valor_unitario)
+            and cabe_na_coluna(quantidade * valor_unitario, GastoMensal.total)):
+        return None, 'Quantidade ou valor unitário fora do intervalo permitido.'
+    data_compra = converter_data_br(item['data'])
+    if not data_compra:
+        return None, 'Data inválida, use o formato dd/mm/aaaa.'
+    categoria = item.get('categoria')
+    if categoria is not None and (not isinstance(categoria, str) or len(categoria) > Compra.categoria.type.length):
+        return None, f'Categoria inválida (texto de até {Compra.categoria.type.length} caracteres).'
+    return {'nome': item['nome'].strip()[:100], 'quantidade': quantidade, 'valor_unitario': valor_unitario,
+            'data': data_compra, 'categoria': categoria}, None
+
+def inserir_compras_em_lote(user_id, linhas):
+    # INSERT em lotes (executemany/insertmanyvalues) na transação corrente; retorna os ids na ordem das linhas
+    ids = []
+    deltas = {}
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_INSERCAO):
+        lote = [dict(linha, user_id=user_id) for linha in linhas[inicio:inicio + TAMANHO_LOTE_INSERCAO]]
+        resultado = db.session.execute(db.insert(Compra).returning(Compra.id, sort_by_parameter_order=True), lote)
+        ids.extend(resultado.scalars().all())
+    for linha in linhas:
+        acumular_gasto_mensal(deltas, linha['data'], linha['categoria'], linha['quantidade'] * linha['valor_unitario'])
+    registrar_gastos_mensais(user_id, deltas)
+    return ids
+
+def importar_lote_de_extrato(user_id, lancamentos, categorias_validas):
+    # Categoriza o lote de uma vez e insere ignorando impressões digitais já importadas; retorna quantas entraram
+    linhas = [{
+        'nome': (lancamento['descricao'] or 'Lançamento sem descrição')[:100], 'quantidade': para_decimal(lancamento['quantidade'], 3),
+        'valor_unitario': para_decimal(lancamento['valor_unitario']), 'data': lancamento['data'], 'fingerprint': lancamento['fingerprint'],
+        'categoria': lancamento['categoria'] if lancamento['categoria'] in categorias_validas else None, 'user_id': user_id,
+    } for lancamento in lancamentos]
+    sugerir_categorias_locais(user_id, linhas)
+    stmt = insert_com_upsert(Compra).on_conflict_do_nothing(index_elements=['user_id', 'fingerprint'])
+    inseridas = db.session.execute(stmt.returning(Compra.data, Compra.categoria, Compra.quantidade, Compra.valor_unitario), linhas).all()
+    deltas = {}
+    for data_compra, categoria, quantidade, valor_unitario in inseridas:
+        acumular_gasto_mensal(deltas, data_compra, categoria, quantidade * valor_unitario)
+    registrar_gastos_mensais(user_id, deltas)
+    return len(inseridas)
+
+def linhas_de_itens_extraidos(dados_extraidos):
+    # Converte o resultado de dados.py em linhas de Compra, com os mesmos padrões usados antes
+    data_compra = converter_data_br(dados_extraidos.get('data')) or date.today()
+    return [{
+        'nome': item.get('nome', 'Item desconhecido'),
+        'quantidade': para_decimal(item.get('quantidade', 1.0), 3),
+        'valor_unitario': para_decimal(item.get('valor_unitario', 0.0)),
+        'data': data_compra,
+        'categoria': item.get('categoria'),
+    } for item in dados_extraidos['itens_comprados']]
+
+def calcular_gastos_mensais_das_compras(user_id=None):
+    # Recalcula os totais a partir das compras brutas (usado na verificação/reconstrução)
+    categoria = db.func.coalesce(db.func.nullif(Compra.categoria, ''), 'Não Categorizado')
+    ano = db.extract('year', Compra.data)
+    mes = db.extract('month', Compra.data)
+    consulta = db.session.query(
+        Compra.user_id, ano, mes, categoria, db.func.sum(Compra.quantidade * Compra.valor_unitario)
+    ).group_by(Compra.user_id, ano, mes, categoria)
+    if user_id is not None:
+        consulta = consulta.filter(Compra.user_id == user_id)
+    return {(u, int(a), int(m), c): total for u, a, m, c, total in consulta}
+
 def send_password_reset_email(user):
     token = secrets.token_urlsafe(32)
     user.reset_token = token
@@ -158,26 +548,282 @@ def send_password_reset_email(user):
     except Exception as e:
         print(f"Erro ao enviar email pelo SendGrid: {e}")
 
-def calcular_gastos_do_mes(user_id, mes, ano):
-    total_variavel = 0
-    total_fixo = 0
-    mes_ano_str = f"{mes:02d}/{ano}"
-    compras_variaveis = Compra.query.filter(
-        Compra.user_id == user_id,
-        Compra.data.like(f"%/{mes_ano_str}")
-    ).all()
-    for compra in compras_variaveis:
-        total_variavel += compra.quantidade * compra.valor_unitario
-    custos_fixos_todos = CustoFixo.query.filter_by(user_id=user_id).all()
-    for custo in custos_fixos_todos:
-        if deve_incluir_custo_fixo(custo, mes, ano):
-            total_fixo += custo.valor
-    return total_variavel, total_fixo
+def projetar_custos_fixos(custos_fixos, mes, ano):
+    # Custos fixos do mês no formato de compra (id negativo, marcados como "(Fixo)")
+    compras_de_custos_fixos = []
+    for custo in filtrar_do_mes(custos_fixos, matriz_custos_fixos(custos_fixos, [(mes, ano)])):
+        compras_de_custos_fixos.append({
+            'id': -custo.id, 'nome': f"{custo.nome} (Fixo)", 'quantidade': 1,
+            'valorUnitario': float(custo.valor), 'data': f"{custo.dia_do_mes:02d}/{mes:02d}/{ano}",
+            'categoria': custo.categoria
+        })
+    return compras_de_custos_fixos
+
+def ocorrencias_de_custos_fixos(custos_fixos, inicio, fim):
+    # Registros de extrato dos custos fixos entre duas datas, em ordem de data (uma matriz para o período)
+    meses = meses_do_intervalo(inicio.month, inicio.year, fim.month, fim.year)
+    matriz = matriz_custos_fixos(custos_fixos, meses)
+    ocorrencias = []
+    for coluna, (mes, ano) in enumerate(meses):
+        ultimo_dia = calendar.monthrange(ano, mes)[1]
+        for custo in filtrar_do_mes(custos_fixos, matriz, coluna):
+            data_custo = date(ano, mes, min(custo.dia_do_mes, ultimo_dia))
+            if inicio <= data_custo <= fim:
+                ocorrencias.append({
+                    'id': f"F{custo.id}-{ano}{mes:02d}", 'data': data_custo, 'descricao': f"{custo.nome} (Fixo)",
+                    'categoria': custo.categoria, 'quantidade': 1, 'valor_unitario': custo.valor, 'valor': custo.valor, 'tipo': 'fixo',
+                })
+    ocorrencias.sort(key=lambda registro: registro['data'])
+    return ocorrencias
+
+def codificar_cursor(compra):
+    return base64.urlsafe_b64encode(f"{compra.data.isoformat()}|{compra.id}".encode()).decode()
+
+def decodificar_cursor(cursor):
+    # Retorna (data, id) da última compra da página anterior, ou None se o cursor for inválido
+    try:
+        data_str, id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return date.fromisoformat(data_str), int(id_str)
+    except ValueError:
+        return None
+
+def chave_acesso_valida(chave_acesso):
+    return bool(chave_acesso) and isinstance(chave_acesso, str) and len(chave_acesso) == 44 and chave_acesso.isdigit()
+
+def url_consulta_nfce(chave_acesso):
+    return NFCE_URL_CONSULTA.format(chave=chave_acesso)
+
+def registrar_notas_importadas(user_id, chaves):
+    # Grava as chaves ignorando as que já existem; retorna o conjunto efetivamente novo
+    if not chaves: return set()
+    stmt = insert_com_upsert(NotaImportada).on_conflict_do_nothing(index_elements=['user_id', 'chave']).returning(NotaImportada.chave)
+    agora = datetime.now(timezone.utc)
+    return set(db.session.execute(stmt, [{'user_id': user_id, 'chave': chave, 'importada_em': agora} for chave in chaves]).scalars())
+
+def categorias_visiveis(user_id):
+    # Uma consulta: categorias do usuário + globais que ele não sobrescreveu (por origem_id ou pelo
+    # mesmo nome na raiz, caso das contas criadas antes do catálogo global, que já têm as cópias)
+    todas = Categoria.query.filter(db.or_(Categoria.user_id == user_id, Categoria.user_id.is_(None))).all()
+    proprias = [c for c in todas if c.user_id is not None]
+    sobrescritas = {c.origem_id for c in proprias if c.origem_id}
+    nomes_proprios = {c.nome for c in proprias if c.parent_id is None}
+    globais = [c for c in todas if c.user_id is None and c.id not in sobrescritas
+               and not (c.parent_id is None and c.nome in nomes_proprios)]
+    return sorted([c for c in proprias if not c.oculta] + globais, key=lambda c: c.nome)
+
+def sobrescrever_categoria_global(categoria_global, user_id):
+    copia = Categoria.query.filter_by(user_id=user_id, origem_id=categoria_global.id).first()
+    if not copia:
+        copia = Categoria(nome=categoria_global.nome, pictogram=categoria_global.pictogram, parent_id=categoria_global.parent_id,
+                          origem_id=categoria_global.id, user_id=user_id)
+        db.session.add(copia)
+    copia.oculta = False
+    return copia
+
+def subarvore_de_categoria(*categoria_ids):
+    # SELECT dos ids das categorias e de todos os descendentes (CTE recursiva), usado em DELETE/UPDATE em massa
+    arvore = db.select(Categoria.id).where(Categoria.id.in_(categoria_ids)).cte('arvore', recursive=True)
+    arvore = arvore.union_all(db.select(Categoria.id).where(Categoria.parent_id == arvore.c.id))
+    return db.select(arvore.c.id)
+
+def montar_arvore_de_categorias(categorias):
+    # Monta a hierarquia em memória a partir da lista já carregada. Filhos de uma global que o usuário
+    # copiou passam para a cópia; filhos de uma categoria oculta somem junto com ela
+    copias = {c.origem_id: c.id for c in categorias if c.origem_id}
+    nos = {c.id: dict(c.to_dict(), subcategorias=[]) for c in categorias}
+    raizes = []
+    for c in categorias:
+        no = nos[c.id]
+        no['parentId'] = copias.get(c.parent_id, c.parent_id)
+        if no['parentId'] is None:
+            raizes.append(no)
+        elif no['parentId'] in nos:
+            nos[no['parentId']]['subcategorias'].append(no)
+    return raizes
+
+def ler_arquivo_limitado(arquivo, limite):
+    # Lê o upload em blocos e desiste assim que passar do limite (retorna None)
+    partes, total = [], 0
+    while True:
+        bloco = arquivo.stream.read(TAMANHO_BLOCO_UPLOAD)
+        if not bloco: break
+        total += len(bloco)
+        if total > limite: return None
+        partes.append(bloco)
+    return b''.join(partes)
+
+def obter_executor_jobs():
+    global _executor_jobs, _executor_jobs_pid
+    with _executor_jobs_lock:
+        if _executor_jobs is None or _executor_jobs_pid != os.getpid():
+            _executor_jobs = ThreadPoolExecutor(max_workers=OCR_JOB_WORKERS, thread_name_prefix='ocr-job')
+            _executor_jobs_pid = os.getpid()
+        return _executor_jobs
+
+def salvar_dados_extraidos(user_id, dados_extraidos):
+    # Persiste o resultado de analisar_imagem_comprovante; retorna (corpo_da_resposta, status_http)
+    if not dados_extraidos:
+        return {'erro': 'Não foi possível extrair dados da imagem.'}, 500
+
+    # Verifica se a função encontrou uma chave de acesso DANFE
+    if dados_extraidos.get('tipo') == 'danfe_chave':
+        chave_acesso = dados_extraidos.get('chave')
+        print(f"Chave de acesso encontrada via Google Vision: {chave_acesso}")
+        
+        # Gera a URL da Sefaz e retorna para o app
+        url_consulta = url_consulta_nfce(chave_acesso)
+        return {'url_danfe': url_consulta}, 200
+    
+    # Se não era uma chave, então deve ser uma lista de itens de compra
+    elif dados_extraidos.get('itens_comprados'):
+        print("Analisando como comprovante de compras comum...")
+        sugerir_categorias_locais(user_id, dados_extraidos['itens_comprados'])
+        inserir_compras_em_lote(user_id, linhas_de_itens_extraidos(dados_extraidos))
+        db.session.commit()
+        return dados_extraidos, 200
+
+    # Se chegou até aqui, a imagem não continha nem uma chave nem itens válidos
+    return {'erro': 'Não foi possível identificar uma chave DANFE ou itens de compra na imagem.'}, 422
+
+def atualizar_job(job_id, **campos):
+    job = db.session.get(JobProcessamento, job_id)
+    if not job:
+        return  # conta excluída enquanto o job rodava
+    for campo, valor in campos.items():
+        setattr(job, campo, valor)
+    job.atualizado_em = datetime.now(timezone.utc)
+    db.session.commit()
+
+def executar_job_ocr(job_id, user_id, conteudo_imagem):
+    # Roda em uma thread do pool: mesmo pipeline da rota síncrona, com o resultado gravado no job
+    try:
+        with app.app_context():
+            try:
+                atualizar_job(job_id, status='processando')
+                resposta, status = salvar_dados_extraidos(user_id, analisar_imagem_comprovante(conteudo_imagem))
+                if status == 200:
+                    atualizar_job(job_id, status='concluido', resultado=json.dumps(resposta))
+                else:
+                    atualizar_job(job_id, status='erro', erro=resposta['erro'])
+            except Exception as e:
+                print(f"### ERRO no job de OCR {job_id}: {e} ###")
+                db.session.rollback()
+                atualizar_job(job_id, status='erro', erro='Erro interno ao processar a imagem.')
+    finally:
+        _vagas_jobs.release()
+
+class ArmazenamentoCategoriasBanco:
+    # Usa conexões próprias (fora da transação da requisição) e funciona também nas threads de jobs
+    def buscar(self, chaves):
+        with app.app_context(), db.engine.connect() as conexao:
+            linhas = conexao.execute(db.select(ClassificacaoCache.chave, ClassificacaoCache.contexto, ClassificacaoCache.valor).where(
+                db.tuple_(ClassificacaoCache.chave, ClassificacaoCache.contexto).in_(chaves)
+            ))
+            return {(chave, contexto): valor for chave, contexto, valor in linhas}
+
+    def guardar(self, novas):
+        with app.app_context(), db.engine.begin() as conexao:
+            stmt = insert_com_upsert(ClassificacaoCache)
+            stmt = stmt.on_conflict_do_update(index_elements=['chave', 'contexto'], set_={'valor': stmt.excluded.valor})
+            conexao.execute(stmt, [
+                {'chave': chave, 'contexto': contexto, 'valor': valor[:100]}
+                for (chave, contexto), valor in novas.items()
+            ])
+
+registrar_armazenamento_categorias(ArmazenamentoCategoriasBanco())
+
+def exemplos_rotulados(user_id=None, limite=None):
+    # Pares (nome, categoria) mais recentes com categoria conhecida
+    consulta = db.session.query(Compra.nome, Compra.categoria).filter(Compra.categoria.in_(CATEGORIAS_TREINAVEIS))
+    if user_id is not None:
+        consulta = consulta.filter(Compra.user_id == user_id)
+    return consulta.order_by(Compra.id.desc()).limit(limite).all()
+
+def obter_classificador(user_id):
+    def obter(cache, chave, carregar_exemplos):
+        with _classificadores_lock:
+            classificador = cache.get(chave)
+            if classificador is not None: return classificador
+            treino = _treinos_em_andamento.setdefault(chave, threading.Lock())
+        with treino:
+            # Quem esperou o treino de outra thread encontra o modelo pronto no cache
+            with _classificadores_lock:
+                classificador = cache.get(chave)
+            if classificador is None:
+                classificador = ClassificadorNaiveBayes(CATEGORIAS_TREINAVEIS).treinar(carregar_exemplos())
+                with _classificadores_lock:
+                    cache[chave] = classificador
+                    _treinos_em_andamento.pop(chave, None)
+        return classificador
+    do_usuario = obter(_classificadores, ('usuario', user_id), lambda: exemplos_rotulados(user_id, CLASSIFICADOR_MAX_EXEMPLOS_USUARIO))
+    global_ = obter(_classificador_global, ('global',), lambda: exemplos_rotulados(limite=CLASSIFICADOR_MAX_EXEMPLOS_GLOBAL))
+    return ClassificadorEmCamadas([do_usuario, global_], CLASSIFICADOR_LIMIAR)
+
+def sugerir_categorias_locais(user_id, itens):
+    # Preenche itens sem categoria com o classificador local, quando a previsão é confiante
+    sem_categoria = [item for item in itens if item.get('categoria') in (None, '', 'Não Categorizado')]
+    if not sem_categoria: return
+    previstas = categorizar_com_classificador_local([item.get('nome', '') for item in sem_categoria], obter_classificador(user_id))
+    for item in sem_categoria:
+        if item.get('nome', '') in previstas:
+            item['categoria'] = previstas[item.get('nome', '')]
+
+def memoizar_na_requisicao(chave, carregar):
+    # Cache com escopo de requisição (flask.g): cada conjunto de dados do usuário é lido uma única vez
+    cache = g.setdefault('cache_requisicao', {})
+    if chave not in cache:
+        cache[chave] = carregar()
+    return cache[chave]
+
+def carregar_custos_fixos(user_id):
+    return memoizar_na_requisicao(('custos_fixos', user_id), lambda: CustoFixo.query.filter_by(user_id=user_id).all())
+
+def carregar_receitas(user_id):
+    return memoizar_na_requisicao(('receitas', user_id), lambda: Receita.query.filter_by(user_id=user_id).all())
+
+def carregar_gastos_variaveis(user_id, meses):
+    # Um único SELECT agrupado de gastos_mensais para todos os meses pedidos: {(mes, ano): total}
+    def carregar():
+        totais = {(mes, ano): 0 for mes, ano in meses}
+        linhas = db.session.query(GastoMensal.mes, GastoMensal.ano, db.func.sum(GastoMensal.total)).filter(
+            GastoMensal.user_id == user_id,
+            db.tuple_(GastoMensal.mes, GastoMensal.ano).in_(meses)
+        ).group_by(GastoMensal.mes, GastoMensal.ano)
+        for mes, ano, total in linhas:
+            totais[(mes, ano)] = total
+        return totais
+    return memoizar_na_requisicao(('gastos_variaveis', user_id, tuple(meses)), carregar)
+
+def calcular_gastos_dos_meses(user_id, meses):
+    # Retorna {(mes, ano): (total_variavel, total_fixo)} com uma leitura de cada tabela
+    totais_variaveis = carregar_gastos_variaveis(user_id, meses)
+    custos_fixos_todos = carregar_custos_fixos(user_id)
+    matriz = matriz_custos_fixos(custos_fixos_todos, meses)
+    resultado = {}
+    for coluna, mes_ano in enumerate(meses):
+        total_fixo = sum(custo.valor for custo in filtrar_do_mes(custos_fixos_todos, matriz, coluna))
+        resultado[mes_ano] = (totais_variaveis[mes_ano], total_fixo)
+    return resultado
 
 # --- ROTAS ---
+@app.errorhandler(FilaDeHashCheia)
+def fila_de_hash_cheia(erro):
+    return jsonify({'erro': 'Servidor ocupado, tente novamente em instantes.'}), 503
+
+@app.errorhandler(413)
+def corpo_muito_grande(erro):
+    return jsonify({'erro': 'Arquivo ou requisição excede o tamanho máximo permitido.'}), 413
+
 @app.route('/')
 def health_check(): return jsonify({"status": "healthy"}), 200
 
+@app.route('/metricas/cache', methods=['GET'])
+@jwt_required()
+def get_metricas_cache():
+    with _respostas_por_etag_lock:
+        etag = dict(_respostas_por_etag_contadores, entradas=len(_respostas_por_etag))
+    return jsonify({'ocr': estatisticas_cache_ocr(), 'categorias': estatisticas_cache_categorias(), 'etag': etag}), 200
+
 # ROTAS DE AUTENTICAÇÃO E USUÁRIO
 @app.route('/register', methods=['POST'])
 def register():
@@ -188,23 +834,11 @@ def register():
     new_user = User(email=email)
     new_user.set_password(password)
     db.session.add(new_user)
-    db.session.commit()
-    categorias_padrao = [
-        {'nome': 'Alimentação', 'pictogram': 0xe25a}, {'nome': 'Assinaturas e serviços', 'pictogram': 0xe638},
-        {'nome': 'Bares e restaurantes', 'pictogram': 0xe37a}, {'nome': 'Carro', 'pictogram': 0xe1d7},
-        {'nome': 'Casa', 'pictogram': 0xe318}, {'nome': 'Compras', 'pictogram': 0xe59c},
-        {'nome': 'Cuidados pessoais', 'pictogram': 0xeaae}, {'nome': 'Dívidas e empréstimos', 'pictogram': 0xe424},
-        {'nome': 'Educação', 'pictogram': 0xea3c}, {'nome': 'Família e filhos', 'pictogram': 0xe23a},
-        {'nome': 'Impostos e Taxas', 'pictogram': 0xe03f}, {'nome': 'Investimentos', 'pictogram': 0xe67d},
-        {'nome': 'Lazer e hobbies', 'pictogram': 0xe13d}, {'nome': 'Mercado', 'pictogram': 0xe59c},
-        {'nome': 'Outros', 'pictogram': 0xe148}, {'nome': 'Pets', 'pictogram': 0xe4a1},
-        {'nome': 'Presentes e doações', 'pictogram': 0xe503}, {'nome': 'Roupas', 'pictogram': 0xe15f},
-        {'nome': 'Saúde', 'pictogram': 0xe38e}, {'nome': 'Trabalho', 'pictogram': 0xe6e9},
-        {'nome': 'Transporte', 'pictogram': 0xe1d5}, {'nome': 'Viagem', 'pictogram': 0xe071},
-    ]
-    for cat_data in categorias_padrao:
-        nova_cat = Categoria(nome=cat_data['nome'], pictogram=cat_data['pictogram'], user_id=new_user.id)
-        db.session.add(nova_cat)
+    db.session.flush()
+    if not CATEGORIAS_GLOBAIS:
+        # Cópia do catálogo em um único INSERT, na mesma transação do usuário
+        db.session.execute(db.insert(Categoria), [dict(cat_data, user_id=new_user.id) for cat_data in CATEGORIAS_PADRAO])
+        incrementar_versao(new_user.id, 'categorias')
     db.session.commit()
     return jsonify({"mensagem": "Usuário criado com sucesso!"}), 201
 
@@ -214,6 +848,10 @@ def login():
     email, password = data.get('email'), data.get('password')
     user = User.query.filter_by(email=email).first()
     if user and user.check_password(password):
+        if user.precisa_rehash():
+            # Parâmetros de hash mudaram: aproveita a senha em claro do login para atualizar o hash
+            user.set_password(password)
+            db.session.commit()
         access_token = create_access_token(identity=str(user.id))
         return jsonify(access_token=access_token)
     return jsonify({"erro": "Credenciais inválidas"}), 401
@@ -245,6 +883,30 @@ def reset_password():
     db.session.commit()
     return jsonify({'mensagem': 'Senha redefinida com sucesso!'}), 200
 
+@app.route('/conta', methods=['DELETE'])
+@jwt_required()
+def delete_conta():
+    current_user_id = int(get_jwt_identity())
+    dados = request.get_json(silent=True) or {}
+    user = db.session.get(User, current_user_id)
+    if not user: return jsonify({'erro': 'Usuário não encontrado'}), 404
+    if not user.check_password(dados.get('password') or ''):
+        return jsonify({'erro': 'Senha incorreta'}), 401
+    # Um único DELETE: compras, categorias, receitas etc. saem pelo ON DELETE CASCADE do banco,
+    # sem o ORM carregar nenhuma linha filha
+    db.session.execute(db.delete(User).where(User.id == current_user_id).execution_options(synchronize_session=False))
+    # versoes_colecoes não tem FK e sobrevive à exclusão: avançar os contadores garante que uma conta nova
+    # com o mesmo id (o SQLite reaproveita) nunca receba a ETag, nem o cache de outro processo, da conta excluída
+    for colecao in COLECOES_COM_ETAG:
+        incrementar_versao(current_user_id, colecao)
+    db.session.commit()
+    with _classificadores_lock:
+        _classificadores.pop(('usuario', current_user_id), None)
+    with _respostas_por_etag_lock:
+        for chave in [chave for chave in _respostas_por_etag if chave[1] == current_user_id]:
+            del _respostas_por_etag[chave]
+    return jsonify({'mensagem': 'Conta excluída com sucesso'}), 200
+
 # ROTAS DE PROCESSAMENTO (QR CODE, IMAGEM, DANFE)
 @app.route('/processar_nota', methods=['POST'])
 @jwt_required()
@@ -252,16 +914,90 @@ def processar_nota_e_salvar():
     current_user_id = int(get_jwt_identity())
     link_nota = request.json.get('url')
     if not link_nota: return jsonify({'erro': 'URL da nota fiscal não fornecida.'}), 400
-    dados_extraidos = extrair_dados_nota_fiscal(link_nota)
+    chave_acesso = extrair_chave_acesso(link_nota) if isinstance(link_nota, str) else None
+    if not chave_acesso_valida(chave_acesso): return jsonify({'erro': 'A URL não contém uma chave de acesso válida.'}), 400
+    if db.session.get(NotaImportada, (current_user_id, chave_acesso)):
+        return jsonify({'erro': 'Esta nota fiscal já foi importada.'}), 409
+    dados_extraidos = extrair_dados_nota_fiscal(url_consulta_nfce(chave_acesso), obter_classificador(current_user_id))
     if dados_extraidos and dados_extraidos.get('itens_comprados'):
-        for item in dados_extraidos['itens_comprados']:
-            nova_compra = Compra(nome=item.get('nome', 'Item desconhecido'), quantidade=item.get('quantidade', 1.0), valor_unitario=item.get('valor_unitario', 0.0), data=dados_extraidos.get('data', datetime.now().strftime("%d/%m/%Y")), categoria=item.get('categoria'), user_id=current_user_id)
-            db.session.add(nova_compra)
+        chave_acesso = dados_extraidos.get('chave') or chave_acesso
+        if not registrar_notas_importadas(current_user_id, [chave_acesso]):
+            return jsonify({'erro': 'Esta nota fiscal já foi importada.'}), 409
+        inserir_compras_em_lote(current_user_id, linhas_de_itens_extraidos(dados_extraidos))
         db.session.commit()
         return jsonify(dados_extraidos)
     else:
         return jsonify({'erro': 'Não foi possível processar a nota fiscal.'}), 500
 
+@app.route('/processar_notas/lote', methods=['POST'])
+@jwt_required()
+def processar_notas_em_lote():
+    current_user_id = int(get_jwt_identity())
+    dados_req = request.get_json()
+    entradas = dados_req.get('notas') if isinstance(dados_req, dict) else None
+    if not isinstance(entradas, list) or not entradas: return jsonify({'erro': 'Envie uma lista de URLs ou chaves de acesso em "notas".'}), 400
+    if len(entradas) > MAXIMO_NOTAS_POR_LOTE: return jsonify({'erro': f'O lote aceita no máximo {MAXIMO_NOTAS_POR_LOTE} notas.'}), 413
+
+    # 1. Normaliza cada entrada em (chave, url), com a mesma validação de /gerar-link-danfe
+    resultados, a_buscar = [], {}
+    for entrada in entradas:
+        texto = entrada.strip() if isinstance(entrada, str) else ''
+        chave_acesso = texto if chave_acesso_valida(texto) else (extrair_chave_acesso(texto) if texto.startswith('http') else None)
+        resultado = {'entrada': entrada, 'chave': chave_acesso}
+        resultados.append(resultado)
+        if not chave_acesso_valida(chave_acesso):
+            resultado['status'] = 'invalida'
+        elif chave_acesso in a_buscar:
+            resultado['status'] = 'duplicada'
+        else:
+            # A URL do cliente só serve para extrair a chave; a consulta é sempre montada a partir dela
+            a_buscar[chave_acesso] = url_consulta_nfce(chave_acesso)
+
+    # 2. Descarta as chaves que o usuário já importou (uma consulta)
+    if a_buscar:
+        ja_importadas = set(db.session.execute(db.select(NotaImportada.chave).where(
+            NotaImportada.user_id == current_user_id, NotaImportada.chave.in_(list(a_buscar))
+        )).scalars())
+        for resultado in resultados:
+            if resultado.get('status') is None and resultado['chave'] in ja_importadas:
+                resultado['status'] = 'duplicada'
+        a_buscar = {chave: url for chave, url in a_buscar.items() if chave not in ja_importadas}
+
+    # 3. Consulta a SEFAZ em paralelo (pool limitado; dados.py espaça as requisições por host)
+    classificador = obter_classificador(current_user_id)
+    notas = {}
+    if a_buscar:
+        with ThreadPoolExecutor(max_workers=min(NFCE_LOTE_WORKERS, len(a_buscar))) as executor:
+            futuros = {chave: executor.submit(extrair_dados_nota_fiscal, url, classificador) for chave, url in a_buscar.items()}
+            for chave, futuro in futuros.items():
+                try:
+                    notas[chave] = futuro.result()
+                except Exception as e:
+                    print(f"### ERRO ao importar a nota {chave}: {e} ###")
+                    notas[chave] = None
+
+    # 4. Grava tudo em uma transação: chaves novas + compras de todas as notas
+    com_itens = [chave for chave, nota in notas.items() if nota and nota.get('itens_comprados')]
+    novas = registrar_notas_importadas(current_user_id, com_itens)
+    linhas = []
+    for chave in com_itens:
+        if chave in novas:
+            linhas.extend(linhas_de_itens_extraidos(notas[chave]))
+    inserir_compras_em_lote(current_user_id, linhas)
+    db.session.commit()
+
+    for resultado in resultados:
+        chave = resultado['chave']
+        if resultado.get('status') is not None:
+            continue
+        if chave in novas:
+            resultado.update(status='importada', itens=len(notas[chave]['itens_comprados']))
+        elif chave in com_itens:
+            resultado['status'] = 'duplicada'
+        else:
+            resultado['status'] = 'erro'
+    return jsonify({'importadas': len(novas), 'itensInseridos': len(linhas), 'resultados': resultados}), 200
+
 # --- ESTA É A ROTA ATUALIZADA ---
 @app.route('/processar_imagem', methods=['POST'])
 @jwt_required()
@@ -270,41 +1006,36 @@ def processar_imagem_e_salvar():
     if 'comprovante' not in request.files:
         return jsonify({'erro': 'Nenhum arquivo de imagem enviado.'}), 400
     
-    arquivo_imagem = request.files['comprovante'].read()
-    
-    # A função em dados.py agora pode retornar dois formatos de dicionário
-    dados_extraidos = analisar_imagem_comprovante(arquivo_imagem)
+    arquivo_imagem = ler_arquivo_limitado(request.files['comprovante'], IMAGEM_MAX_BYTES)
+    if arquivo_imagem is None:
+        return jsonify({'erro': f'A imagem excede o limite de {IMAGEM_MAX_BYTES // (1024 * 1024)} MB.'}), 413
 
-    if not dados_extraidos:
-        return jsonify({'erro': 'Não foi possível extrair dados da imagem.'}), 500
-
-    # Verifica se a função encontrou uma chave de acesso DANFE
-    if dados_extraidos.get('tipo') == 'danfe_chave':
-        chave_acesso = dados_extraidos.get('chave')
-        print(f"Chave de acesso encontrada via Google Vision: {chave_acesso}")
-        
-        # Gera a URL da Sefaz e retorna para o app
-        url_consulta = f"https://www.sefaz.rs.gov.br/NFCON/consultanfce.aspx?chNFe={chave_acesso}"
-        return jsonify({'url_danfe': url_consulta}), 200
+    if request.args.get('assincrono') in ('1', 'true') or request.form.get('assincrono') in ('1', 'true'):
+        # Modo job: responde na hora com o id e processa no pool em segundo plano
+        if not _vagas_jobs.acquire(blocking=False):
+            return jsonify({'erro': 'Fila de processamento cheia, tente novamente em instantes.'}), 503
+        try:
+            job = JobProcessamento(user_id=current_user_id)
+            db.session.add(job)
+            db.session.commit()
+            obter_executor_jobs().submit(executar_job_ocr, job.id, current_user_id, arquivo_imagem)
+        except Exception:
+            _vagas_jobs.release()
+            raise
+        return jsonify({'jobId': job.id, 'status': job.status}), 202
     
-    # Se não era uma chave, então deve ser uma lista de itens de compra
-    elif dados_extraidos.get('itens_comprados'):
-        print("Analisando como comprovante de compras comum...")
-        for item in dados_extraidos['itens_comprados']:
-            nova_compra = Compra(
-                nome=item.get('nome', 'Item desconhecido'),
-                quantidade=item.get('quantidade', 1.0),
-                valor_unitario=item.get('valor_unitario', 0.0),
-                data=dados_extraidos.get('data', datetime.now().strftime("%d/%m/%Y")),
-                categoria=item.get('categoria'),
-                user_id=current_user_id
-            )
-            db.session.add(nova_compra)
-        db.session.commit()
-        return jsonify(dados_extraidos)
+    # A função em dados.py agora pode retornar dois formatos de dicionário
+    resposta, status = salvar_dados_extraidos(current_user_id, analisar_imagem_comprovante(arquivo_imagem))
+    return jsonify(resposta), status
 
-    # Se chegou até aqui, a imagem não continha nem uma chave nem itens válidos
-    return jsonify({'erro': 'Não foi possível identificar uma chave DANFE ou itens de compra na imagem.'}), 422
+@app.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    current_user_id = int(get_jwt_identity())
+    job = db.session.get(JobProcessamento, job_id)
+    # Job de outro usuário responde como inexistente: o id não revela nada sobre outras contas
+    if not job or job.user_id != current_user_id: return jsonify({'erro': 'Job não encontrado'}), 404
+    return jsonify(job.to_dict()), 200
 
 # ROTA FINAL E DEFINITIVA PARA A FUNCIONALIDADE DANFE (ESTRATÉGIA WEBVIEW)
 @app.route('/gerar-link-danfe', methods=['POST'])
@@ -312,10 +1043,10 @@ def processar_imagem_e_salvar():
 def gerar_link_danfe():
     dados_req = request.get_json()
     chave_acesso = dados_req.get('chave')
-    if not chave_acesso or len(chave_acesso) != 44 or not chave_acesso.isdigit():
+    if not chave_acesso_valida(chave_acesso):
         return jsonify({'erro': 'Chave de acesso inválida.'}), 400
     # O app irá abrir este link em uma WebView.
-    url_consulta = f"https://www.sefaz.rs.gov.br/NFCON/consultanfce.aspx?chNFe={chave_acesso}"
+    url_consulta = url_consulta_nfce(chave_acesso)
     return jsonify({'url': url_consulta}), 200
 
 # CRUD DE COMPRAS
@@ -325,36 +1056,166 @@ def get_compras():
     current_user_id = int(get_jwt_identity())
     mes_query = request.args.get('mes', default=datetime.now().month, type=int)
     ano_query = request.args.get('ano', default=datetime.now().year, type=int)
-    mes_ano_str = f"{mes_query:02d}/{ano_query}"
+    if not 1 <= mes_query <= 12: return jsonify({'erro': 'Mês inválido'}), 400
+    limite = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if limite is not None and not 1 <= limite <= LIMITE_MAXIMO_PAGINA:
+        return jsonify({'erro': f'O parâmetro limit deve estar entre 1 e {LIMITE_MAXIMO_PAGINA}.'}), 400
     
-    compras_variaveis = Compra.query.filter(Compra.user_id == current_user_id, Compra.data.like(f"%/{mes_ano_str}")).all()
-    custos_fixos_todos = CustoFixo.query.filter_by(user_id=current_user_id).all()
-    
-    compras_de_custos_fixos = []
-    for custo in custos_fixos_todos:
-        if deve_incluir_custo_fixo(custo, mes_query, ano_query):
-            compra_projetada = {
-                'id': -custo.id, 'nome': f"{custo.nome} (Fixo)", 'quantidade': 1,
-                'valorUnitario': custo.valor, 'data': f"{custo.dia_do_mes:02d}/{mes_query:02d}/{ano_query}",
-                'categoria': custo.categoria
-            }
-            compras_de_custos_fixos.append(compra_projetada)
-            
-    resultado_variaveis = [compra.to_dict() for compra in compras_variaveis]
-    resultado_final = resultado_variaveis + compras_de_custos_fixos
-    return jsonify(resultado_final), 200
+    consulta = Compra.query.filter(*filtro_compras_do_mes(current_user_id, mes_query, ano_query)).order_by(Compra.data, Compra.id)
+    custos_fixos_todos = carregar_custos_fixos(current_user_id)
+    compras_de_custos_fixos = projetar_custos_fixos(custos_fixos_todos, mes_query, ano_query)
+
+    if request.args.get('stream') in ('1', 'true'):
+        # Modo streaming: mesmo formato de lista, mas as linhas saem do cursor do servidor à medida que são lidas
+        def gerar():
+            yield '['
+            separador = ''
+            for compra in db.session.execute(consulta.statement.execution_options(yield_per=TAMANHO_LOTE_STREAMING)).scalars():
+                yield separador + app.json.dumps(compra.to_dict())
+                separador = ','
+            for compra_projetada in compras_de_custos_fixos:
+                yield separador + app.json.dumps(compra_projetada)
+                separador = ','
+            yield ']'
+        return app.response_class(stream_with_context(gerar()), mimetype='application/json'), 200
+
+    if limite is None and cursor is None:
+        resultado_variaveis = [compra.to_dict() for compra in consulta.all()]
+        return jsonify(resultado_variaveis + compras_de_custos_fixos), 200
+
+    # Paginação por keyset sobre (data, id): cada página é uma busca no índice (user_id, data)
+    if cursor:
+        posicao = decodificar_cursor(cursor)
+        if not posicao: return jsonify({'erro': 'Cursor inválido'}), 400
+        consulta = consulta.filter(db.tuple_(Compra.data, Compra.id) > posicao)
+    limite = limite or LIMITE_PADRAO_PAGINA
+    pagina = consulta.limit(limite + 1).all()
+    proximo_cursor = codificar_cursor(pagina[limite - 1]) if len(pagina) > limite else None
+    itens = [compra.to_dict() for compra in pagina[:limite]]
+    if proximo_cursor is None:
+        # Os custos fixos projetados vão ao final da última página, como na resposta sem paginação
+        itens += compras_de_custos_fixos
+    return jsonify({'itens': itens, 'proximoCursor': proximo_cursor}), 200
+
+@app.route('/exportar', methods=['GET'])
+@jwt_required()
+def exportar_compras():
+    current_user_id = int(get_jwt_identity())
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'ofx'): return jsonify({'erro': 'formato deve ser csv ou ofx.'}), 400
+    inicio, fim = request.args.get('de'), request.args.get('ate')
+    if inicio and not converter_data_br(inicio) or fim and not converter_data_br(fim):
+        return jsonify({'erro': 'Data inválida, use o formato dd/mm/aaaa.'}), 400
+    # Sem período informado, vale o histórico inteiro (min/max saem do índice (user_id, data))
+    primeira, ultima = db.session.execute(
+        db.select(db.func.min(Compra.data), db.func.max(Compra.data)).where(Compra.user_id == current_user_id)).one()
+    inicio = converter_data_br(inicio) if inicio else (primeira or date.today())
+    fim = converter_data_br(fim) if fim else max(ultima or date.today(), date.today())
+    if inicio > fim: return jsonify({'erro': 'A data inicial é posterior à final.'}), 400
+    fixos = ocorrencias_de_custos_fixos(carregar_custos_fixos(current_user_id), inicio, fim) if request.args.get('fixos') in ('1', 'true') else []
+
+    consulta = db.select(Compra.id, Compra.data, Compra.nome, Compra.categoria, Compra.quantidade, Compra.valor_unitario).where(
+        Compra.user_id == current_user_id, Compra.data >= inicio, Compra.data <= fim
+    ).order_by(Compra.data, Compra.id).execution_options(yield_per=TAMANHO_LOTE_STREAMING)
+
+    def registros():
+        # Tuplas do cursor do servidor em lotes de TAMANHO_LOTE_STREAMING, intercaladas por data com os fixos
+        compras = ({
+            'id': f"C{compra_id}", 'data': data_compra, 'descricao': nome, 'categoria': categoria,
+            'quantidade': quantidade, 'valor_unitario': valor_unitario, 'valor': para_decimal(quantidade * valor_unitario), 'tipo': 'compra',
+        } for compra_id, data_compra, nome, categoria, quantidade, valor_unitario in db.session.execute(consulta))
+        return heapq.merge(compras, fixos, key=lambda registro: registro['data'])
+
+    if formato == 'csv':
+        corpo, mimetype = gerar_csv(registros(), TAMANHO_LOTE_STREAMING), 'text/csv'
+    else:
+        corpo, mimetype = gerar_ofx(registros(), inicio, fim, datetime.now(timezone.utc), TAMANHO_LOTE_STREAMING), 'application/x-ofx'
+    resposta = app.response_class(stream_with_context(corpo), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename=compras.{formato}'
+    return resposta
+
+@app.route('/importar', methods=['POST'])
+@jwt_required()
+def importar_extrato():
+    current_user_id = int(get_jwt_identity())
+    # Extratos de anos passam do MAX_CONTENT_LENGTH geral; o Werkzeug grava o upload em arquivo temporário
+    request.max_content_length = EXTRATO_MAX_BYTES
+    if 'arquivo' not in request.files: return jsonify({'erro': 'Nenhum arquivo de extrato enviado.'}), 400
+    arquivo = request.files['arquivo']
+    formato = (request.args.get('formato') or request.form.get('formato') or os.path.splitext(arquivo.filename or '')[1][1:]).lower()
+    if formato not in ('csv', 'ofx'): return jsonify({'erro': 'formato deve ser csv ou ofx.'}), 400
+    codificacao = request.args.get('codificacao') or request.form.get('codificacao') or 'utf-8-sig'
+    try:
+        codecs.lookup(codificacao)
+    except LookupError:
+        return jsonify({'erro': 'Codificação desconhecida.'}), 400
+    categorias_validas = set(LISTA_DE_CATEGORIAS) | {c.nome for c in categorias_visiveis(current_user_id)}
+
+    # O arquivo é lido em streaming; cada lote de TAMANHO_LOTE_INSERCAO é gravado e confirmado em seguida.
+    # Se a importação parar no meio, reenviar o arquivo é seguro: o que já entrou é reconhecido pela impressão digital
+    leitor = ler_ofx(arquivo.stream, TAMANHO_BLOCO_UPLOAD) if formato == 'ofx' else ler_csv(arquivo.stream, codificacao)
+    resumo = {'lidos': 0, 'inseridos': 0, 'duplicados': 0, 'ignorados': 0, 'erros': []}
+    lote = []
+    def gravar_lote():
+        inseridos = importar_lote_de_extrato(current_user_id, lote, categorias_validas)
+        db.session.commit()
+        resumo['inseridos'] += inseridos
+        resumo['duplicados'] += len(lote) - inseridos
+        lote.clear()
+    try:
+        for numero, lancamento, erro in com_impressoes_digitais(leitor):
+            resumo['lidos'] += 1
+            if lancamento:
+                lote.append(lancamento)
+                if len(lote) == TAMANHO_LOTE_INSERCAO: gravar_lote()
+            elif erro:
+                if len(resumo['erros']) < MAXIMO_ERROS_IMPORTACAO: resumo['erros'].append({'registro': numero, 'erro': erro})
+            else:
+                resumo['ignorados'] += 1
+        if lote: gravar_lote()
+    except (ValueError, csv.Error) as erro:
+        return jsonify(dict(resumo, erro=f'Não foi possível ler o extrato: {erro}')), 400
+    return jsonify(resumo), 200
 
 @app.route('/compras', methods=['POST'])
 @jwt_required()
 def add_compra():
     current_user_id = int(get_jwt_identity())
-    dados = request.get_json()
-    if not dados or not all(k in dados for k in ['nome', 'quantidade', 'valor_unitario', 'data']): return jsonify({'erro': 'Dados da compra estão incompletos.'}), 400
-    nova_compra = Compra(nome=dados['nome'], quantidade=dados['quantidade'], valor_unitario=dados['valor_unitario'], data=dados['data'], categoria=dados.get('categoria'), user_id=current_user_id)
+    linha, erro = validar_item_compra(request.get_json())
+    if erro: return jsonify({'erro': erro}), 400
+    nova_compra = Compra(**linha, user_id=current_user_id)
     db.session.add(nova_compra)
+    deltas = {}
+    acumular_gasto_mensal(deltas, nova_compra.data, nova_compra.categoria, nova_compra.quantidade * nova_compra.valor_unitario)
+    registrar_gastos_mensais(current_user_id, deltas)
     db.session.commit()
     return jsonify(nova_compra.to_dict()), 201
 
+@app.route('/compras/lote', methods=['POST'])
+@jwt_required()
+def add_compras_em_lote():
+    current_user_id = int(get_jwt_identity())
+    dados = request.get_json()
+    itens = dados.get('compras') if isinstance(dados, dict) else dados
+    if not isinstance(itens, list) or not itens: return jsonify({'erro': 'Envie uma lista de compras.'}), 400
+    if len(itens) > MAXIMO_ITENS_POR_LOTE: return jsonify({'erro': f'O lote aceita no máximo {MAXIMO_ITENS_POR_LOTE} compras.'}), 413
+    resultados = [None] * len(itens)
+    linhas, indices = [], []
+    for indice, item in enumerate(itens):
+        linha, erro = validar_item_compra(item)
+        if erro:
+            resultados[indice] = {'indice': indice, 'erro': erro}
+        else:
+            linhas.append(linha)
+            indices.append(indice)
+    if not linhas: return jsonify({'erro': 'Nenhuma compra válida no lote.', 'resultados': resultados}), 400
+    ids = inserir_compras_em_lote(current_user_id, linhas)
+    db.session.commit()
+    for indice, compra_id in zip(indices, ids):
+        resultados[indice] = {'indice': indice, 'id': compra_id}
+    return jsonify({'inseridas': len(ids), 'resultados': resultados}), 201
+
 @app.route('/compras/<int:compra_id>', methods=['PUT'])
 @jwt_required()
 def update_compra(compra_id):
@@ -364,11 +1225,21 @@ def update_compra(compra_id):
     if compra_para_atualizar.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
     dados = request.get_json()
     if not dados: return jsonify({'erro': 'Nenhum dado fornecido'}), 400
+    deltas = {}
+    acumular_gasto_mensal(deltas, compra_para_atualizar.data, compra_para_atualizar.categoria, -compra_para_atualizar.quantidade * compra_para_atualizar.valor_unitario)
+    if 'data' in dados:
+        data_compra = converter_data_br(dados['data'])
+        if not data_compra: return jsonify({'erro': 'Data inválida, use o formato dd/mm/aaaa.'}), 400
+        compra_para_atualizar.data = data_compra
+    try:
+        if 'quantidade' in dados: compra_para_atualizar.quantidade = para_decimal(dados['quantidade'], 3)
+        if 'valor_unitario' in dados: compra_para_atualizar.valor_unitario = para_decimal(dados['valor_unitario'])
+    except ValueError:
+        return jsonify({'erro': 'Quantidade e valor unitário devem ser numéricos.'}), 400
     compra_para_atualizar.nome = dados.get('nome', compra_para_atualizar.nome)
-    compra_para_atualizar.quantidade = dados.get('quantidade', compra_para_atualizar.quantidade)
-    compra_para_atualizar.valor_unitario = dados.get('valor_unitario', compra_para_atualizar.valor_unitario)
-    compra_para_atualizar.data = dados.get('data', compra_para_atualizar.data)
     compra_para_atualizar.categoria = dados.get('categoria', compra_para_atualizar.categoria)
+    acumular_gasto_mensal(deltas, compra_para_atualizar.data, compra_para_atualizar.categoria, compra_para_atualizar.quantidade * compra_para_atualizar.valor_unitario)
+    registrar_gastos_mensais(current_user_id, deltas)
     db.session.commit()
     return jsonify(compra_para_atualizar.to_dict()), 200
 
@@ -379,6 +1250,9 @@ def delete_compra(compra_id):
     compra_para_deletar = Compra.query.get(compra_id)
     if not compra_para_deletar: return jsonify({'erro': 'Compra não encontrada'}), 404
     if compra_para_deletar.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
+    deltas = {}
+    acumular_gasto_mensal(deltas, compra_para_deletar.data, compra_para_deletar.categoria, -compra_para_deletar.quantidade * compra_para_deletar.valor_unitario)
+    registrar_gastos_mensais(current_user_id, deltas)
     db.session.delete(compra_para_deletar)
     db.session.commit()
     return jsonify({'mensagem': 'Compra deletada com sucesso'}), 200
@@ -388,8 +1262,8 @@ def delete_compra(compra_id):
 @jwt_required()
 def get_custos_fixos():
     current_user_id = int(get_jwt_identity())
-    custos = CustoFixo.query.filter_by(user_id=current_user_id).order_by(CustoFixo.nome).all()
-    return jsonify([custo.to_dict() for custo in custos]), 200
+    return responder_com_etag('custos-fixos', current_user_id, 'custos-fixos', lambda: [
+        custo.to_dict() for custo in CustoFixo.query.filter_by(user_id=current_user_id).order_by(CustoFixo.nome)])
 
 @app.route('/custos-fixos', methods=['POST'])
 @jwt_required()
@@ -399,11 +1273,14 @@ def add_custo_fixo():
     required_keys = ['nome', 'valor', 'categoria', 'tipoRecorrencia', 'diaDoMes', 'mesDeInicio', 'anoDeInicio']
     if not dados or not all(k in dados for k in required_keys): 
         return jsonify({'erro': 'Dados do custo fixo estão incompletos.'}), 400
-        
+    try:
+        valor = para_decimal(dados['valor'])
+    except ValueError:
+        return jsonify({'erro': 'O valor deve ser numérico.'}), 400
     novo_custo = CustoFixo(
         user_id=current_user_id,
         nome=dados['nome'],
-        valor=dados['valor'],
+        valor=valor,
         categoria=dados['categoria'],
         tipo_recorrencia=dados['tipoRecorrencia'],
         dia_do_mes=dados['diaDoMes'],
@@ -411,6 +1288,7 @@ def add_custo_fixo():
         ano_de_inicio=dados['anoDeInicio']
     )
     db.session.add(novo_custo)
+    incrementar_versao(current_user_id, 'custos-fixos')
     db.session.commit()
     return jsonify(novo_custo.to_dict()), 201
 
@@ -423,13 +1301,17 @@ def update_custo_fixo(custo_id):
     if custo_para_atualizar.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
     dados = request.get_json()
     if not dados: return jsonify({'erro': 'Nenhum dado fornecido'}), 400
+    try:
+        if 'valor' in dados: custo_para_atualizar.valor = para_decimal(dados['valor'])
+    except ValueError:
+        return jsonify({'erro': 'O valor deve ser numérico.'}), 400
     custo_para_atualizar.nome = dados.get('nome', custo_para_atualizar.nome)
-    custo_para_atualizar.valor = dados.get('valor', custo_para_atualizar.valor)
     custo_para_atualizar.categoria = dados.get('categoria', custo_para_atualizar.categoria)
     custo_para_atualizar.tipo_recorrencia = dados.get('tipoRecorrencia', custo_para_atualizar.tipo_recorrencia)
     custo_para_atualizar.dia_do_mes = dados.get('diaDoMes', custo_para_atualizar.dia_do_mes)
     custo_para_atualizar.mes_de_inicio = dados.get('mesDeInicio', custo_para_atualizar.mes_de_inicio)
     custo_para_atualizar.ano_de_inicio = dados.get('anoDeInicio', custo_para_atualizar.ano_de_inicio)
+    incrementar_versao(current_user_id, 'custos-fixos')
     db.session.commit()
     return jsonify(custo_para_atualizar.to_dict()), 200
 
@@ -441,6 +1323,7 @@ def delete_custo_fixo(custo_id):
     if not custo_para_deletar: return jsonify({'erro': 'Custo fixo não encontrado'}), 404
     if custo_para_deletar.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
     db.session.delete(custo_para_deletar)
+    incrementar_versao(current_user_id, 'custos-fixos')
     db.session.commit()
     return jsonify({'mensagem': 'Custo fixo deletado com sucesso'}), 200
 
@@ -449,8 +1332,15 @@ def delete_custo_fixo(custo_id):
 @jwt_required()
 def get_categorias():
     current_user_id = int(get_jwt_identity())
-    categorias = Categoria.query.filter_by(user_id=current_user_id).order_by(Categoria.nome).all()
-    return jsonify([c.to_dict() for c in categorias]), 200
+    return responder_com_etag('categorias', current_user_id, 'categorias', lambda: [
+        c.to_dict() for c in categorias_visiveis(current_user_id)], incluir_global=True)
+
+@app.route('/categorias/arvore', methods=['GET'])
+@jwt_required()
+def get_arvore_categorias():
+    current_user_id = int(get_jwt_identity())
+    return responder_com_etag('categorias-arvore', current_user_id, 'categorias', lambda: montar_arvore_de_categorias(
+        categorias_visiveis(current_user_id)), incluir_global=True)
 
 @app.route('/categorias', methods=['POST'])
 @jwt_required()
@@ -461,6 +1351,7 @@ def add_categoria():
         return jsonify({'erro': 'Dados da categoria estão incompletos.'}), 400
     nova_categoria = Categoria(nome=dados['nome'], pictogram=dados['pictogram'], parent_id=dados.get('parentId'), user_id=current_user_id)
     db.session.add(nova_categoria)
+    incrementar_versao(current_user_id, 'categorias')
     db.session.commit()
     return jsonify(nova_categoria.to_dict()), 201
 
@@ -470,11 +1361,29 @@ def update_categoria(categoria_id):
     current_user_id = int(get_jwt_identity())
     cat = Categoria.query.get(categoria_id)
     if not cat: return jsonify({'erro': 'Categoria não encontrada'}), 404
-    if cat.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
+    if cat.user_id is not None and cat.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
     dados = request.get_json()
     if not dados: return jsonify({'erro': 'Nenhum dado fornecido'}), 400
+    if cat.user_id is None:
+        # Cópia na escrita: a global continua intacta e o usuário passa a ver a sua versão (novo id)
+        cat = sobrescrever_categoria_global(cat, current_user_id)
+    if 'parentId' in dados:
+        novo_pai = dados['parentId']
+        if novo_pai is not None:
+            pai = db.session.get(Categoria, novo_pai)
+            if not pai or (pai.user_id is not None and pai.user_id != current_user_id):
+                return jsonify({'erro': 'Categoria pai não encontrada'}), 404
+            # Mover para dentro da própria subárvore criaria um ciclo. A cópia recém-criada precisa de id (flush),
+            # e os filhos pendurados na global de origem também contam: a árvore os mostra sob a cópia
+            db.session.flush()
+            subarvore = subarvore_de_categoria(cat.id, *([cat.origem_id] if cat.origem_id else []))
+            if db.session.scalar(subarvore.where(subarvore.selected_columns[0] == novo_pai)) is not None:
+                return jsonify({'erro': 'Uma categoria não pode ficar dentro de si mesma.'}), 400
+        # Mover só troca o parent_id da raiz: os descendentes vão junto sem serem tocados
+        cat.parent_id = novo_pai
     cat.nome = dados.get('nome', cat.nome)
     cat.pictogram = dados.get('pictogram', cat.pictogram)
+    incrementar_versao(current_user_id, 'categorias')
     db.session.commit()
     return jsonify(cat.to_dict()), 200
 
@@ -484,8 +1393,20 @@ def delete_categoria(categoria_id):
     current_user_id = int(get_jwt_identity())
     cat = Categoria.query.get(categoria_id)
     if not cat: return jsonify({'erro': 'Categoria não encontrada'}), 404
-    if cat.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
-    db.session.delete(cat)
+    if cat.user_id is not None and cat.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
+    if cat.user_id is None:
+        # Excluir uma global = ocultar por uma cópia (com id, para os filtros abaixo)
+        cat = sobrescrever_categoria_global(cat, current_user_id)
+        db.session.flush()
+    # Subárvore inteira em um DELETE, sem carregar a cascata do ORM. Uma cópia de global vira ocultação
+    # (só os descendentes saem, inclusive os criados sob a global), senão a global voltaria a aparecer
+    subarvore = subarvore_de_categoria(cat.id, *([cat.origem_id] if cat.origem_id else []))
+    if cat.origem_id:
+        subarvore = subarvore.where(subarvore.selected_columns[0] != cat.id)
+        cat.oculta = True
+    db.session.execute(db.delete(Categoria).where(Categoria.id.in_(subarvore), Categoria.user_id == current_user_id)
+                       .execution_options(synchronize_session=False))
+    incrementar_versao(current_user_id, 'categorias')
     db.session.commit()
     return jsonify({'mensagem': 'Categoria deletada com sucesso'}), 200
 
@@ -494,8 +1415,8 @@ def delete_categoria(categoria_id):
 @jwt_required()
 def get_receitas():
     current_user_id = int(get_jwt_identity())
-    templates_de_receita = Receita.query.filter_by(user_id=current_user_id).order_by(Receita.descricao).all()
-    return jsonify([r.to_dict() for r in templates_de_receita]), 200
+    return responder_com_etag('receitas', current_user_id, 'receitas', lambda: [
+        r.to_dict() for r in Receita.query.filter_by(user_id=current_user_id).order_by(Receita.descricao)])
 
 @app.route('/receitas', methods=['POST'])
 @jwt_required()
@@ -513,10 +1434,14 @@ def add_receita():
             return jsonify({'erro': 'Para receitas recorrentes, o dia, mês e ano de início são obrigatórios.'}), 400
     else:
         return jsonify({'erro': f'Tipo de recorrência inválido: {tipo_recorrencia}'}), 400
+    try:
+        valor = para_decimal(dados['valor'])
+    except ValueError:
+        return jsonify({'erro': 'O valor deve ser numérico.'}), 400
     nova_receita = Receita(
         user_id=current_user_id,
         descricao=dados['descricao'],
-        valor=dados['valor'],
+        valor=valor,
         tipo_recorrencia=dados['tipoRecorrencia'],
         dia_do_mes=dados.get('diaDoMes'),
         mes_de_inicio=dados.get('mesDeInicio'),
@@ -524,6 +1449,7 @@ def add_receita():
         data_unica=dados.get('dataUnica')
     )
     db.session.add(nova_receita)
+    incrementar_versao(current_user_id, 'receitas')
     db.session.commit()
     return jsonify(nova_receita.to_dict()), 201
 
@@ -544,8 +1470,11 @@ def update_receita(receita_id):
         required_keys = ['diaDoMes', 'mesDeInicio', 'anoDeInicio']
         if any(k in dados and dados[k] is None for k in required_keys):
              return jsonify({'erro': 'Para receitas recorrentes, o dia, mês e ano de início são obrigatórios.'}), 400
+    try:
+        if 'valor' in dados: receita.valor = para_decimal(dados['valor'])
+    except ValueError:
+        return jsonify({'erro': 'O valor deve ser numérico.'}), 400
     receita.descricao = dados.get('descricao', receita.descricao)
-    receita.valor = dados.get('valor', receita.valor)
     receita.tipo_recorrencia = dados.get('tipoRecorrencia', receita.tipo_recorrencia)
     if receita.tipo_recorrencia == 'unico':
         receita.data_unica = dados.get('dataUnica', receita.data_unica)
@@ -557,6 +1486,7 @@ def update_receita(receita_id):
         receita.dia_do_mes = dados.get('diaDoMes', receita.dia_do_mes)
         receita.mes_de_inicio = dados.get('mesDeInicio', receita.mes_de_inicio)
         receita.ano_de_inicio = dados.get('anoDeInicio', receita.ano_de_inicio)
+    incrementar_versao(current_user_id, 'receitas')
     db.session.commit()
     return jsonify(receita.to_dict()), 200
 
@@ -568,6 +1498,7 @@ def delete_receita(receita_id):
     if not receita: return jsonify({'erro': 'Receita não encontrada'}), 404
     if receita.user_id != current_user_id: return jsonify({'erro': 'Acesso não autorizado'}), 403
     db.session.delete(receita)
+    incrementar_versao(current_user_id, 'receitas')
     db.session.commit()
     return jsonify({'mensagem': 'Receita deletada com sucesso'}), 200
 
@@ -578,19 +1509,147 @@ def get_gastos_por_categoria():
     current_user_id = int(get_jwt_identity())
     mes_query = request.args.get('mes', default=datetime.now().month, type=int)
     ano_query = request.args.get('ano', default=datetime.now().year, type=int)
-    mes_ano_str = f"{mes_query:02d}/{ano_query}"
-    compras_variaveis = Compra.query.filter(Compra.user_id == current_user_id, Compra.data.like(f"%/{mes_ano_str}")).all()
-    custos_fixos_todos = CustoFixo.query.filter_by(user_id=current_user_id).all()
-    gastos_totais = {}
-    for compra in compras_variaveis:
-        categoria = compra.categoria if compra.categoria else 'Não Categorizado'
-        valor = compra.quantidade * compra.valor_unitario
-        gastos_totais[categoria] = gastos_totais.get(categoria, 0) + valor
-    for custo in custos_fixos_todos:
-        if deve_incluir_custo_fixo(custo, mes_query, ano_query):
-            categoria = custo.categoria if custo.categoria else 'Não Categorizado'
-            gastos_totais[categoria] = gastos_totais.get(categoria, 0) + custo.valor
-    return jsonify(gastos_totais), 200
+    if not 1 <= mes_query <= 12: return jsonify({'erro': 'Mês inválido'}), 400
+    # Tuplas (categoria, total) já agrupadas no banco, sem instanciar entidades
+    gastos_totais = dict(db.session.execute(
+        db.select(GastoMensal.categoria, db.func.sum(GastoMensal.total))
+        .where(GastoMensal.user_id == current_user_id, GastoMensal.ano == ano_query, GastoMensal.mes == mes_query)
+        .group_by(GastoMensal.categoria)
+        .having(db.func.abs(db.func.sum(GastoMensal.total)) >= Decimal('0.005'))
+    ).all())
+    custos_fixos_todos = carregar_custos_fixos(current_user_id)
+    for custo in filtrar_do_mes(custos_fixos_todos, matriz_custos_fixos(custos_fixos_todos, [(mes_query, ano_query)])):
+        categoria = categoria_ou_padrao(custo.categoria)
+        gastos_totais[categoria] = gastos_totais.get(categoria, 0) + custo.valor
+    return jsonify({categoria: valor_monetario(total) for categoria, total in gastos_totais.items()}), 200
+
+@app.route('/relatorios/serie', methods=['GET'])
+@jwt_required()
+def get_serie_mensal():
+    current_user_id = int(get_jwt_identity())
+    inicio, fim = converter_mes_ano(request.args.get('de')), converter_mes_ano(request.args.get('ate'))
+    if not inicio or not fim: return jsonify({'erro': 'Informe de e ate no formato MM/AAAA.'}), 400
+    quantidade_meses = indice_do_mes(*fim) - indice_do_mes(*inicio) + 1
+    if not 1 <= quantidade_meses <= MAXIMO_MESES_SERIE:
+        return jsonify({'erro': f'O intervalo deve ter entre 1 e {MAXIMO_MESES_SERIE} meses.'}), 400
+    meses = meses_do_intervalo(*inicio, *fim)
+    colunas = {mes_ano: coluna for coluna, mes_ano in enumerate(meses)}
+
+    # Compras variáveis: uma varredura da chave primária (user_id, ano, mes) de gastos_mensais
+    variaveis = [{} for _ in meses]
+    linhas = db.session.execute(
+        db.select(GastoMensal.mes, GastoMensal.ano, GastoMensal.categoria, GastoMensal.total).where(
+            GastoMensal.user_id == current_user_id,
+            db.tuple_(GastoMensal.ano, GastoMensal.mes) >= (inicio[1], inicio[0]),
+            db.tuple_(GastoMensal.ano, GastoMensal.mes) <= (fim[1], fim[0]))
+    )
+    for mes, ano, categoria, total in linhas:
+        if abs(total) >= Decimal('0.005'):
+            variaveis[colunas[(mes, ano)]][categoria] = total
+
+    # Custos fixos e receitas: uma expansão da recorrência (templates x meses) somada em centavos
+    custos_fixos_todos = carregar_custos_fixos(current_user_id)
+    fixos_por_categoria = somar_por_grupo_e_mes(
+        [categoria_ou_padrao(custo.categoria) for custo in custos_fixos_todos],
+        [centavos(custo.valor) for custo in custos_fixos_todos],
+        matriz_custos_fixos(custos_fixos_todos, meses))
+    templates_de_receita = carregar_receitas(current_user_id)
+    receitas_por_mes = somar_por_mes([centavos(receita.valor) for receita in templates_de_receita],
+                                     matriz_receitas(templates_de_receita, meses))
+
+    serie = []
+    for coluna, (mes, ano) in enumerate(meses):
+        fixos = {categoria: Decimal(int(totais[coluna])) / 100 for categoria, totais in fixos_por_categoria.items() if totais[coluna]}
+        total_variavel, total_fixo = sum(variaveis[coluna].values()), sum(fixos.values())
+        total_receita = Decimal(int(receitas_por_mes[coluna])) / 100
+        serie.append({
+            'mes': mes, 'ano': ano,
+            'variaveis': {categoria: valor_monetario(total) for categoria, total in variaveis[coluna].items()},
+            'fixos': {categoria: valor_monetario(total) for categoria, total in fixos.items()},
+            'totalVariavel': valor_monetario(total_variavel), 'totalFixo': valor_monetario(total_fixo),
+            'totalReceita': valor_monetario(total_receita),
+            'saldo': valor_monetario(total_receita - total_variavel - total_fixo),
+        })
+    return jsonify({'meses': serie}), 200
+
+def media_gastos_variaveis(user_id, hoje, meses_historico):
+    # Média mensal por categoria nos últimos meses fechados (mês sem compra conta como zero): uma consulta agrupada
+    fim = indice_do_mes(hoje.month, hoje.year) - 1
+    inicio = fim - meses_historico + 1
+    linhas = db.session.execute(
+        db.select(GastoMensal.categoria, db.func.sum(GastoMensal.total)).where(
+            GastoMensal.user_id == user_id,
+            db.tuple_(GastoMensal.ano, GastoMensal.mes) >= (inicio // 12, inicio % 12 + 1),
+            db.tuple_(GastoMensal.ano, GastoMensal.mes) <= (fim // 12, fim % 12 + 1))
+        .group_by(GastoMensal.categoria)
+    )
+    return {categoria: total / meses_historico for categoria, total in linhas if total > 0}
+
+@app.route('/previsao', methods=['GET'])
+@jwt_required()
+def get_previsao():
+    current_user_id = int(get_jwt_identity())
+    quantidade_meses = request.args.get('meses', default=12, type=int)
+    meses_historico = request.args.get('historico', default=6, type=int)
+    granularidade = request.args.get('granularidade', default='mensal')
+    try:
+        saldo_inicial = para_decimal(request.args.get('saldoInicial', '0'))
+    except ValueError:
+        return jsonify({'erro': 'saldoInicial deve ser numérico.'}), 400
+    if not 1 <= quantidade_meses <= MAXIMO_MESES_PREVISAO:
+        return jsonify({'erro': f'O parâmetro meses deve estar entre 1 e {MAXIMO_MESES_PREVISAO}.'}), 400
+    if not 1 <= meses_historico <= MAXIMO_MESES_HISTORICO:
+        return jsonify({'erro': f'O parâmetro historico deve estar entre 1 e {MAXIMO_MESES_HISTORICO}.'}), 400
+    if granularidade not in ('mensal', 'diaria'):
+        return jsonify({'erro': 'granularidade deve ser mensal ou diaria.'}), 400
+
+    # Horizonte: de hoje até o fim do último mês, como vetores por dia (tudo em centavos)
+    hoje = date.today()
+    inicio = indice_do_mes(hoje.month, hoje.year)
+    fim = inicio + quantidade_meses - 1
+    meses = meses_do_intervalo(hoje.month, hoje.year, fim % 12 + 1, fim // 12)
+    datas, colunas, dias_no_mes = calendario_diario(hoje, meses)
+
+    # Templates recorrentes: uma matriz (templates x meses) cada, lançada no dia de vencimento
+    custos_fixos_todos = carregar_custos_fixos(current_user_id)
+    fixos = distribuir_nos_dias([custo.dia_do_mes for custo in custos_fixos_todos], [centavos(custo.valor) for custo in custos_fixos_todos],
+                                matriz_custos_fixos(custos_fixos_todos, meses), datas, meses)
+    templates_de_receita = carregar_receitas(current_user_id)
+    receitas = distribuir_nos_dias([dia_de_vencimento_receita(receita) for receita in templates_de_receita],
+                                   [centavos(receita.valor) for receita in templates_de_receita],
+                                   matriz_receitas(templates_de_receita, meses), datas, meses)
+
+    # Gastos variáveis: média móvel por categoria espalhada igualmente pelos dias de cada mês
+    medias = media_gastos_variaveis(current_user_id, hoje, meses_historico)
+    media_mensal_centavos = float(sum(medias.values(), Decimal(0)) * 100)
+    fracao_do_mes = 1.0 / dias_no_mes
+    variaveis = media_mensal_centavos * fracao_do_mes
+    saldos = float(saldo_inicial * 100) + np.cumsum(receitas - fixos - variaveis)
+
+    resposta = {
+        'inicio': hoje.strftime('%d/%m/%Y'), 'saldoInicial': valor_monetario(saldo_inicial),
+        'modelo': {'mesesHistorico': meses_historico,
+                   'mediaMensalVariavel': {categoria: valor_monetario(media) for categoria, media in medias.items()}},
+    }
+    if granularidade == 'diaria':
+        resposta['dias'] = [
+            {'data': data.item().strftime('%d/%m/%Y'), 'receitas': receita / 100, 'fixos': fixo / 100,
+             'variaveis': round(variavel / 100, 2), 'saldo': round(saldo / 100, 2)}
+            for data, receita, fixo, variavel, saldo in zip(datas, receitas.tolist(), fixos.tolist(), variaveis.tolist(), saldos.tolist())
+        ]
+    else:
+        # Somas por mês com bincount sobre a coluna de cada dia; o saldo final é o do último dia do mês
+        por_mes = lambda valores: np.bincount(colunas, weights=valores, minlength=len(meses))
+        receitas_mes, fixos_mes, fracao_mes = por_mes(receitas), por_mes(fixos), por_mes(fracao_do_mes)
+        ultimos_dias = np.searchsorted(colunas, np.arange(len(meses)), side='right') - 1
+        resposta['meses'] = [{
+            'mes': mes, 'ano': ano,
+            'receitas': round(receitas_mes[coluna] / 100, 2), 'fixos': round(fixos_mes[coluna] / 100, 2),
+            'variaveis': round(media_mensal_centavos * fracao_mes[coluna] / 100, 2),
+            'variaveisPorCategoria': {categoria: round(float(media) * fracao_mes[coluna], 2) for categoria, media in medias.items()},
+            'saldoFinal': round(saldos[ultimos_dias[coluna]] / 100, 2),
+        } for coluna, (mes, ano) in enumerate(meses)]
+    return jsonify(resposta), 200
 
 @app.route('/dashboard', methods=['GET'])
 @jwt_required()
@@ -599,36 +1658,102 @@ def get_dashboard_data():
     hoje = date.today()
     mes_atual = hoje.month
     ano_atual = hoje.year
-    total_variavel_atual, total_fixo_atual = calcular_gastos_do_mes(current_user_id, mes_atual, ano_atual)
-    total_gasto_mes_atual = total_variavel_atual + total_fixo_atual
-    templates_de_receita = Receita.query.filter_by(user_id=current_user_id).all()
-    total_receita_mes_atual = 0
-    for receita in templates_de_receita:
-        if deve_incluir_receita(receita, mes_atual, ano_atual):
-            total_receita_mes_atual += receita.valor
     mes_anterior = mes_atual - 1
     ano_anterior = ano_atual
     if mes_anterior == 0:
         mes_anterior = 12
         ano_anterior -= 1
-    total_variavel_anterior, total_fixo_anterior = calcular_gastos_do_mes(current_user_id, mes_anterior, ano_anterior)
+    gastos = calcular_gastos_dos_meses(current_user_id, [(mes_anterior, ano_anterior), (mes_atual, ano_atual)])
+    total_variavel_atual, total_fixo_atual = gastos[(mes_atual, ano_atual)]
+    total_gasto_mes_atual = total_variavel_atual + total_fixo_atual
+    templates_de_receita = carregar_receitas(current_user_id)
+    total_receita_mes_atual = 0
+    for receita in filtrar_do_mes(templates_de_receita, matriz_receitas(templates_de_receita, [(mes_atual, ano_atual)])):
+        total_receita_mes_atual += receita.valor
+    total_variavel_anterior, total_fixo_anterior = gastos[(mes_anterior, ano_anterior)]
     total_gasto_mes_anterior = total_variavel_anterior + total_fixo_anterior
     proximos_custos_fixos = []
-    custos_fixos_todos = CustoFixo.query.filter_by(user_id=current_user_id).all()
-    for custo in custos_fixos_todos:
-        if custo.dia_do_mes >= hoje.day and deve_incluir_custo_fixo(custo, mes_atual, ano_atual):
-            proximos_custos_fixos.append({'nome': custo.nome, 'diaVencimento': custo.dia_do_mes, 'valor': custo.valor})
+    custos_fixos_todos = carregar_custos_fixos(current_user_id)
+    for custo in filtrar_do_mes(custos_fixos_todos, matriz_custos_fixos(custos_fixos_todos, [(mes_atual, ano_atual)])):
+        if custo.dia_do_mes >= hoje.day:
+            proximos_custos_fixos.append({'nome': custo.nome, 'diaVencimento': custo.dia_do_mes, 'valor': float(custo.valor)})
     proximos_custos_fixos.sort(key=lambda item: item['diaVencimento'])
     dashboard_data = {
-        'totalGastoMes': total_gasto_mes_atual,
-        'totalReceitaMes': total_receita_mes_atual,
-        'saldoMes': total_receita_mes_atual - total_gasto_mes_atual,
-        'totalVariavel': total_variavel_atual,
-        'totalFixo': total_fixo_atual,
+        'totalGastoMes': valor_monetario(total_gasto_mes_atual),
+        'totalReceitaMes': valor_monetario(total_receita_mes_atual),
+        'saldoMes': valor_monetario(total_receita_mes_atual - total_gasto_mes_atual),
+        'totalVariavel': valor_monetario(total_variavel_atual),
+        'totalFixo': valor_monetario(total_fixo_atual),
         'proximosCustosFixos': proximos_custos_fixos[:3],
-        'comparativoMesAnterior': total_gasto_mes_atual - total_gasto_mes_anterior
+        'comparativoMesAnterior': valor_monetario(total_gasto_mes_atual - total_gasto_mes_anterior)
     }
     return jsonify(dashboard_data), 200
 
+# --- COMANDOS DE MANUTENÇÃO (flask <comando>) ---
+@app.cli.command('verificar-gastos-mensais')
+@click.option('--user-id', type=int, default=None, help='Limita a verificação a um usuário.')
+@click.option('--corrigir', is_flag=True, help='Reconstrói a tabela a partir das compras.')
+def verificar_gastos_mensais(user_id, corrigir):
+    """Compara gastos_mensais com as compras brutas e reporta divergências."""
+    esperado = calcular_gastos_mensais_das_compras(user_id)
+    consulta = GastoMensal.query
+    if user_id is not None:
+        consulta = consulta.filter_by(user_id=user_id)
+    atual = {(g.user_id, g.ano, g.mes, g.categoria): g.total for g in consulta}
+    divergencias = 0
+    for chave in sorted(set(esperado) | set(atual), key=str):
+        valor_esperado, valor_atual = esperado.get(chave, 0), atual.get(chave, 0)
+        if abs(valor_esperado - valor_atual) >= 0.005:
+            divergencias += 1
+            click.echo(f"Divergência em {chave}: tabela={valor_atual:.2f} compras={valor_esperado:.2f}")
+    click.echo(f"{divergencias} divergência(s) em {len(esperado)} grupo(s).")
+    if corrigir:
+        consulta.delete(synchronize_session=False)
+        if esperado:
+            db.session.execute(db.insert(GastoMensal), [
+                {'user_id': u, 'ano': a, 'mes': m, 'categoria': c, 'total': total}
+                for (u, a, m, c), total in esperado.items()
+            ])
+        db.session.commit()
+        click.echo("Tabela gastos_mensais reconstruída.")
+
+@app.cli.command('criar-categorias-globais')
+def criar_categorias_globais():
+    """Cria (uma vez) o catálogo global de categorias padrão compartilhado por todos os usuários."""
+    existentes = {nome for (nome,) in db.session.query(Categoria.nome).filter(Categoria.user_id.is_(None), Categoria.parent_id.is_(None))}
+    novas = [dict(cat_data, user_id=None) for cat_data in CATEGORIAS_PADRAO if cat_data['nome'] not in existentes]
+    if novas:
+        db.session.execute(db.insert(Categoria), novas)
+        incrementar_versao(USUARIO_CATALOGO_GLOBAL, 'categorias')
+    db.session.commit()
+    click.echo(f"{len(novas)} categoria(s) global(is) criada(s).")
+
+@app.cli.command('avaliar-classificador')
+@click.option('--user-id', type=int, default=None, help='Avalia só o histórico de um usuário.')
+@click.option('--fracao-teste', type=float, default=0.2, show_default=True)
+@click.option('--limite', type=int, default=CLASSIFICADOR_MAX_EXEMPLOS_GLOBAL, show_default=True)
+def avaliar_classificador(user_id, fracao_teste, limite):
+    """Mede a acurácia do classificador local em uma parte do histórico separada para teste."""
+    exemplos = exemplos_rotulados(user_id, limite)
+    random.Random(42).shuffle(exemplos)
+    corte = int(len(exemplos) * (1 - fracao_teste))
+    treino, teste = exemplos[:corte], exemplos[corte:]
+    if not teste:
+        click.echo("Histórico insuficiente para avaliação.")
+        return
+    classificador = ClassificadorNaiveBayes(CATEGORIAS_TREINAVEIS).treinar(treino)
+    acertos = confiantes = acertos_confiantes = 0
+    for nome, categoria in teste:
+        prevista, confianca = classificador.prever(nome)
+        acertos += prevista == categoria
+        if confianca >= CLASSIFICADOR_LIMIAR:
+            confiantes += 1
+            acertos_confiantes += prevista == categoria
+    click.echo(f"Treino: {len(treino)} | Teste: {len(teste)}")
+    click.echo(f"Acurácia geral: {acertos / len(teste):.1%}")
+    click.echo(f"Cobertura acima do limiar {CLASSIFICADOR_LIMIAR}: {confiantes / len(teste):.1%}")
+    if confiantes:
+        click.echo(f"Acurácia acima do limiar: {acertos_confiantes / confiantes:.1%}")
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=os.getenv('PORT', 5000))
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""Teste de carga de uma rota presa em rede: requisições/s e p99 por modo de worker do gunicorn.
+
+Uso: python benchmarks/carga.py [--modos sync gthread gevent] [--clientes 16] [--latencia-ms 300]
+
+Sobe uma SEFAZ falsa local que demora --latencia-ms para responder e, para cada modo, um
+gunicorn com gunicorn.conf.py (mesmo número de workers) atendendo POST /processar_nota com
+chaves sempre novas (NFCE_URL_CONSULTA e NFCE_ORIGENS_PERMITIDAS apontam para a SEFAZ falsa). A página falsa não tem itens: a rota espera a SEFAZ e responde sem gravar
+nada, o que isola o custo de rede. O modo gevent é pulado se o gevent não estiver instalado.
+"""
+import argparse
+import http.server
+import importlib.util
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def subir_sefaz_falsa(latencia):
+    class Manipulador(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latencia)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.end_headers()
+            self.wfile.write(b'<html><body><table id="tabResult"></table></body></html>')
+
+        def log_message(self, *args):
+            pass
+
+    servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def subir_gunicorn(modo, args, banco, url_sefaz):
+    porta = porta_livre()
+    ambiente = dict(os.environ, PORT=str(porta), GUNICORN_WORKER_CLASS=modo, WEB_CONCURRENCY=str(args.workers),
+                    GUNICORN_THREADS=str(args.threads), DATABASE_URL=f'sqlite:///{banco}',
+                    NFCE_INTERVALO_POR_HOST='0', PASSWORD_HASH_PROCESSOS='0',
+                    NFCE_URL_CONSULTA=url_sefaz + '/consulta?chNFe={chave}', NFCE_ORIGENS_PERMITIDAS=url_sefaz)
+    ambiente.setdefault('JWT_SECRET_KEY', 'benchmark-' + '0' * 32)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'api', 'db', 'upgrade'], cwd=RAIZ, env=ambiente,
+                   check=True, capture_output=True)
+    processo = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{porta}',
+                                 'api:app'], cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{porta}'
+    for _ in range(100):
+        try:
+            requests.get(base + '/', timeout=5)
+            return processo, base
+        except requests.RequestException:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f'gunicorn ({modo}) não subiu')
+
+
+def medir(base, url_sefaz, args):
+    requests.post(base + '/register', json={'email': 'carga@example.com', 'password': 'senha'})
+    token = requests.post(base + '/login', json={'email': 'carga@example.com', 'password': 'senha'}).json()['access_token']
+    cabecalhos = {'Authorization': f'Bearer {token}'}
+    fim = time.perf_counter() + args.duracao
+    latencias, status = [], {}
+    lock = threading.Lock()
+
+    def cliente():
+        sessao = requests.Session()
+        while time.perf_counter() < fim:
+            chave = ''.join(random.choices('0123456789', k=44))
+            inicio = time.perf_counter()
+            resposta = sessao.post(base + '/processar_nota', json={'url': f'{url_sefaz}/consulta?chNFe={chave}'}, headers=cabecalhos)
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+                status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+
+    with ThreadPoolExecutor(args.clientes) as executor:
+        for _ in range(args.clientes):
+            executor.submit(cliente)
+    latencias.sort()
+    return {
+        'req_s': len(latencias) / args.duracao,
+        'p50_ms': statistics.median(latencias) * 1000,
+        'p99_ms': latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] * 1000,
+        'status': status,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modos', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--latencia-ms', type=float, default=300)
+    parser.add_argument('--duracao', type=float, default=10.0)
+    args = parser.parse_args()
+    sefaz = subir_sefaz_falsa(args.latencia_ms / 1000)
+    url_sefaz = f'http://127.0.0.1:{sefaz.server_port}'
+    for modo in args.modos:
+        if modo == 'gevent' and not (importlib.util.find_spec('gevent') and importlib.util.find_spec('psycogreen')):
+            print(f'{modo:<8} pulado (pip install gevent psycogreen)')
+            continue
+        with tempfile.TemporaryDirectory() as pasta:
+            processo, base = subir_gunicorn(modo, args, os.path.join(pasta, 'carga.db'), url_sefaz)
+            try:
+                r = medir(base, url_sefaz, args)
+            finally:
+                processo.terminate()
+                processo.wait()
+        print(f"{modo:<8} {r['req_s']:7.1f} req/s   p50 {r['p50_ms']:7.1f} ms   p99 {r['p99_ms']:7.1f} ms   status {r['status']}")
+
+
+if __name__ == '__main__':
+    main()
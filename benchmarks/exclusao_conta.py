@@ -0,0 +1,91 @@
+"""Exclusão de uma conta com histórico longo: comandos SQL, pico de memória e tempo.
+
+Uso: python benchmarks/exclusao_conta.py [--compras 100000]
+
+Cria um usuário sintético em um SQLite temporário (ou no DATABASE_URL informado),
+chama DELETE /conta e confere que nenhuma linha do usuário sobrou. Com o ON DELETE
+CASCADE o número de comandos não deve crescer com a quantidade de compras.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'exclusao_conta.db')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-' + '0' * 32)
+os.environ.setdefault('PASSWORD_HASH_PROCESSOS', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import event  # noqa: E402
+
+import api  # noqa: E402
+from api import app, db, User, Compra, Categoria, GastoMensal  # noqa: E402
+
+EMAIL = 'benchmark-exclusao@example.com'
+SENHA = 'senha-de-teste'
+
+
+def criar_usuario_sintetico(quantidade_compras):
+    user = User(email=EMAIL)
+    user.set_password(SENHA)
+    db.session.add(user)
+    db.session.flush()
+    db.session.execute(db.insert(Categoria), [dict(c, user_id=user.id) for c in api.CATEGORIAS_PADRAO])
+    inicio = date(2020, 1, 1)
+    for deslocamento in range(0, quantidade_compras, api.TAMANHO_LOTE_INSERCAO):
+        db.session.execute(db.insert(Compra), [
+            {'nome': f'Item {i}', 'quantidade': 1, 'valor_unitario': 9.9, 'categoria': 'Mercado',
+             'data': inicio + timedelta(days=i % 2000), 'user_id': user.id}
+            for i in range(deslocamento, min(deslocamento + api.TAMANHO_LOTE_INSERCAO, quantidade_compras))
+        ])
+    db.session.execute(db.insert(GastoMensal).from_select(
+        ['user_id', 'ano', 'mes', 'categoria', 'total'],
+        db.select(Compra.user_id, db.extract('year', Compra.data), db.extract('month', Compra.data), Compra.categoria,
+                  db.func.sum(Compra.quantidade * Compra.valor_unitario))
+        .where(Compra.user_id == user.id)
+        .group_by(Compra.user_id, db.extract('year', Compra.data), db.extract('month', Compra.data), Compra.categoria)))
+    db.session.commit()
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--compras', type=int, default=100000)
+    args = parser.parse_args()
+    with app.app_context():
+        db.create_all()
+        existente = User.query.filter_by(email=EMAIL).first()
+        if existente:
+            db.session.execute(db.delete(User).where(User.id == existente.id))
+            db.session.commit()
+        user_id = criar_usuario_sintetico(args.compras)
+        cliente = app.test_client()
+        token = cliente.post('/login', json={'email': EMAIL, 'password': SENHA}).json['access_token']
+
+        comandos = []
+        registrar = lambda conn, cursor, sql, *resto: comandos.append(sql.split(None, 1)[0].upper())
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        resposta = cliente.delete('/conta', json={'password': SENHA}, headers={'Authorization': f'Bearer {token}'})
+        duracao = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+        restantes = sum(db.session.scalar(db.select(db.func.count()).select_from(modelo).where(modelo.user_id == user_id))
+                        for modelo in (Compra, Categoria, GastoMensal))
+        print(f"status: {resposta.status_code}")
+        print(f"compras excluídas: {args.compras}")
+        print(f"comandos SQL: {len(comandos)} ({', '.join(comandos)})")
+        print(f"pico de memória Python: {pico / 1024:.1f} KiB")
+        print(f"tempo: {duracao * 1000:.1f} ms")
+        print(f"linhas restantes do usuário: {restantes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Memória do worker ao exportar um histórico grande por GET /exportar (CSV ou OFX).
+
+Uso: python benchmarks/exportacao.py [--linhas 1000000] [--formato csv]
+
+Cria um usuário sintético com --linhas compras em um SQLite temporário (ou no DATABASE_URL
+informado), consome a resposta em streaming e mede o pico de memória Python com tracemalloc
+a cada 10% das linhas. Com o cursor do servidor em lotes, o pico não deve crescer com o histórico.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'exportacao.db')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-' + '0' * 32)
+os.environ.setdefault('PASSWORD_HASH_PROCESSOS', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import app, db, User, Compra  # noqa: E402
+
+EMAIL = 'benchmark-exportacao@example.com'
+SENHA = 'senha-de-teste'
+TAMANHO_LOTE = 10000
+
+
+def criar_usuario_sintetico(quantidade_compras):
+    existente = User.query.filter_by(email=EMAIL).first()
+    if existente:
+        db.session.execute(db.delete(User).where(User.id == existente.id))
+    user = User(email=EMAIL)
+    user.set_password(SENHA)
+    db.session.add(user)
+    db.session.flush()
+    inicio = date(2000, 1, 1)
+    for deslocamento in range(0, quantidade_compras, TAMANHO_LOTE):
+        db.session.execute(db.insert(Compra), [
+            {'nome': f'Item sintético {i}', 'quantidade': 1, 'valor_unitario': 9.9, 'categoria': 'Mercado',
+             'data': inicio + timedelta(days=i * 9000 // quantidade_compras), 'user_id': user.id}
+            for i in range(deslocamento, min(deslocamento + TAMANHO_LOTE, quantidade_compras))
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--formato', choices=['csv', 'ofx'], default='csv')
+    args = parser.parse_args()
+    with app.app_context():
+        db.create_all()
+        criar_usuario_sintetico(args.linhas)
+    cliente = app.test_client()
+    token = cliente.post('/login', json={'email': EMAIL, 'password': SENHA}).json['access_token']
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resposta = cliente.get(f'/exportar?formato={args.formato}', headers={'Authorization': f'Bearer {token}'}, buffered=False)
+    total_bytes, linhas, proximo_relatorio = 0, 0, args.linhas // 10
+    for pedaco in resposta.response:
+        total_bytes += len(pedaco)
+        linhas += pedaco.count(b'\n')
+        if linhas >= proximo_relatorio:
+            atual, pico = tracemalloc.get_traced_memory()
+            print(f"{linhas:>9} linhas: memória atual {atual / 1024 / 1024:6.1f} MiB, pico {pico / 1024 / 1024:6.1f} MiB")
+            proximo_relatorio += args.linhas // 10
+    resposta.close()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"status: {resposta.status_code}")
+    print(f"exportado: {total_bytes / 1024 / 1024:.1f} MiB em {duracao:.1f} s")
+    print(f"pico de memória Python durante a exportação: {pico / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
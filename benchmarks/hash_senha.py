@@ -0,0 +1,58 @@
+"""Logins/segundo por worker para cada configuração de hash de senha.
+
+Uso: python benchmarks/hash_senha.py [--metodos scrypt:32768:8:1 pbkdf2:sha256:600000] [--processos 0 2 4]
+
+Para cada método mede check_password_hash executado inline (1 thread, como um worker sync)
+e por meio de um pool de N processos alimentado por várias threads (como um worker gthread).
+"""
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def medir_inline(hash_senha, duracao):
+    fim, logins = time.perf_counter() + duracao, 0
+    while time.perf_counter() < fim:
+        check_password_hash(hash_senha, 'senha-de-teste')
+        logins += 1
+    return logins / duracao
+
+
+def medir_pool(hash_senha, processos, duracao):
+    with ProcessPoolExecutor(processos, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pool.submit(check_password_hash, hash_senha, 'aquecimento').result()
+        fim = time.perf_counter() + duracao
+
+        def cliente():
+            logins = 0
+            while time.perf_counter() < fim:
+                pool.submit(check_password_hash, hash_senha, 'senha-de-teste').result()
+                logins += 1
+            return logins
+
+        with ThreadPoolExecutor(processos * 2) as threads:
+            total = sum(threads.map(lambda _: cliente(), range(processos * 2)))
+    return total / duracao
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metodos', nargs='+', default=['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'])
+    parser.add_argument('--processos', nargs='+', type=int, default=[0, 2, 4])
+    parser.add_argument('--duracao', type=float, default=3.0)
+    args = parser.parse_args()
+    for metodo in args.metodos:
+        hash_senha = generate_password_hash('senha-de-teste', metodo)
+        for processos in args.processos:
+            if processos == 0:
+                taxa = medir_inline(hash_senha, args.duracao)
+            else:
+                taxa = medir_pool(hash_senha, processos, args.duracao)
+            print(f"{metodo:<24} processos={processos}: {taxa:7.1f} logins/s")
+
+
+if __name__ == '__main__':
+    main()
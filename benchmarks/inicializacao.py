@@ -0,0 +1,51 @@
+"""Mede o tempo de importação do app e da primeira requisição em um processo novo.
+
+Uso: python benchmarks/inicializacao.py [--repeticoes 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT_FILHO = """
+import json, sys, time
+inicio = time.perf_counter()
+import api
+importado = time.perf_counter()
+resposta = api.app.test_client().get('/')
+primeira_requisicao = time.perf_counter()
+print(json.dumps({
+    'importacao_ms': (importado - inicio) * 1000,
+    'primeira_requisicao_ms': (primeira_requisicao - importado) * 1000,
+    'status': resposta.status_code,
+    'google_carregado': any(m.startswith(('google.cloud.vision', 'google.generativeai')) for m in sys.modules),
+}))
+"""
+
+
+def medir():
+    ambiente = dict(os.environ)
+    ambiente.setdefault('DATABASE_URL', 'sqlite://')
+    ambiente.setdefault('JWT_SECRET_KEY', 'benchmark')
+    saida = subprocess.run([sys.executable, '-c', SCRIPT_FILHO], cwd=RAIZ, env=ambiente,
+                           capture_output=True, text=True, check=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+    medicoes = [medir() for _ in range(args.repeticoes)]
+    for campo in ('importacao_ms', 'primeira_requisicao_ms'):
+        valores = [m[campo] for m in medicoes]
+        print(f"{campo}: mediana {statistics.median(valores):.1f} ms (min {min(valores):.1f}, max {max(valores):.1f})")
+    print(f"SDKs do Google carregados na inicialização: {any(m['google_carregado'] for m in medicoes)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Compara bytes e latência com e sem o pré-processamento de imagem antes do OCR.
+
+Uso: python benchmarks/preprocessamento.py [pasta_com_comprovantes] [--vision]
+
+Sem pasta, gera um comprovante sintético (foto colorida de 4000x3000).
+Com --vision, mede também a latência da Vision API (exige credentials.json).
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dados  # noqa: E402
+
+
+def comprovante_sintetico():
+    imagem = Image.new('RGB', (3000, 4000), (236, 230, 214))
+    desenho = ImageDraw.Draw(imagem)
+    for linha in range(120):
+        desenho.text((200, 150 + linha * 30), f"ITEM {linha:03d}  ARROZ TIPO 1 5KG   1 UN x 24,90   24,90", fill=(30, 30, 30))
+    saida = io.BytesIO()
+    imagem.save(saida, format='JPEG', quality=95)
+    return 'sintetico.jpg', saida.getvalue()
+
+
+def carregar_imagens(pasta):
+    if not pasta:
+        return [comprovante_sintetico()]
+    return [(nome, open(os.path.join(pasta, nome), 'rb').read())
+            for nome in sorted(os.listdir(pasta)) if nome.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
+
+
+def medir_vision(conteudo):
+    inicio = time.perf_counter()
+    dados.extrair_texto_da_imagem(conteudo)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pasta', nargs='?')
+    parser.add_argument('--vision', action='store_true')
+    args = parser.parse_args()
+    total_original = total_processado = 0
+    for nome, original in carregar_imagens(args.pasta):
+        inicio = time.perf_counter()
+        processado = dados.preprocessar_imagem(original)
+        tempo_ms = (time.perf_counter() - inicio) * 1000
+        total_original += len(original)
+        total_processado += len(processado)
+        linha = f"{nome}: {len(original) / 1024:.0f} KB -> {len(processado) / 1024:.0f} KB em {tempo_ms:.0f} ms"
+        if args.vision:
+            linha += f" | Vision original {medir_vision(original):.0f} ms, processada {medir_vision(processado):.0f} ms"
+        print(linha)
+    if total_original:
+        print(f"Total: {total_original / 1024:.0f} KB -> {total_processado / 1024:.0f} KB "
+              f"({1 - total_processado / total_original:.0%} menor)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import math
+import re
+import unicodedata
+
+
+def tokenizar(nome):
+    # Tokens minúsculos sem acento, mais bigramas de tokens ("arroz 5kg" -> arroz, 5kg, arroz_5kg)
+    sem_acentos = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode().lower()
+    palavras = re.findall(r"[a-z0-9]+", sem_acentos)
+    return palavras + [f"{a}_{b}" for a, b in zip(palavras, palavras[1:])]
+
+
+class ClassificadorNaiveBayes:
+    """Naive Bayes multinomial sobre os tokens do nome do item."""
+
+    def __init__(self, categorias_validas=None, alfa=1.0):
+        self.categorias_validas = set(categorias_validas) if categorias_validas else None
+        self.alfa = alfa
+        self.total_exemplos = 0
+        self.log_prioris = {}
+        self.log_verossimilhancas = {}
+        self.log_token_desconhecido = {}
+
+    def treinar(self, exemplos):
+        # exemplos: iterável de (nome, categoria)
+        contagem_categorias, contagem_tokens, vocabulario = {}, {}, set()
+        for nome, categoria in exemplos:
+            if not categoria or (self.categorias_validas and categoria not in self.categorias_validas):
+                continue
+            tokens = tokenizar(nome)
+            if not tokens:
+                continue
+            contagem_categorias[categoria] = contagem_categorias.get(categoria, 0) + 1
+            tokens_da_categoria = contagem_tokens.setdefault(categoria, {})
+            for token in tokens:
+                tokens_da_categoria[token] = tokens_da_categoria.get(token, 0) + 1
+                vocabulario.add(token)
+        self.total_exemplos = sum(contagem_categorias.values())
+        tamanho_vocabulario = len(vocabulario) or 1
+        self.log_prioris, self.log_verossimilhancas, self.log_token_desconhecido = {}, {}, {}
+        for categoria, quantidade in contagem_categorias.items():
+            self.log_prioris[categoria] = math.log(quantidade / self.total_exemplos)
+            tokens_da_categoria = contagem_tokens[categoria]
+            denominador = sum(tokens_da_categoria.values()) + self.alfa * tamanho_vocabulario
+            self.log_verossimilhancas[categoria] = {
+                token: math.log((contagem + self.alfa) / denominador) for token, contagem in tokens_da_categoria.items()
+            }
+            self.log_token_desconhecido[categoria] = math.log(self.alfa / denominador)
+        return self
+
+    def prever(self, nome):
+        """Retorna (categoria, confianca) com confianca = probabilidade a posteriori, ou (None, 0.0)."""
+        tokens = tokenizar(nome)
+        if not tokens or not self.log_prioris:
+            return None, 0.0
+        pontuacoes = {}
+        for categoria, log_priori in self.log_prioris.items():
+            verossimilhancas = self.log_verossimilhancas[categoria]
+            desconhecido = self.log_token_desconhecido[categoria]
+            pontuacoes[categoria] = log_priori + sum(verossimilhancas.get(token, desconhecido) for token in tokens)
+        melhor = max(pontuacoes, key=pontuacoes.get)
+        maior = pontuacoes[melhor]
+        normalizador = sum(math.exp(pontuacao - maior) for pontuacao in pontuacoes.values())
+        return melhor, 1.0 / normalizador
+
+
+class ClassificadorEmCamadas:
+    """Consulta os classificadores em ordem (ex.: do usuário, depois global) e para no primeiro confiante."""
+
+    def __init__(self, classificadores, limiar):
+        self.classificadores = [c for c in classificadores if c is not None]
+        self.limiar = limiar
+
+    def prever(self, nome):
+        melhor = (None, 0.0)
+        for classificador in self.classificadores:
+            categoria, confianca = classificador.prever(nome)
+            if confianca >= self.limiar:
+                return categoria, confianca
+            if confianca > melhor[1]:
+                melhor = (categoria, confianca)
+        return melhor
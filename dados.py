@@ -1,42 +1,110 @@
 import requests
 from bs4 import BeautifulSoup
 import re
-import google.generativeai as genai
 import os
 import json
-from PIL import Image
-from google.cloud import vision
-from google.oauth2 import service_account
+import copy
+import hashlib
+import importlib.util
+import threading
+import unicodedata
+import io
+import time
+from urllib.parse import urljoin, urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache, LRUCache
+from PIL import Image, ImageOps
 from datetime import datetime
 
-# --- Configuração (sem alterações) ---
-API_KEY = os.getenv('GEMINI_API_KEY')
-model = None
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-else:
-    print("AVISO: GEMINI_API_KEY não foi encontrada no ambiente.")
-
-vision_client = None
+# --- Configuração ---
+# Os clientes do Gemini e da Vision são criados sob demanda (primeiro uso), não na importação:
+# os workers sobem sem pagar os imports do google-cloud/generativeai e, com o --preload do
+# gunicorn, nenhum canal gRPC é herdado pelo fork (cada processo cria os seus, vide o pid).
+# Com workers gthread/gevent os mesmos objetos atendem várias requisições ao mesmo tempo: os
+# clientes gRPC da Vision e o GenerativeModel são thread-safe; a Session HTTP não, e é por thread.
 render_credentials_path = "/etc/secrets/credentials.json"
 local_credentials_path = "credentials.json"
-CREDENTIALS_PATH = ""
 
-if os.path.exists(render_credentials_path):
-    CREDENTIALS_PATH = render_credentials_path
-elif os.path.exists(local_credentials_path):
-    CREDENTIALS_PATH = local_credentials_path
+_clientes_lock = threading.Lock()
+_clientes = {}
+
+
+def _cliente_do_processo(nome, criar):
+    with _clientes_lock:
+        registro = _clientes.get(nome)
+        if registro is None or registro[0] != os.getpid():
+            registro = (os.getpid(), criar())
+            _clientes[nome] = registro
+        return registro[1]
+
+
+def _criar_modelo_gemini():
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        print("AVISO: GEMINI_API_KEY não foi encontrada no ambiente.")
+        return None
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
 
-if CREDENTIALS_PATH:
+def _criar_vision_client():
+    credentials_path = ""
+    if os.path.exists(render_credentials_path):
+        credentials_path = render_credentials_path
+    elif os.path.exists(local_credentials_path):
+        credentials_path = local_credentials_path
+    if not credentials_path:
+        print("AVISO: Arquivo de credenciais 'credentials.json' não foi encontrado.")
+        return None
     try:
-        credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_PATH)
-        vision_client = vision.ImageAnnotatorClient(credentials=credentials)
+        from google.cloud import vision
+        from google.oauth2 import service_account
+        credentials = service_account.Credentials.from_service_account_file(credentials_path)
+        cliente = vision.ImageAnnotatorClient(credentials=credentials)
         print("-> Cliente do Google Cloud Vision inicializado com sucesso.")
+        return cliente
     except Exception as e:
         print(f"### ERRO AO INICIALIZAR CLIENTE DO GOOGLE CLOUD VISION: {e} ###")
-else:
-    print("AVISO: Arquivo de credenciais 'credentials.json' não foi encontrado.")
+        return None
+
+
+def obter_modelo_gemini():
+    return _cliente_do_processo('gemini', _criar_modelo_gemini)
+
+
+def obter_vision_client():
+    return _cliente_do_processo('vision', _criar_vision_client)
+
+
+def _criar_adaptador_http():
+    # O pool de conexões fica no HTTPAdapter (thread-safe): reaproveita conexões TLS com a SEFAZ
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+    return HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+
+
+_sessoes_por_thread = threading.local()
+
+
+def obter_sessao_http():
+    # Uma Session por thread/greenlet (cookies da SEFAZ e headers não são thread-safe e não podem
+    # vazar entre usuários), todas montadas sobre o mesmo adaptador do processo
+    adaptador = _cliente_do_processo('http', _criar_adaptador_http)
+    sessao = getattr(_sessoes_por_thread, 'sessao', None)
+    if sessao is None or sessao.get_adapter('https://') is not adaptador:
+        sessao = requests.Session()
+        sessao.mount('https://', adaptador)
+        sessao.mount('http://', adaptador)
+        sessao.headers.update({'User-Agent': 'Mozilla/5.0 (compatible; meu-app-financeiro)'})
+        _sessoes_por_thread.sessao = sessao
+    return sessao
+
+
+def reiniciar_clientes():
+    # Chamado no post_fork do gunicorn: descarta qualquer cliente criado no processo mestre
+    with _clientes_lock:
+        _clientes.clear()
 
 LISTA_DE_CATEGORIAS = [
     'Mercado', 'Alimentação', 'Saúde', 'Cuidados pessoais', 'Bares e restaurantes', 
@@ -45,29 +113,146 @@ LISTA_DE_CATEGORIAS = [
     'Impostos e Taxas', 'Trabalho', 'Outros', 'Não Categorizado'
 ]
 CATEGORIAS_PARA_PROMPT = ", ".join(f"'{cat}'" for cat in LISTA_DE_CATEGORIAS)
+
+# Cache de OCR/extração endereçado pelo SHA-256 dos bytes da imagem (reenvios do mesmo comprovante)
+OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', str(24 * 3600)))
+OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+cache_ocr = TTLCache(maxsize=OCR_CACHE_MAX_BYTES, ttl=OCR_CACHE_TTL, getsizeof=lambda entrada: entrada['tamanho'])
+cache_ocr_lock = threading.Lock()
+cache_ocr_contadores = {'acertos': 0, 'falhas': 0}
+
+# Cache de classificações em dois níveis: LRU em memória + armazenamento persistente registrado pela API
+CACHE_CATEGORIAS_TAMANHO = int(os.getenv('CACHE_CATEGORIAS_TAMANHO', '8192'))
+CONTEXTO_ESTABELECIMENTO = '#estabelecimento'
+cache_categorias = LRUCache(maxsize=CACHE_CATEGORIAS_TAMANHO)
+cache_categorias_lock = threading.Lock()
+cache_categorias_contadores = {'acertos': 0, 'falhas': 0}
+armazenamento_categorias = None
+
+# Pré-processamento antes do OCR: lado maior em pixels (~300 dpi para cupons de 80 mm) e qualidade JPEG
+IMAGEM_LADO_MAXIMO = int(os.getenv('IMAGEM_LADO_MAXIMO', '2000'))
+IMAGEM_QUALIDADE_JPEG = int(os.getenv('IMAGEM_QUALIDADE_JPEG', '80'))
+
+# Consulta de NFC-e na SEFAZ: timeouts (conexão, leitura), pool HTTP e cache por chave de acesso
+NFCE_TIMEOUT = (float(os.getenv('NFCE_TIMEOUT_CONEXAO', '5')), float(os.getenv('NFCE_TIMEOUT_LEITURA', '20')))
+NFCE_CACHE_TAMANHO = int(os.getenv('NFCE_CACHE_TAMANHO', '2048'))
+NFCE_CACHE_TTL = int(os.getenv('NFCE_CACHE_TTL', str(7 * 24 * 3600)))
+cache_nfce = TTLCache(maxsize=NFCE_CACHE_TAMANHO, ttl=NFCE_CACHE_TTL)
+cache_nfce_lock = threading.Lock()
+# Intervalo mínimo entre requisições ao mesmo host (importação em lote faz várias consultas em paralelo)
+NFCE_INTERVALO_POR_HOST = float(os.getenv('NFCE_INTERVALO_POR_HOST', '0.25'))
+_proximo_horario_por_host = {}
+_proximo_horario_lock = threading.Lock()
+# Só estas origens (esquema://host[:porta]) são consultadas, inclusive iframes e redirecionamentos:
+# a URL vem do usuário e não pode levar o servidor a hosts internos ou ao serviço de metadados da nuvem
+NFCE_ORIGENS_PERMITIDAS = {
+    origem.strip().rstrip('/').lower()
+    for origem in os.getenv('NFCE_ORIGENS_PERMITIDAS', 'https://www.sefaz.rs.gov.br,https://dfe-portal.svrs.rs.gov.br').split(',')
+    if origem.strip()
+}
+NFCE_MAXIMO_REDIRECIONAMENTOS = 5
+# lxml é opcional: bem mais rápido que o html.parser nas páginas grandes da SEFAZ
+PARSER_HTML = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+# Confiança mínima do classificador local (classificador.py) para dispensar a chamada ao Gemini
+CLASSIFICADOR_LIMIAR = float(os.getenv('CLASSIFICADOR_LIMIAR', '0.9'))
 # --- Fim da Configuração ---
 
 
+# --- Cache de classificações ---
+def registrar_armazenamento_categorias(armazenamento):
+    # armazenamento deve expor buscar(chaves) -> {chave: valor} e guardar({chave: valor}),
+    # com chave = (nome_normalizado, contexto_normalizado)
+    global armazenamento_categorias
+    armazenamento_categorias = armazenamento
+
+def normalizar_chave(texto):
+    sem_acentos = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return " ".join(sem_acentos.lower().split())[:200]
+
+def buscar_classificacoes(chaves):
+    encontradas, faltantes = {}, []
+    with cache_categorias_lock:
+        for chave in chaves:
+            if chave in cache_categorias:
+                encontradas[chave] = cache_categorias[chave]
+            else:
+                faltantes.append(chave)
+    if faltantes and armazenamento_categorias:
+        try:
+            persistidas = armazenamento_categorias.buscar(faltantes)
+        except Exception as e:
+            print(f"### ERRO ao consultar o cache persistente de categorias: {e} ###")
+            persistidas = {}
+        encontradas.update(persistidas)
+        with cache_categorias_lock:
+            cache_categorias.update(persistidas)
+    with cache_categorias_lock:
+        cache_categorias_contadores['acertos'] += len(encontradas)
+        cache_categorias_contadores['falhas'] += len(chaves) - len(encontradas)
+    return encontradas
+
+def guardar_classificacoes(novas):
+    if not novas: return
+    with cache_categorias_lock:
+        cache_categorias.update(novas)
+    if armazenamento_categorias:
+        try:
+            armazenamento_categorias.guardar(novas)
+        except Exception as e:
+            print(f"### ERRO ao gravar o cache persistente de categorias: {e} ###")
+
+def estatisticas_cache_categorias():
+    with cache_categorias_lock:
+        return dict(cache_categorias_contadores, entradas=len(cache_categorias))
+
+
 # --- Funções Auxiliares de IA (sem alterações, mas com uma nova função) ---
 def classificar_local_com_ia(nome_local):
-    #... (sem alterações)
+    chave = (normalizar_chave(nome_local), CONTEXTO_ESTABELECIMENTO)
+    em_cache = buscar_classificacoes([chave])
+    if chave in em_cache: return em_cache[chave]
+    model = obter_modelo_gemini()
     if not model: return "Desconhecido"
     try:
         prompt = (f"Classifique o tipo do seguinte estabelecimento comercial: '{nome_local}'. "
                   "Responda com uma única palavra ou expressão curta, como 'Supermercado', 'Farmácia', 'Posto de Combustível', etc.")
         response = model.generate_content(prompt)
-        return response.text.strip()
+        tipo_local = response.text.strip()
+        guardar_classificacoes({chave: tipo_local})
+        return tipo_local
     except Exception as e:
         print(f"### ERRO ao classificar local: {e} ###")
         return "Desconhecido"
 
 
-def categorizar_lista_inteira_com_ia(itens, tipo_local):
-    #... (sem alterações)
-    if not model: return {item['nome']: 'Não Categorizado' for item in itens}
+def categorizar_com_classificador_local(nomes, classificador):
+    # Caminho rápido: retorna {nome: categoria} só para as previsões acima do limiar
+    previstas = {}
+    for nome in nomes:
+        categoria, confianca = classificador.prever(nome)
+        if categoria and confianca >= CLASSIFICADOR_LIMIAR:
+            previstas[nome] = categoria
+    return previstas
+
+
+def categorizar_lista_inteira_com_ia(itens, tipo_local, classificador=None):
+    # Ordem: cache -> classificador local (se informado) -> Gemini só para o que sobrar
+    contexto = normalizar_chave(tipo_local)
+    chaves = {item['nome']: (normalizar_chave(item['nome']), contexto) for item in itens}
+    em_cache = buscar_classificacoes(list(set(chaves.values())))
+    resultado = {nome: em_cache[chave] for nome, chave in chaves.items() if chave in em_cache}
+    faltantes = list(dict.fromkeys(nome for nome, chave in chaves.items() if chave not in em_cache))
+    if faltantes and classificador:
+        resultado.update(categorizar_com_classificador_local(faltantes, classificador))
+        faltantes = [nome for nome in faltantes if nome not in resultado]
+    if not faltantes: return resultado
+    model = obter_modelo_gemini()
+    if not model:
+        resultado.update({nome: 'Não Categorizado' for nome in faltantes})
+        return resultado
     try:
-        nomes_itens = [item['nome'] for item in itens]
-        lista_formatada = "\n".join(f"- {nome}" for nome in nomes_itens)
+        lista_formatada = "\n".join(f"- {nome}" for nome in faltantes)
         prompt = (f"A compra a seguir foi feita em um '{tipo_local}'. "
                   f"Analise a lista de itens e retorne um array JSON com a categoria de cada um, escolhida da lista [{CATEGORIAS_PARA_PROMPT}].\n"
                   f"Use a categoria 'Outros' para itens que não se encaixam bem nas demais.\n"
@@ -77,14 +262,24 @@ def categorizar_lista_inteira_com_ia(itens, tipo_local):
         response = model.generate_content(prompt)
         resposta_texto = response.text.strip().replace("```json", "").replace("```", "")
         categorias_json = json.loads(resposta_texto)
-        return {item['item']: item['categoria'] for item in categorias_json}
+        sugeridas = {normalizar_chave(item['item']): item['categoria'] for item in categorias_json}
+        novas = {}
+        for nome in faltantes:
+            categoria = sugeridas.get(chaves[nome][0])
+            resultado[nome] = categoria or 'Não Categorizado'
+            if categoria and categoria != 'Não Categorizado':
+                novas[chaves[nome]] = categoria
+        guardar_classificacoes(novas)
+        return resultado
     except Exception as e:
         print(f"### ERRO ao categorizar lista: {e} ###")
-        return {item['nome']: 'Não Categorizado' for item in itens}
+        resultado.update({nome: 'Não Categorizado' for nome in faltantes})
+        return resultado
 
 
 def resumir_e_categorizar_compra_com_ia(texto_completo):
     #... (sem alterações)
+    model = obter_modelo_gemini()
     if not model: return {"nome": "Compra em Cartão", "categoria": "Outros"}
     try:
         prompt = (f"Analise o texto de um comprovante: '{texto_completo}'.\n"
@@ -100,6 +295,7 @@ def resumir_e_categorizar_compra_com_ia(texto_completo):
 
 # --- NOVA FUNÇÃO DE IA ESPECIALISTA EM DANFE ---
 def analisar_imagem_danfe_com_ia(texto_completo):
+    model = obter_modelo_gemini()
     if not model: return None
     print("-> Tentando extrair itens da DANFE com IA especializada...")
     try:
@@ -135,9 +331,127 @@ def analisar_imagem_danfe_com_ia(texto_completo):
         return None
 
 # --- Funções Principais de Processamento (sem alterações na assinatura) ---
-def extrair_dados_nota_fiscal(url):
-    #... (sem alterações)
-    return None
+def extrair_chave_acesso(url):
+    # A chave (44 dígitos) vem em ?chNFe=... ou como primeiro campo de ?p=CHAVE|2|1|...
+    parametros = parse_qs(urlparse(url).query)
+    for valor in parametros.get('chNFe', []) + [p.split('|')[0] for p in parametros.get('p', [])]:
+        if re.fullmatch(r"\d{44}", valor.strip()):
+            return valor.strip()
+    encontrada = re.search(r"(?<!\d)\d{44}(?!\d)", url)
+    return encontrada.group(0) if encontrada else None
+
+
+def aguardar_vez_do_host(url):
+    # Reserva o próximo horário livre do host e dorme até ele (fora do lock)
+    host = urlparse(url).netloc
+    with _proximo_horario_lock:
+        agora = time.monotonic()
+        horario = max(agora, _proximo_horario_por_host.get(host, 0.0))
+        _proximo_horario_por_host[host] = horario + NFCE_INTERVALO_POR_HOST
+    if horario > agora:
+        time.sleep(horario - agora)
+
+
+class UrlNaoPermitida(requests.RequestException):
+    pass
+
+
+def url_permitida_nfce(url):
+    partes = urlparse(url)
+    return f"{partes.scheme}://{partes.netloc}".lower() in NFCE_ORIGENS_PERMITIDAS
+
+
+def _get_permitido(sessao, url):
+    # Segue os redirecionamentos manualmente para validar cada destino antes de conectar
+    for _ in range(NFCE_MAXIMO_REDIRECIONAMENTOS + 1):
+        if not url_permitida_nfce(url):
+            raise UrlNaoPermitida(f"Host não permitido para consulta de NFC-e: {urlparse(url).netloc}")
+        aguardar_vez_do_host(url)
+        resposta = sessao.get(url, timeout=NFCE_TIMEOUT, allow_redirects=False)
+        if not resposta.is_redirect:
+            resposta.raise_for_status()
+            return resposta
+        url = urljoin(resposta.url, resposta.headers['Location'])
+    raise requests.TooManyRedirects(f"Mais de {NFCE_MAXIMO_REDIRECIONAMENTOS} redirecionamentos")
+
+
+def baixar_pagina_nfce(url):
+    sessao = obter_sessao_http()
+    resposta = _get_permitido(sessao, url)
+    html = resposta.text
+    # A página do RS embute o DANFE do portal SVRS em um iframe: segue o iframe uma vez (se a origem for permitida)
+    if 'tabResult' not in html:
+        iframe = BeautifulSoup(html, PARSER_HTML).find('iframe', src=True)
+        if iframe:
+            html = _get_permitido(sessao, urljoin(resposta.url, iframe['src'])).text
+    return html
+
+
+def _texto_apos_rotulo(elemento):
+    # "Qtde.:1" -> "1"; "Vl. Unit.:   24,9" -> "24,9"
+    return elemento.get_text(" ", strip=True).split(':')[-1].strip() if elemento else ''
+
+
+def interpretar_pagina_nfce(html):
+    # Layout padrão do DANFE NFC-e (portal SVRS): tabela #tabResult com uma linha por item
+    sopa = BeautifulSoup(html, PARSER_HTML)
+    tabela = sopa.find('table', id='tabResult')
+    if not tabela:
+        return None
+    itens_comprados = []
+    for linha in tabela.find_all('tr'):
+        nome = linha.find('span', class_='txtTit')
+        if not nome:
+            continue
+        quantidade = converter_valor_brasileiro(_texto_apos_rotulo(linha.find('span', class_='Rqtd'))) or 1.0
+        valor_unitario = converter_valor_brasileiro(_texto_apos_rotulo(linha.find('span', class_='RvlUnit')))
+        valor_total_item = linha.find('span', class_='valor')
+        if not valor_unitario and valor_total_item:
+            valor_unitario = converter_valor_brasileiro(valor_total_item.get_text()) / quantidade
+        itens_comprados.append({
+            'nome': nome.get_text(" ", strip=True),
+            'quantidade': quantidade,
+            'valor_unitario': valor_unitario,
+        })
+    if not itens_comprados:
+        return None
+    texto = sopa.get_text(" ", strip=True)
+    data_match = re.search(r"Emiss[ãa]o:?\s*(\d{2}/\d{2}/\d{4})", texto) or re.search(r"(\d{2}/\d{2}/\d{4})", texto)
+    emitente = sopa.find(id='u20') or sopa.find(class_='txtTopo')
+    total = sopa.find('span', class_='totalNumb')
+    chave = sopa.find('span', class_='chave')
+    return {
+        'data': data_match.group(1) if data_match else datetime.now().strftime("%d/%m/%Y"),
+        'estabelecimento': emitente.get_text(" ", strip=True) if emitente else None,
+        'chave': re.sub(r"\D", "", chave.get_text()) if chave else None,
+        'itens_comprados': itens_comprados,
+        'valor_total': converter_valor_brasileiro(total.get_text()) if total else
+                       round(sum(i['quantidade'] * i['valor_unitario'] for i in itens_comprados), 2),
+    }
+
+
+def extrair_dados_nota_fiscal(url, classificador=None):
+    # Consulta a NFC-e (cacheada pela chave de acesso) e categoriza os itens
+    chave_cache = extrair_chave_acesso(url) or url
+    with cache_nfce_lock:
+        dados_nota = copy.deepcopy(cache_nfce.get(chave_cache))
+    if dados_nota is None:
+        try:
+            dados_nota = interpretar_pagina_nfce(baixar_pagina_nfce(url))
+        except requests.RequestException as e:
+            print(f"### ERRO ao consultar a NFC-e: {e} ###")
+            return None
+        if not dados_nota:
+            print("AVISO: Página da NFC-e sem itens reconhecíveis.")
+            return None
+        dados_nota['chave'] = dados_nota['chave'] or extrair_chave_acesso(url)
+        with cache_nfce_lock:
+            cache_nfce[chave_cache] = copy.deepcopy(dados_nota)
+    tipo_local = classificar_local_com_ia(dados_nota['estabelecimento']) if dados_nota['estabelecimento'] else 'Desconhecido'
+    categorias = categorizar_lista_inteira_com_ia(dados_nota['itens_comprados'], tipo_local, classificador)
+    for item in dados_nota['itens_comprados']:
+        item['categoria'] = categorias.get(item['nome'], 'Não Categorizado')
+    return dados_nota
 
 def converter_valor_brasileiro(valor_str):
     #... (sem alterações)
@@ -148,12 +462,72 @@ def converter_valor_brasileiro(valor_str):
     except ValueError:
         return 0.0
 
+# --- CACHE DE OCR ---
+def buscar_cache_ocr(chave):
+    with cache_ocr_lock:
+        entrada = cache_ocr.get(chave)
+        cache_ocr_contadores['acertos' if entrada else 'falhas'] += 1
+        return copy.deepcopy(entrada) if entrada else None
+
+def guardar_cache_ocr(chave, texto_extraido, resultado):
+    tamanho = len(texto_extraido.encode()) + len(json.dumps(resultado, ensure_ascii=False).encode())
+    if tamanho > OCR_CACHE_MAX_BYTES: return
+    with cache_ocr_lock:
+        cache_ocr[chave] = {'texto': texto_extraido, 'resultado': copy.deepcopy(resultado), 'tamanho': tamanho}
+
+def estatisticas_cache_ocr():
+    with cache_ocr_lock:
+        return {
+            'acertos': cache_ocr_contadores['acertos'],
+            'falhas': cache_ocr_contadores['falhas'],
+            'entradas': len(cache_ocr),
+            'bytes': cache_ocr.currsize,
+        }
+
+# --- PRÉ-PROCESSAMENTO DE IMAGEM ---
+def preprocessar_imagem(conteudo_imagem):
+    # Corrige a orientação EXIF, converte para tons de cinza, reduz o lado maior e re-codifica em JPEG.
+    # Em caso de falha devolve os bytes originais (a Vision aceita o arquivo como veio).
+    try:
+        with Image.open(io.BytesIO(conteudo_imagem)) as imagem:
+            # Em JPEG, draft() decodifica já em escala reduzida, sem materializar a imagem inteira
+            imagem.draft('L', (IMAGEM_LADO_MAXIMO, IMAGEM_LADO_MAXIMO))
+            imagem = ImageOps.exif_transpose(imagem).convert('L')
+            imagem.thumbnail((IMAGEM_LADO_MAXIMO, IMAGEM_LADO_MAXIMO), Image.LANCZOS)
+            saida = io.BytesIO()
+            imagem.save(saida, format='JPEG', quality=IMAGEM_QUALIDADE_JPEG, optimize=True)
+        processada = saida.getvalue()
+        print(f"-> Imagem pré-processada: {len(conteudo_imagem)} -> {len(processada)} bytes")
+        return processada
+    except Exception as e:
+        print(f"AVISO: falha no pré-processamento da imagem, usando o original: {e}")
+        return conteudo_imagem
+
 # --- FUNÇÃO PRINCIPAL ATUALIZADA ---
 def analisar_imagem_comprovante(conteudo_imagem):
+    chave_cache = hashlib.sha256(conteudo_imagem).hexdigest()
+    em_cache = buscar_cache_ocr(chave_cache)
+    if em_cache and em_cache['resultado']:
+        print("-> Comprovante já analisado (cache de OCR).")
+        return em_cache['resultado']
+    if em_cache:
+        # Só o texto foi guardado (a extração falhou antes): pula a Vision e tenta a IA de novo
+        texto_extraido = em_cache['texto']
+    else:
+        texto_extraido = extrair_texto_da_imagem(preprocessar_imagem(conteudo_imagem))
+        if not texto_extraido:
+            return None
+    resultado = interpretar_texto_comprovante(texto_extraido)
+    guardar_cache_ocr(chave_cache, texto_extraido, resultado)
+    return copy.deepcopy(resultado)
+
+def extrair_texto_da_imagem(conteudo_imagem):
+    vision_client = obter_vision_client()
     if not vision_client:
         print("### ERRO CRÍTICO: Cliente do Google Cloud Vision não está inicializado. ###")
         return None
     try:
+        from google.cloud import vision
         imagem_vision = vision.Image(content=conteudo_imagem)
         print("Enviando imagem para a Google Cloud Vision API...")
         response = vision_client.document_text_detection(image=imagem_vision)
@@ -166,7 +540,13 @@ def analisar_imagem_comprovante(conteudo_imagem):
         print("\n--- Texto extraído pela Vision API ---")
         print(texto_extraido[:500] + "...") # Imprime apenas os primeiros 500 caracteres
         print("------------------------------------\n")
+        return texto_extraido
+    except Exception as e:
+        print(f"Erro no processamento com a Vision API: {e}")
+        return None
 
+def interpretar_texto_comprovante(texto_extraido):
+    try:
         # --- LÓGICA ATUALIZADA ---
         
         # 1. Tenta extrair a lista de itens usando a nova IA especialista em DANFE
@@ -230,5 +610,5 @@ def analisar_imagem_comprovante(conteudo_imagem):
         }
         
     except Exception as e:
-        print(f"Erro no processamento com a Vision API: {e}")
+        print(f"Erro na interpretação do texto do comprovante: {e}")
         return None
\ No newline at end of file
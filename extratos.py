@@ -0,0 +1,201 @@
+import codecs
+import csv
+import hashlib
+import io
+import re
+import unicodedata
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from xml.sax.saxutils import escape, unescape
+
+# Registros de extrato trocados com api.py: dicts com id, data (date), descricao, categoria,
+# quantidade, valor_unitario, valor (Decimal, positivo = gasto) e tipo ('compra' ou 'fixo')
+COLUNAS_CSV = ['data', 'descricao', 'categoria', 'quantidade', 'valor_unitario', 'valor', 'tipo']
+
+
+def gerar_csv(registros, tamanho_bloco):
+    """Gera o CSV em pedaços de `tamanho_bloco` linhas, sem acumular o arquivo inteiro."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_CSV)
+    for numero, registro in enumerate(registros, 1):
+        escritor.writerow([
+            registro['data'].strftime('%d/%m/%Y'), registro['descricao'], registro['categoria'] or '',
+            registro['quantidade'], registro['valor_unitario'], registro['valor'], registro['tipo'],
+        ])
+        if numero % tamanho_bloco == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _data_ofx(data):
+    return data.strftime('%Y%m%d')
+
+
+def gerar_ofx(registros, inicio, fim, gerado_em, tamanho_bloco):
+    """Gera um extrato OFX 2.1.1 (XML) em pedaços; gastos saem como débitos (TRNAMT negativo)."""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        '<?OFX OFXHEADER="200" VERSION="211" SECURITY="NONE" OLDFILEUID="NONE" NEWFILEUID="NONE"?>\n'
+        '<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>'
+        f'<DTSERVER>{gerado_em.strftime("%Y%m%d%H%M%S")}</DTSERVER><LANGUAGE>POR</LANGUAGE></SONRS></SIGNONMSGSRSV1>\n'
+        '<BANKMSGSRSV1><STMTTRNRS><TRNUID>0</TRNUID><STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY></STATUS>\n'
+        '<STMTRS><CURDEF>BRL</CURDEF><BANKACCTFROM><BANKID>0000</BANKID><ACCTID>meu-app-financeiro</ACCTID>'
+        '<ACCTTYPE>CHECKING</ACCTTYPE></BANKACCTFROM>\n'
+        f'<BANKTRANLIST><DTSTART>{_data_ofx(inicio)}</DTSTART><DTEND>{_data_ofx(fim)}</DTEND>\n'
+    )
+    partes, saldo = [], 0
+    for registro in registros:
+        saldo -= registro['valor']
+        memo = f"<MEMO>{escape(registro['categoria'])}</MEMO>" if registro['categoria'] else ''
+        partes.append(
+            f"<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>{_data_ofx(registro['data'])}</DTPOSTED>"
+            f"<TRNAMT>{-registro['valor']}</TRNAMT><FITID>{registro['id']}</FITID>"
+            f"<NAME>{escape(registro['descricao'][:32])}</NAME>{memo}</STMTTRN>\n"
+        )
+        if len(partes) == tamanho_bloco:
+            yield ''.join(partes)
+            partes = []
+    yield ''.join(partes) + (
+        f'</BANKTRANLIST><LEDGERBAL><BALAMT>{saldo}</BALAMT><DTASOF>{_data_ofx(fim)}</DTASOF></LEDGERBAL>'
+        '</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+    )
+
+
+# --- Importação ---
+# Lançamentos lidos dos extratos: dicts com data, descricao, valor (Decimal, positivo = gasto),
+# quantidade, valor_unitario e categoria (None quando o arquivo não traz uma). Os leitores produzem
+# tuplas (numero, lancamento, erro); créditos e custos fixos projetados saem com lancamento e erro None.
+
+# Nomes de coluna aceitos no CSV (já normalizados), além dos do próprio /exportar
+COLUNAS_CSV_IMPORTACAO = {
+    'data': 'data', 'data lancamento': 'data', 'data do lancamento': 'data', 'date': 'data',
+    'descricao': 'descricao', 'historico': 'descricao', 'lancamento': 'descricao', 'nome': 'descricao',
+    'estabelecimento': 'descricao', 'description': 'descricao',
+    'valor': 'valor', 'valor (r$)': 'valor', 'amount': 'valor',
+    'categoria': 'categoria', 'quantidade': 'quantidade', 'valor_unitario': 'valor_unitario', 'tipo': 'tipo',
+}
+_TRANSACAO_OFX = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.S | re.I)
+_CAMPO_OFX = re.compile(r'<(\w+)>([^<]*)')
+_ENTIDADES_XML = {'&quot;': '"', '&apos;': "'"}
+
+
+def normalizar_descricao(texto):
+    sem_acentos = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return " ".join(sem_acentos.lower().split())
+
+
+def converter_valor(texto):
+    # Aceita '1234.56', '-1.234,56' e 'R$ 12,90': o último separador é o decimal
+    texto = (texto or '').replace('R$', '').replace(' ', '').strip()
+    if ',' in texto and '.' in texto:
+        texto = texto.replace('.', '').replace(',', '.') if texto.rfind(',') > texto.rfind('.') else texto.replace(',', '')
+    elif ',' in texto:
+        texto = texto.replace(',', '.')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(f'Valor inválido: {texto!r}.')
+    if not valor.is_finite(): raise ValueError(f'Valor inválido: {texto!r}.')
+    return valor
+
+
+def _converter_data(texto):
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto.strip(), formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f'Data inválida: {texto!r}.')
+
+
+def ler_csv(fluxo, codificacao='utf-8-sig'):
+    """Lê um CSV linha a linha de um fluxo binário: o do /exportar (valor positivo = gasto, coluna tipo)
+    ou o de um banco (separador ',' ou ';', débitos negativos e créditos positivos, que são ignorados)."""
+    texto = io.TextIOWrapper(fluxo, encoding=codificacao, errors='replace', newline='')
+    primeira = texto.readline()
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    cabecalho = next(csv.reader([primeira], delimiter=delimitador), [])
+    colunas = {}
+    for indice, nome in enumerate(cabecalho):
+        campo = COLUNAS_CSV_IMPORTACAO.get(normalizar_descricao(nome))
+        if campo and campo not in colunas: colunas[campo] = indice
+    if not {'data', 'descricao', 'valor'} <= colunas.keys():
+        raise ValueError('O CSV precisa das colunas data, descrição e valor no cabeçalho.')
+    do_app = 'tipo' in colunas
+
+    def campo(linha, nome):
+        indice = colunas.get(nome)
+        return linha[indice].strip() if indice is not None and indice < len(linha) else ''
+
+    for numero, linha in enumerate(csv.reader(texto, delimiter=delimitador), 2):
+        if not any(celula.strip() for celula in linha): continue
+        try:
+            data, valor = _converter_data(campo(linha, 'data')), converter_valor(campo(linha, 'valor'))
+        except ValueError as erro:
+            yield numero, None, str(erro)
+            continue
+        if do_app and campo(linha, 'tipo') == 'fixo' or not do_app and valor >= 0:
+            yield numero, None, None
+            continue
+        valor = abs(valor)
+        try:
+            quantidade, valor_unitario = converter_valor(campo(linha, 'quantidade')), converter_valor(campo(linha, 'valor_unitario'))
+        except ValueError:
+            quantidade, valor_unitario = Decimal(1), valor
+        yield numero, {'data': data, 'descricao': campo(linha, 'descricao'), 'valor': valor, 'quantidade': quantidade,
+                       'valor_unitario': valor_unitario, 'categoria': campo(linha, 'categoria') or None}, None
+
+
+def _codificacao_ofx(inicio):
+    # OFX 2.x (XML) e os 1.x com ENCODING:UTF-8 vêm em UTF-8; os 1.x dos bancos costumam usar CHARSET:1252
+    return 'utf-8' if b'UTF-8' in inicio[:1024].upper() else 'cp1252'
+
+
+def _lancamento_ofx(numero, corpo):
+    campos = {nome.upper(): unescape(valor.strip(), _ENTIDADES_XML) for nome, valor in _CAMPO_OFX.findall(corpo)}
+    try:
+        valor = converter_valor(campos.get('TRNAMT'))
+        data = datetime.strptime(campos.get('DTPOSTED', '')[:8], '%Y%m%d').date()
+    except ValueError:
+        return numero, None, 'Transação sem TRNAMT ou DTPOSTED válidos.'
+    if valor >= 0: return numero, None, None
+    nome, memo = campos.get('NAME', ''), campos.get('MEMO', '')
+    # Sem NAME o MEMO é a descrição; com os dois, o MEMO pode ser a categoria (é o que o /exportar grava)
+    return numero, {'data': data, 'descricao': nome or memo, 'valor': -valor, 'quantidade': Decimal(1),
+                    'valor_unitario': -valor, 'categoria': memo if nome and memo else None}, None
+
+
+def ler_ofx(fluxo, tamanho_bloco):
+    """Lê as transações (STMTTRN) de um OFX 1.x (SGML) ou 2.x (XML) em blocos de `tamanho_bloco` bytes;
+    só o trecho ainda sem </STMTTRN> fica em memória. Débitos (TRNAMT negativo) viram gastos."""
+    decodificador, pendente, numero = None, '', 0
+    while True:
+        bloco = fluxo.read(tamanho_bloco)
+        if decodificador is None:
+            decodificador = codecs.getincrementaldecoder(_codificacao_ofx(bloco))(errors='replace')
+        pendente += decodificador.decode(bloco, final=not bloco)
+        consumido = 0
+        for transacao in _TRANSACAO_OFX.finditer(pendente):
+            numero += 1
+            consumido = transacao.end()
+            yield _lancamento_ofx(numero, transacao.group(1))
+        pendente = pendente[consumido:]
+        if not re.search('<STMTTRN>', pendente, re.I):
+            # Cabeçalho e saldos não interessam: guarda só o suficiente para uma tag partida entre blocos
+            pendente = pendente[-len('<STMTTRN>'):]
+        if not bloco: break
+
+
+def com_impressoes_digitais(leitor):
+    """Acrescenta a cada lançamento a impressão digital (sha256 de data, valor, descrição normalizada e
+    ocorrência): lançamentos iguais no mesmo arquivo continuam distintos e reimportar o arquivo gera as mesmas."""
+    ocorrencias = {}
+    for numero, lancamento, erro in leitor:
+        if lancamento:
+            chave = (lancamento['data'].isoformat(), f"{lancamento['valor']:.2f}", normalizar_descricao(lancamento['descricao']))
+            ocorrencias[chave] = ocorrencias.get(chave, 0) + 1
+            lancamento['fingerprint'] = hashlib.sha256('|'.join(chave + (str(ocorrencias[chave]),)).encode()).hexdigest()
+        yield numero, lancamento, erro
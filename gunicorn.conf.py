@@ -0,0 +1,41 @@
+# Configuração do Gunicorn (gunicorn --config gunicorn.conf.py api:app)
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# As rotas de OCR, Gemini, SendGrid e SEFAZ passam quase todo o tempo esperando rede:
+# - gthread (padrão): cada worker atende GUNICORN_THREADS requisições ao mesmo tempo
+# - gevent: greenlets (exige pip install gevent psycogreen); GUNICORN_WORKER_CONNECTIONS por worker
+# - sync: um processo inteiro por requisição, como antes
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# (threads > 1 com sync faria o gunicorn trocar para gthread sozinho, por isso só vale no gthread)
+threads = int(os.getenv('GUNICORN_THREADS', '4')) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '100'))
+
+if worker_class == 'gevent':
+    # O patch precisa vir antes de qualquer import de socket/ssl/threading do app (inclusive com preload)
+    from gevent import monkey
+    monkey.patch_all()
+    # O cliente do Vision é gRPC: sem a integração com o gevent as chamadas bloqueiam (ou travam) o worker.
+    # Precisa vir antes de criar qualquer canal; os clientes só são criados depois, sob demanda, em cada worker
+    import grpc.experimental.gevent
+    grpc.experimental.gevent.init_gevent()
+
+# Com GUNICORN_PRELOAD=1 o app é importado uma vez no mestre e compartilhado (copy-on-write) pelos workers
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # psycopg2 é C puro: sem este patch cada consulta bloquearia todas as greenlets do worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    # Nada de rede pode ser herdado do mestre: clientes gRPC e conexões do pool são recriados por processo
+    import dados
+    dados.reiniciar_clientes()
+    if preload_app:
+        from api import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,30 @@
+"""notas importadas
+
+Revision ID: 1d5f8b2a6c94
+Revises: e7a2b4c6d8f1
+Create Date: 2026-10-16 16:48:51.077340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d5f8b2a6c94'
+down_revision = 'e7a2b4c6d8f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notas_importadas',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('chave', sa.String(length=44), nullable=False),
+    sa.Column('importada_em', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'chave')
+    )
+
+
+def downgrade():
+    op.drop_table('notas_importadas')
@@ -0,0 +1,36 @@
+"""catálogo global de categorias
+
+Permite categorias com user_id nulo (catálogo compartilhado) e registra as
+cópias/ocultações feitas pelo usuário sobre elas.
+
+Revision ID: 4a8e6c1f3b27
+Revises: 1d5f8b2a6c94
+Create Date: 2026-10-16 18:10:29.664301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8e6c1f3b27'
+down_revision = '1d5f8b2a6c94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('categorias', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('origem_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('oculta', sa.Boolean(), server_default=sa.false(), nullable=False))
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.create_foreign_key('categorias_origem_id_fkey', 'categorias', ['origem_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.execute("DELETE FROM categorias WHERE user_id IS NULL")
+    with op.batch_alter_table('categorias', schema=None) as batch_op:
+        batch_op.drop_constraint('categorias_origem_id_fkey', type_='foreignkey')
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('oculta')
+        batch_op.drop_column('origem_id')
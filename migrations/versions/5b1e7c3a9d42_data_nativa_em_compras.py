@@ -0,0 +1,39 @@
+"""data nativa em compras
+
+Converte compras.data de String(10) 'dd/mm/yyyy' para Date e cria o índice
+composto (user_id, data) usado pelos filtros por mês.
+
+Revision ID: 5b1e7c3a9d42
+Revises: 28a0c32f28ed
+Create Date: 2026-10-16 10:12:31.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7c3a9d42'
+down_revision = '28a0c32f28ed'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('compras', schema=None) as batch_op:
+        batch_op.alter_column('data',
+               existing_type=sa.String(length=10),
+               type_=sa.Date(),
+               existing_nullable=False,
+               postgresql_using="to_date(data, 'DD/MM/YYYY')")
+        batch_op.create_index('ix_compras_user_id_data', ['user_id', 'data'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('compras', schema=None) as batch_op:
+        batch_op.drop_index('ix_compras_user_id_data')
+        batch_op.alter_column('data',
+               existing_type=sa.Date(),
+               type_=sa.String(length=10),
+               existing_nullable=False,
+               postgresql_using="to_char(data, 'DD/MM/YYYY')")
@@ -0,0 +1,50 @@
+"""gastos mensais
+
+Cria a tabela de totais mensais por categoria e a preenche a partir das
+compras existentes.
+
+Revision ID: 8c4d2f6e1a73
+Revises: 5b1e7c3a9d42
+Create Date: 2026-10-16 11:40:07.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4d2f6e1a73'
+down_revision = '5b1e7c3a9d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    gastos_mensais = op.create_table('gastos_mensais',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('ano', sa.Integer(), nullable=False),
+    sa.Column('mes', sa.Integer(), nullable=False),
+    sa.Column('categoria', sa.String(length=50), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'ano', 'mes', 'categoria')
+    )
+    compras = sa.table('compras',
+        sa.column('user_id', sa.Integer()),
+        sa.column('quantidade', sa.Float()),
+        sa.column('valor_unitario', sa.Float()),
+        sa.column('data', sa.Date()),
+        sa.column('categoria', sa.String()),
+    )
+    ano = sa.cast(sa.extract('year', compras.c.data), sa.Integer())
+    mes = sa.cast(sa.extract('month', compras.c.data), sa.Integer())
+    categoria = sa.func.coalesce(sa.func.nullif(compras.c.categoria, ''), 'Não Categorizado')
+    agregado = sa.select(
+        compras.c.user_id, ano, mes, categoria,
+        sa.func.sum(compras.c.quantidade * compras.c.valor_unitario)
+    ).group_by(compras.c.user_id, ano, mes, categoria)
+    op.execute(gastos_mensais.insert().from_select(['user_id', 'ano', 'mes', 'categoria', 'total'], agregado))
+
+
+def downgrade():
+    op.drop_table('gastos_mensais')
@@ -0,0 +1,49 @@
+"""exclusão em cascata
+
+Recria as chaves estrangeiras para users.id (e categorias.parent_id) com
+ON DELETE CASCADE, para que excluir um usuário seja um único DELETE no banco.
+
+Revision ID: 9e3b5d7f1c28
+Revises: 4a8e6c1f3b27
+Create Date: 2026-10-16 19:02:47.118530
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b5d7f1c28'
+down_revision = '4a8e6c1f3b27'
+branch_labels = None
+depends_on = None
+
+# Mesmo padrão de nomes que o Postgres usa nas FKs sem nome; no SQLite o batch
+# recria a tabela e precisa desse padrão para achar as FKs refletidas
+CONVENCAO_DE_NOMES = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+CHAVES_ESTRANGEIRAS = [
+    ('receitas', 'user_id', 'users'),
+    ('compras', 'user_id', 'users'),
+    ('custos_fixos', 'user_id', 'users'),
+    ('categorias', 'user_id', 'users'),
+    ('categorias', 'parent_id', 'categorias'),
+    ('gastos_mensais', 'user_id', 'users'),
+    ('jobs_processamento', 'user_id', 'users'),
+    ('notas_importadas', 'user_id', 'users'),
+]
+
+
+def _recriar_chaves_estrangeiras(ondelete):
+    for tabela, coluna, referida in CHAVES_ESTRANGEIRAS:
+        with op.batch_alter_table(tabela, schema=None, naming_convention=CONVENCAO_DE_NOMES) as batch_op:
+            nome = f'{tabela}_{coluna}_fkey'
+            batch_op.drop_constraint(nome, type_='foreignkey')
+            batch_op.create_foreign_key(nome, referida, [coluna], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _recriar_chaves_estrangeiras('CASCADE')
+
+
+def downgrade():
+    _recriar_chaves_estrangeiras(None)
@@ -0,0 +1,29 @@
+"""versoes_colecoes
+
+Revision ID: b6d1f3a8e2c5
+Revises: 9e3b5d7f1c28
+Create Date: 2026-10-16 20:14:05.392817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f3a8e2c5'
+down_revision = '9e3b5d7f1c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('versoes_colecoes',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('colecao', sa.String(length=30), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'colecao')
+    )
+
+
+def downgrade():
+    op.drop_table('versoes_colecoes')
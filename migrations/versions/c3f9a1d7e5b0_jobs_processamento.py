@@ -0,0 +1,34 @@
+"""jobs de processamento
+
+Revision ID: c3f9a1d7e5b0
+Revises: 8c4d2f6e1a73
+Create Date: 2026-10-16 13:05:44.270918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a1d7e5b0'
+down_revision = '8c4d2f6e1a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs_processamento',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('resultado', sa.Text(), nullable=True),
+    sa.Column('erro', sa.String(length=255), nullable=True),
+    sa.Column('criado_em', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('jobs_processamento')
@@ -0,0 +1,75 @@
+"""valores em numeric
+
+Troca as colunas de dinheiro e quantidade de Float para Numeric (valores exatos)
+e reconstrói gastos_mensais a partir das compras, eliminando o arredondamento
+acumulado pelos incrementos em ponto flutuante.
+
+Revision ID: d4a7c9e1b3f6
+Revises: b6d1f3a8e2c5
+Create Date: 2026-10-16 21:03:52.640981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c9e1b3f6'
+down_revision = 'b6d1f3a8e2c5'
+branch_labels = None
+depends_on = None
+
+# (tabela, coluna, tipo Numeric)
+COLUNAS = [
+    ('receitas', 'valor', sa.Numeric(12, 2)),
+    ('compras', 'quantidade', sa.Numeric(12, 3)),
+    ('compras', 'valor_unitario', sa.Numeric(12, 2)),
+    ('custos_fixos', 'valor', sa.Numeric(12, 2)),
+    ('gastos_mensais', 'total', sa.Numeric(16, 5)),
+]
+
+
+def _reconstruir_gastos_mensais():
+    compras = sa.table('compras',
+        sa.column('user_id', sa.Integer()),
+        sa.column('quantidade', sa.Numeric(12, 3)),
+        sa.column('valor_unitario', sa.Numeric(12, 2)),
+        sa.column('data', sa.Date()),
+        sa.column('categoria', sa.String()),
+    )
+    gastos_mensais = sa.table('gastos_mensais',
+        sa.column('user_id', sa.Integer()),
+        sa.column('ano', sa.Integer()),
+        sa.column('mes', sa.Integer()),
+        sa.column('categoria', sa.String()),
+        sa.column('total', sa.Numeric(16, 5)),
+    )
+    ano = sa.cast(sa.extract('year', compras.c.data), sa.Integer())
+    mes = sa.cast(sa.extract('month', compras.c.data), sa.Integer())
+    categoria = sa.func.coalesce(sa.func.nullif(compras.c.categoria, ''), 'Não Categorizado')
+    agregado = sa.select(
+        compras.c.user_id, ano, mes, categoria,
+        sa.func.sum(compras.c.quantidade * compras.c.valor_unitario)
+    ).group_by(compras.c.user_id, ano, mes, categoria)
+    op.execute(gastos_mensais.delete())
+    op.execute(gastos_mensais.insert().from_select(['user_id', 'ano', 'mes', 'categoria', 'total'], agregado))
+
+
+def upgrade():
+    for tabela, coluna, tipo in COLUNAS:
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            batch_op.alter_column(coluna,
+                   existing_type=sa.Float(),
+                   type_=tipo,
+                   existing_nullable=False,
+                   postgresql_using=f"round({coluna}::numeric, {tipo.scale})")
+    _reconstruir_gastos_mensais()
+
+
+def downgrade():
+    for tabela, coluna, tipo in COLUNAS:
+        with op.batch_alter_table(tabela, schema=None) as batch_op:
+            batch_op.alter_column(coluna,
+                   existing_type=tipo,
+                   type_=sa.Float(),
+                   existing_nullable=False)
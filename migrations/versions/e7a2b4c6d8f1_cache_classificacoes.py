@@ -0,0 +1,29 @@
+"""cache de classificações
+
+Revision ID: e7a2b4c6d8f1
+Revises: c3f9a1d7e5b0
+Create Date: 2026-10-16 14:22:18.533067
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2b4c6d8f1'
+down_revision = 'c3f9a1d7e5b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_classificacoes',
+    sa.Column('chave', sa.String(length=200), nullable=False),
+    sa.Column('contexto', sa.String(length=200), nullable=False),
+    sa.Column('valor', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('chave', 'contexto')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_classificacoes')
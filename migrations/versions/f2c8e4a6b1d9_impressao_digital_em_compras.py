@@ -0,0 +1,31 @@
+"""impressao digital em compras
+
+Guarda o sha256 dos lançamentos importados de extratos (OFX/CSV) e impede,
+pelo índice único (user_id, fingerprint), que o mesmo lançamento entre duas vezes.
+
+Revision ID: f2c8e4a6b1d9
+Revises: d4a7c9e1b3f6
+Create Date: 2026-10-16 22:41:17.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8e4a6b1d9'
+down_revision = 'd4a7c9e1b3f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('compras', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_compras_user_id_fingerprint', ['user_id', 'fingerprint'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('compras', schema=None) as batch_op:
+        batch_op.drop_index('ix_compras_user_id_fingerprint')
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,119 @@
+import numpy as np
+
+# Período em meses de cada tipo de recorrência aceito por cada modelo
+PERIODOS_CUSTO_FIXO = {'mensal': 1, 'bimestral': 2, 'trimestral': 3, 'semestral': 6, 'anual': 12}
+PERIODOS_RECEITA = {'mensal': 1, 'anual': 12}
+
+
+def indice_do_mes(mes, ano):
+    # Número absoluto do mês (ano * 12 + mes - 1), base de toda a aritmética modular
+    return ano * 12 + (mes - 1)
+
+
+def meses_do_intervalo(mes_inicio, ano_inicio, mes_fim, ano_fim):
+    # Lista [(mes, ano), ...] do intervalo fechado entre os dois meses
+    inicio, fim = indice_do_mes(mes_inicio, ano_inicio), indice_do_mes(mes_fim, ano_fim)
+    return [(indice % 12 + 1, indice // 12) for indice in range(inicio, fim + 1)]
+
+
+def _indice_de_inicio(mes, ano):
+    if mes is None or ano is None or not 1 <= mes <= 12:
+        return None
+    return indice_do_mes(mes, ano)
+
+
+def _indice_data_unica(data_unica):
+    try:
+        _, mes, ano = map(int, data_unica.split('/'))
+    except (AttributeError, ValueError):
+        return -1
+    return indice_do_mes(mes, ano) if 1 <= mes <= 12 else -1
+
+
+def _matriz(inicios, periodos, unicos, meses):
+    alvos = np.array([indice_do_mes(mes, ano) for mes, ano in meses], dtype=np.int64)
+    inicios = np.asarray(inicios, dtype=np.int64).reshape(-1, 1)
+    periodos = np.asarray(periodos, dtype=np.int64).reshape(-1, 1)
+    unicos = np.asarray(unicos, dtype=np.int64).reshape(-1, 1)
+    diferenca = alvos[None, :] - inicios
+    recorrente = (periodos > 0) & (diferenca >= 0) & (diferenca % np.maximum(periodos, 1) == 0)
+    return recorrente | (unicos == alvos[None, :])
+
+
+def matriz_custos_fixos(custos, meses):
+    """Matriz booleana (custos x meses): True onde o custo fixo entra no mês."""
+    inicios, periodos = [], []
+    for custo in custos:
+        inicio = _indice_de_inicio(custo.mes_de_inicio, custo.ano_de_inicio)
+        periodo = PERIODOS_CUSTO_FIXO.get(custo.tipo_recorrencia, 0)
+        inicios.append(inicio if inicio is not None else 0)
+        periodos.append(periodo if inicio is not None else 0)
+    return _matriz(inicios, periodos, [-1] * len(custos), meses)
+
+
+def matriz_receitas(receitas, meses):
+    """Matriz booleana (receitas x meses): True onde a receita entra no mês."""
+    inicios, periodos, unicos = [], [], []
+    for receita in receitas:
+        if receita.tipo_recorrencia == 'unico':
+            inicios.append(0)
+            periodos.append(0)
+            unicos.append(_indice_data_unica(receita.data_unica))
+            continue
+        inicio = _indice_de_inicio(receita.mes_de_inicio, receita.ano_de_inicio)
+        periodo = PERIODOS_RECEITA.get(receita.tipo_recorrencia, 0)
+        inicios.append(inicio if inicio is not None else 0)
+        periodos.append(periodo if inicio is not None else 0)
+        unicos.append(-1)
+    return _matriz(inicios, periodos, unicos, meses)
+
+
+def filtrar_do_mes(templates, matriz, coluna=0):
+    # Templates cuja linha da matriz é verdadeira na coluna (mês) indicada
+    return [template for template, incluir in zip(templates, matriz[:, coluna]) if incluir]
+
+
+def somar_por_mes(valores, matriz):
+    # Vetor (meses,) com a soma dos valores (inteiros, ex.: centavos) dos templates ativos em cada mês
+    return np.asarray(valores, dtype=np.int64) @ matriz.astype(np.int64)
+
+
+def somar_por_grupo_e_mes(grupos, valores, matriz):
+    """{grupo: vetor (meses,)} com a soma por mês dos templates de cada grupo (ex.: categoria)."""
+    if not len(valores):
+        return {}
+    nomes, indices = np.unique(np.asarray(grupos, dtype=object), return_inverse=True)
+    por_grupo = np.zeros((len(nomes), len(valores)), dtype=np.int64)
+    por_grupo[indices, np.arange(len(valores))] = np.asarray(valores, dtype=np.int64)
+    return dict(zip(nomes, por_grupo @ matriz.astype(np.int64)))
+
+
+def _primeiros_dias(meses):
+    return np.array([f'{ano:04d}-{mes:02d}-01' for mes, ano in meses], dtype='datetime64[D]')
+
+
+def _dias_no_mes(primeiros_dias):
+    return ((primeiros_dias.astype('datetime64[M]') + 1).astype('datetime64[D]') - primeiros_dias).astype(np.int64)
+
+
+def calendario_diario(inicio, meses):
+    """Dias de `inicio` até o fim do último mês: (datas, coluna do mês de cada dia, dias no mês de cada dia)."""
+    primeiros_dias = _primeiros_dias(meses)
+    fim = (primeiros_dias[-1].astype('datetime64[M]') + 1).astype('datetime64[D]')
+    datas = np.arange(np.datetime64(inicio, 'D'), fim)
+    meses_dos_dias = datas.astype('datetime64[M]')
+    colunas = (meses_dos_dias - primeiros_dias[0].astype('datetime64[M]')).astype(np.int64)
+    return datas, colunas, _dias_no_mes(meses_dos_dias.astype('datetime64[D]'))
+
+
+def distribuir_nos_dias(dias_de_vencimento, valores, matriz, datas, meses):
+    """Vetor (dias,) com o valor (inteiro) de cada template lançado no dia de vencimento de cada mês ativo.
+
+    Vencimentos além do fim do mês caem no último dia (ex.: 31 em fevereiro); dias fora de `datas` são ignorados.
+    """
+    primeiros_dias = _primeiros_dias(meses)
+    dia = np.minimum(np.asarray(dias_de_vencimento, dtype=np.int64).reshape(-1, 1), _dias_no_mes(primeiros_dias)[None, :])
+    posicao = (primeiros_dias - datas[0]).astype(np.int64)[None, :] + dia - 1
+    valido = matriz & (posicao >= 0) & (posicao < len(datas))
+    valores_por_mes = np.broadcast_to(np.asarray(valores, dtype=np.int64).reshape(-1, 1), matriz.shape)
+    return np.bincount(posicao[valido], weights=valores_por_mes[valido], minlength=len(datas)).round().astype(np.int64)
@@ -0,0 +1,126 @@
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+# O app lê a configuração na importação: banco SQLite temporário e hash de senha barato
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'testes.db')
+os.environ.setdefault('JWT_SECRET_KEY', 'testes-' + '0' * 32)
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['PASSWORD_HASH_PROCESSOS'] = '0'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import api  # noqa: E402
+import dados  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def pytest_addoption(parser):
+    parser.addoption('--lento', action='store_true', help='roda também os testes marcados como lentos (volumes de produção)')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'lento: teste de volume, só roda com --lento')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--lento'): return
+    pular = pytest.mark.skip(reason='use --lento para rodar')
+    for item in items:
+        if 'lento' in item.keywords: item.add_marker(pular)
+
+
+@pytest.fixture
+def app():
+    with api.app.app_context():
+        api.db.create_all()
+        yield api.app
+        api.db.session.remove()
+        api.db.drop_all()
+    # Os caches do processo sobreviveriam ao banco recriado (ids e versões recomeçam do zero)
+    api._respostas_por_etag.clear()
+    api._classificadores.clear()
+    api._classificador_global.clear()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def cabecalhos(cliente):
+    cliente.post('/register', json={'email': 'teste@example.com', 'password': 'senha'})
+    token = cliente.post('/login', json={'email': 'teste@example.com', 'password': 'senha'}).json['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def ler_fixture(nome):
+    with open(os.path.join(FIXTURES, nome), encoding='utf-8') as arquivo:
+        return arquivo.read()
+
+
+def contar_comandos(funcao):
+    """Executa `funcao` e retorna (resultado, [SQL de cada comando enviado ao banco])."""
+    comandos = []
+    registrar = lambda conn, cursor, sql, *resto: comandos.append(sql)
+    event.listen(api.db.engine, 'before_cursor_execute', registrar)
+    try:
+        resultado = funcao()
+    finally:
+        event.remove(api.db.engine, 'before_cursor_execute', registrar)
+    return resultado, comandos
+
+
+class SefazLocal:
+    """Servidor HTTP local no lugar da SEFAZ: responde pelo caminho com a query (ou só pelo caminho),
+    depois de `atraso` segundos, e registra as requisições e o instante de chegada."""
+
+    def __init__(self):
+        self.paginas = {}
+        self.requisicoes = []
+        self.instantes = []
+        self.atraso = 0
+        sefaz = self
+
+        class Manipulador(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                sefaz.requisicoes.append(self.path)
+                sefaz.instantes.append(time.monotonic())
+                time.sleep(sefaz.atraso)
+                status, cabecalhos, corpo = sefaz.paginas.get(self.path) or sefaz.paginas.get(self.path.split('?')[0], (404, {}, ''))
+                self.send_response(status)
+                for nome, valor in dict({'Content-Type': 'text/html; charset=utf-8'}, **cabecalhos).items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.wfile.write(corpo.encode('utf-8'))
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+        self.servidor.daemon_threads = True
+        self.origem = f'http://127.0.0.1:{self.servidor.server_port}'
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def pagina(self, caminho, corpo, status=200, **cabecalhos):
+        self.paginas[caminho] = (status, cabecalhos, corpo)
+
+
+@pytest.fixture
+def sefaz_local(monkeypatch):
+    sefaz = SefazLocal()
+    monkeypatch.setattr(dados, 'NFCE_ORIGENS_PERMITIDAS', {sefaz.origem})
+    monkeypatch.setattr(dados, 'NFCE_INTERVALO_POR_HOST', 0)
+    monkeypatch.setattr(api, 'NFCE_URL_CONSULTA', sefaz.origem + '/consulta?chNFe={chave}')
+    dados.cache_nfce.clear()
+    yield sefaz
+    sefaz.servidor.shutdown()
+    sefaz.servidor.server_close()
+    dados.cache_nfce.clear()
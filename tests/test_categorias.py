@@ -0,0 +1,102 @@
+import pytest
+
+import api
+from conftest import contar_comandos
+
+
+def criar(cliente, cabecalhos, nome, parent_id=None):
+    resposta = cliente.post('/categorias', json={'nome': nome, 'pictogram': 1, 'parentId': parent_id}, headers=cabecalhos)
+    assert resposta.status_code == 201
+    return resposta.json['id']
+
+
+def arvore(cliente, cabecalhos, nomes=None):
+    # {nome: {filhos...}} só com as categorias pedidas (as padrão do cadastro ficam de fora)
+    def converter(nos):
+        return {no['nome']: converter(no['subcategorias']) for no in nos if nomes is None or no['nome'] in nomes}
+    return converter(cliente.get('/categorias/arvore', headers=cabecalhos).json)
+
+
+@pytest.fixture
+def globais(app):
+    # Catálogo global: Moradia > Energia
+    moradia = api.Categoria(nome='Moradia', pictogram=1, user_id=None)
+    api.db.session.add(moradia)
+    api.db.session.flush()
+    energia = api.Categoria(nome='Energia', pictogram=1, user_id=None, parent_id=moradia.id)
+    api.db.session.add(energia)
+    api.incrementar_versao(api.USUARIO_CATALOGO_GLOBAL, 'categorias')
+    api.db.session.commit()
+    return moradia.id, energia.id
+
+
+def test_arvore_e_movimentacao(cliente, cabecalhos):
+    a = criar(cliente, cabecalhos, 'A')
+    b = criar(cliente, cabecalhos, 'B', a)
+    c = criar(cliente, cabecalhos, 'C', b)
+    assert arvore(cliente, cabecalhos, {'A', 'B', 'C'}) == {'A': {'B': {'C': {}}}}
+
+    for destino in (a, b, c):
+        resposta = cliente.put(f'/categorias/{a}', json={'parentId': destino}, headers=cabecalhos)
+        assert resposta.status_code == 400, destino
+    assert cliente.put(f'/categorias/{a}', json={'parentId': 999999}, headers=cabecalhos).status_code == 404
+
+    assert cliente.put(f'/categorias/{b}', json={'parentId': None}, headers=cabecalhos).status_code == 200
+    assert arvore(cliente, cabecalhos, {'A', 'B', 'C'}) == {'A': {}, 'B': {'C': {}}}
+    assert cliente.put(f'/categorias/{a}', json={'parentId': c}, headers=cabecalhos).status_code == 200
+    assert arvore(cliente, cabecalhos, {'A', 'B', 'C'}) == {'B': {'C': {'A': {}}}}
+
+
+def test_excluir_subarvore_em_um_comando(cliente, cabecalhos):
+    a = criar(cliente, cabecalhos, 'A')
+    b = criar(cliente, cabecalhos, 'B', a)
+    criar(cliente, cabecalhos, 'C', b)
+    criar(cliente, cabecalhos, 'D')
+
+    resposta, comandos = contar_comandos(lambda: cliente.delete(f'/categorias/{a}', headers=cabecalhos))
+
+    assert resposta.status_code == 200
+    assert len([sql for sql in comandos if 'DELETE' in sql.upper()]) == 1, comandos
+    nomes = {c['nome'] for c in cliente.get('/categorias', headers=cabecalhos).json}
+    assert 'D' in nomes and not nomes & {'A', 'B', 'C'}
+
+
+def test_categoria_de_outro_usuario(cliente, cabecalhos):
+    cliente.post('/register', json={'email': 'outro@example.com', 'password': 'senha'})
+    outro = {'Authorization': 'Bearer ' + cliente.post('/login', json={'email': 'outro@example.com', 'password': 'senha'}).json['access_token']}
+    alheia = criar(cliente, outro, 'Alheia')
+    minha = criar(cliente, cabecalhos, 'Minha')
+    assert cliente.put(f'/categorias/{alheia}', json={'nome': 'x'}, headers=cabecalhos).status_code == 403
+    assert cliente.delete(f'/categorias/{alheia}', headers=cabecalhos).status_code == 403
+    assert cliente.put(f'/categorias/{minha}', json={'parentId': alheia}, headers=cabecalhos).status_code == 404
+
+
+def test_copia_de_global_nao_entra_na_propria_subarvore(cliente, cabecalhos, globais):
+    moradia, energia = globais
+    aluguel = criar(cliente, cabecalhos, 'Aluguel', moradia)  # filho do usuário pendurado na global
+    assert arvore(cliente, cabecalhos, {'Moradia', 'Energia', 'Aluguel'}) == {'Moradia': {'Energia': {}, 'Aluguel': {}}}
+
+    # Mover a global (que vira cópia nessa escrita) para baixo do próprio filho ou de um neto global é ciclo
+    for destino in (aluguel, energia, moradia):
+        resposta = cliente.put(f'/categorias/{moradia}', json={'parentId': destino}, headers=cabecalhos)
+        assert resposta.status_code == 400, destino
+    assert arvore(cliente, cabecalhos, {'Moradia', 'Energia', 'Aluguel'}) == {'Moradia': {'Energia': {}, 'Aluguel': {}}}
+
+    # A cópia já existente também não pode
+    assert cliente.put(f'/categorias/{moradia}', json={'nome': 'Minha moradia'}, headers=cabecalhos).status_code == 200
+    copia = next(c['id'] for c in cliente.get('/categorias', headers=cabecalhos).json if c['nome'] == 'Minha moradia')
+    assert cliente.put(f'/categorias/{copia}', json={'parentId': aluguel}, headers=cabecalhos).status_code == 400
+    assert arvore(cliente, cabecalhos, {'Minha moradia', 'Energia', 'Aluguel'}) == {'Minha moradia': {'Energia': {}, 'Aluguel': {}}}
+
+
+def test_excluir_global_oculta_so_para_o_usuario(cliente, cabecalhos, globais):
+    moradia, _ = globais
+    criar(cliente, cabecalhos, 'Aluguel', moradia)
+    assert cliente.delete(f'/categorias/{moradia}', headers=cabecalhos).status_code == 200
+    # A global some para o usuário junto com a subárvore; o filho dele pendurado na global é excluído
+    assert arvore(cliente, cabecalhos, {'Moradia', 'Energia', 'Aluguel'}) == {}
+    assert not {'Moradia', 'Aluguel'} & {c['nome'] for c in cliente.get('/categorias', headers=cabecalhos).json}
+
+    cliente.post('/register', json={'email': 'outro@example.com', 'password': 'senha'})
+    outro = {'Authorization': 'Bearer ' + cliente.post('/login', json={'email': 'outro@example.com', 'password': 'senha'}).json['access_token']}
+    assert arvore(cliente, outro, {'Moradia', 'Energia', 'Aluguel'}) == {'Moradia': {'Energia': {}}}
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import api
+
+
+def test_um_treino_por_modelo_com_threads_concorrentes(app, monkeypatch):
+    treinos = []
+    treinar_original = api.ClassificadorNaiveBayes.treinar
+
+    def treinar_devagar(self, exemplos):
+        treinos.append(threading.get_ident())
+        time.sleep(0.1)
+        return treinar_original(self, exemplos)
+
+    monkeypatch.setattr(api.ClassificadorNaiveBayes, 'treinar', treinar_devagar)
+    api._classificadores.clear()
+    api._classificador_global.clear()
+    barreira = threading.Barrier(8)
+    erros = []
+
+    def requisicao():
+        try:
+            with app.app_context():
+                barreira.wait()
+                api.obter_classificador(1)
+        except Exception as erro:
+            erros.append(erro)
+
+    threads = [threading.Thread(target=requisicao) for _ in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+
+    assert not erros
+    # Um treino do modelo do usuário e um do global, não um por thread
+    assert len(treinos) == 2
+    assert not api._treinos_em_andamento
+
+
+def test_global_nao_sai_do_cache_com_rotatividade_de_usuarios(app, monkeypatch):
+    monkeypatch.setattr(api, '_classificadores', api.TTLCache(maxsize=2, ttl=api.CLASSIFICADOR_TTL))
+    api._classificador_global.clear()
+    api.obter_classificador(1)
+    global_ = api._classificador_global[('global',)]
+    for user_id in range(2, 6):
+        api.obter_classificador(user_id)
+    assert api._classificador_global[('global',)] is global_
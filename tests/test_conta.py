@@ -0,0 +1,62 @@
+import tracemalloc
+from datetime import date, timedelta
+
+import api
+from conftest import contar_comandos
+
+QUANTIDADE_COMPRAS = 100000
+# Pico de memória Python do DELETE /conta: com o CASCADE do banco não depende do histórico
+PICO_MAXIMO_BYTES = 1024 * 1024
+
+
+def criar_historico(cliente, cabecalhos):
+    cliente.post('/custos-fixos', json={'nome': 'Aluguel', 'valor': 1500, 'categoria': 'Casa', 'tipoRecorrencia': 'mensal',
+                                        'diaDoMes': 5, 'mesDeInicio': 1, 'anoDeInicio': 2020}, headers=cabecalhos)
+    cliente.post('/receitas', json={'descricao': 'Salário', 'valor': 5000, 'tipoRecorrencia': 'mensal', 'diaDoMes': 5,
+                                    'mesDeInicio': 1, 'anoDeInicio': 2020}, headers=cabecalhos)
+    user_id = api.User.query.filter_by(email='teste@example.com').one().id
+    inicio = date(2020, 1, 1)
+    for deslocamento in range(0, QUANTIDADE_COMPRAS, api.TAMANHO_LOTE_INSERCAO):
+        api.db.session.execute(api.db.insert(api.Compra), [
+            {'nome': f'Item {i}', 'quantidade': 1, 'valor_unitario': 9.9, 'categoria': 'Mercado',
+             'data': inicio + timedelta(days=i % 2000), 'user_id': user_id}
+            for i in range(deslocamento, deslocamento + api.TAMANHO_LOTE_INSERCAO)
+        ])
+    api.db.session.execute(api.db.insert(api.GastoMensal), [
+        {'user_id': user_id, 'ano': 2020 + mes // 12, 'mes': mes % 12 + 1, 'categoria': 'Mercado', 'total': 100} for mes in range(66)
+    ])
+    api.db.session.commit()
+    return user_id
+
+
+def linhas_do_usuario(user_id):
+    modelos = (api.Compra, api.GastoMensal, api.Categoria, api.CustoFixo, api.Receita, api.JobProcessamento, api.NotaImportada)
+    return {modelo.__tablename__: api.db.session.scalar(api.db.select(api.db.func.count()).select_from(modelo).where(modelo.user_id == user_id))
+            for modelo in modelos}
+
+
+def test_excluir_conta_com_100k_compras(cliente, cabecalhos):
+    user_id = criar_historico(cliente, cabecalhos)
+    assert linhas_do_usuario(user_id)['compras'] == QUANTIDADE_COMPRAS
+
+    tracemalloc.start()
+    try:
+        resposta, comandos = contar_comandos(lambda: cliente.delete('/conta', json={'password': 'senha'}, headers=cabecalhos))
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert resposta.status_code == 200
+    # Um único DELETE (users); as linhas filhas saem pelo ON DELETE CASCADE, sem SELECT nem DELETE por tabela
+    assert [sql for sql in comandos if sql.lstrip().upper().startswith('DELETE')] == ['DELETE FROM users WHERE users.id = ?']
+    assert len(comandos) <= 6, comandos
+    assert pico < PICO_MAXIMO_BYTES
+    api.db.session.expire_all()
+    assert api.db.session.get(api.User, user_id) is None
+    assert set(linhas_do_usuario(user_id).values()) == {0}
+
+
+def test_excluir_conta_exige_a_senha(cliente, cabecalhos):
+    assert cliente.delete('/conta', json={'password': 'errada'}, headers=cabecalhos).status_code == 401
+    assert cliente.delete('/conta', json={}, headers=cabecalhos).status_code == 401
+    assert api.User.query.filter_by(email='teste@example.com').count() == 1
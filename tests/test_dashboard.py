@@ -0,0 +1,35 @@
+from datetime import date
+
+from conftest import contar_comandos
+
+# Gastos variáveis dos dois meses (um agregado), receitas e custos fixos: cada conjunto lido uma vez
+MAXIMO_COMANDOS_DASHBOARD = 3
+
+
+def test_dashboard_limita_comandos_sql(cliente, cabecalhos):
+    hoje = date.today()
+    for dia in range(1, hoje.day + 1):
+        cliente.post('/compras', json={'nome': f'Item {dia}', 'quantidade': 2, 'valor_unitario': 5,
+                                       'data': date(hoje.year, hoje.month, dia).strftime('%d/%m/%Y'), 'categoria': 'Mercado'}, headers=cabecalhos)
+    for tipo in ('mensal', 'bimestral', 'anual'):
+        cliente.post('/custos-fixos', json={'nome': f'Conta {tipo}', 'valor': 100, 'categoria': 'Casa', 'tipoRecorrencia': tipo,
+                                            'diaDoMes': 28, 'mesDeInicio': hoje.month, 'anoDeInicio': hoje.year}, headers=cabecalhos)
+    cliente.post('/receitas', json={'descricao': 'Salário', 'valor': 5000, 'tipoRecorrencia': 'mensal', 'diaDoMes': 5,
+                                    'mesDeInicio': hoje.month, 'anoDeInicio': hoje.year}, headers=cabecalhos)
+
+    resposta, comandos = contar_comandos(lambda: cliente.get('/dashboard', headers=cabecalhos))
+
+    assert resposta.status_code == 200
+    assert len(comandos) <= MAXIMO_COMANDOS_DASHBOARD, comandos
+    assert resposta.json['totalVariavel'] == 10 * hoje.day
+    assert resposta.json['totalFixo'] == 300
+    assert resposta.json['totalReceitaMes'] == 5000
+    assert resposta.json['saldoMes'] == 5000 - 300 - 10 * hoje.day
+
+
+def test_dashboard_sem_dados(cliente, cabecalhos):
+    resposta, comandos = contar_comandos(lambda: cliente.get('/dashboard', headers=cabecalhos))
+    assert resposta.status_code == 200
+    assert len(comandos) <= MAXIMO_COMANDOS_DASHBOARD, comandos
+    assert resposta.json['totalGastoMes'] == 0
+    assert resposta.json['proximosCustosFixos'] == []
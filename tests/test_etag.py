@@ -0,0 +1,42 @@
+import api
+
+
+def registrar_e_entrar(cliente, email):
+    cliente.post('/register', json={'email': email, 'password': 'senha'})
+    token = cliente.post('/login', json={'email': email, 'password': 'senha'}).json['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_get_repetido_responde_304_e_escrita_muda_a_etag(cliente, cabecalhos):
+    primeira = cliente.get('/custos-fixos', headers=cabecalhos)
+    assert primeira.status_code == 200
+    etag = primeira.headers['ETag']
+    assert cliente.get('/custos-fixos', headers=dict(cabecalhos, **{'If-None-Match': etag})).status_code == 304
+    cliente.post('/custos-fixos', json={'nome': 'Luz', 'valor': 100, 'categoria': 'Casa', 'tipoRecorrencia': 'mensal',
+                                        'diaDoMes': 10, 'mesDeInicio': 1, 'anoDeInicio': 2025}, headers=cabecalhos)
+    nova = cliente.get('/custos-fixos', headers=dict(cabecalhos, **{'If-None-Match': etag}))
+    assert nova.status_code == 200
+    assert nova.headers['ETag'] != etag
+    assert [c['nome'] for c in nova.json] == ['Luz']
+
+
+def test_conta_nova_com_id_reaproveitado_nao_ve_dados_da_excluida(cliente):
+    antiga = registrar_e_entrar(cliente, 'antiga@example.com')
+    cliente.post('/custos-fixos', json={'nome': 'ALUGUEL SECRETO', 'valor': 3000, 'categoria': 'Casa', 'tipoRecorrencia': 'mensal',
+                                        'diaDoMes': 5, 'mesDeInicio': 1, 'anoDeInicio': 2025}, headers=antiga)
+    cliente.post('/receitas', json={'descricao': 'SALARIO SECRETO', 'valor': 9000, 'tipoRecorrencia': 'mensal', 'diaDoMes': 5,
+                                    'mesDeInicio': 1, 'anoDeInicio': 2025}, headers=antiga)
+    cliente.post('/categorias', json={'nome': 'CATEGORIA SECRETA'}, headers=antiga)
+    anteriores = {rota: cliente.get(rota, headers=antiga) for rota in ('/custos-fixos', '/receitas', '/categorias', '/categorias/arvore')}
+    assert 'SECRET' in anteriores['/custos-fixos'].get_data(as_text=True)
+    assert cliente.delete('/conta', json={'password': 'senha'}, headers=antiga).status_code == 200
+
+    nova = registrar_e_entrar(cliente, 'nova@example.com')
+    with api.app.app_context():
+        assert api.User.query.filter_by(email='nova@example.com').one().id == 1
+    for rota, anterior in anteriores.items():
+        resposta = cliente.get(rota, headers=nova)
+        assert resposta.status_code == 200
+        assert 'SECRET' not in resposta.get_data(as_text=True), rota
+        assert resposta.headers['ETag'] != anterior.headers['ETag'], rota
+        assert cliente.get(rota, headers=dict(nova, **{'If-None-Match': anterior.headers['ETag']})).status_code == 200
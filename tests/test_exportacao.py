@@ -0,0 +1,107 @@
+import csv
+import io
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+import api
+from extratos import COLUNAS_CSV, gerar_csv, gerar_ofx
+
+REGISTROS = [
+    {'id': 'C1', 'data': date(2025, 3, 1), 'descricao': 'Pão, "francês"', 'categoria': 'Alimentação', 'quantidade': Decimal('2.000'),
+     'valor_unitario': Decimal('0.75'), 'valor': Decimal('1.50'), 'tipo': 'compra'},
+    {'id': 'F7-202503', 'data': date(2025, 3, 5), 'descricao': 'Água & <esgoto> (Fixo)', 'categoria': None, 'quantidade': 1,
+     'valor_unitario': Decimal('80.00'), 'valor': Decimal('80.00'), 'tipo': 'fixo'},
+]
+
+
+def test_gerar_csv_cabecalho_e_escape():
+    texto = ''.join(gerar_csv(iter(REGISTROS), tamanho_bloco=1))
+    linhas = list(csv.reader(io.StringIO(texto)))
+    assert linhas[0] == COLUNAS_CSV
+    assert linhas[1] == ['01/03/2025', 'Pão, "francês"', 'Alimentação', '2.000', '0.75', '1.50', 'compra']
+    assert linhas[2] == ['05/03/2025', 'Água & <esgoto> (Fixo)', '', '1', '80.00', '80.00', 'fixo']
+
+
+def test_gerar_csv_sem_registros_so_tem_cabecalho():
+    assert ''.join(gerar_csv(iter([]), tamanho_bloco=10)).splitlines() == [','.join(COLUNAS_CSV)]
+
+
+def test_gerar_ofx_e_xml_valido_com_debitos_e_saldo_negativo():
+    texto = ''.join(gerar_ofx(iter(REGISTROS), date(2025, 3, 1), date(2025, 3, 31), datetime(2025, 4, 1, tzinfo=timezone.utc), tamanho_bloco=1))
+    raiz = ET.fromstring(texto.split('?>', 2)[2])
+    transacoes = raiz.findall('.//STMTTRN')
+    assert [t.findtext('TRNTYPE') for t in transacoes] == ['DEBIT', 'DEBIT']
+    assert [t.findtext('TRNAMT') for t in transacoes] == ['-1.50', '-80.00']
+    assert [t.findtext('DTPOSTED') for t in transacoes] == ['20250301', '20250305']
+    assert [t.findtext('NAME') for t in transacoes] == ['Pão, "francês"', 'Água & <esgoto> (Fixo)']
+    assert [t.findtext('MEMO') for t in transacoes] == ['Alimentação', None]
+    assert raiz.findtext('.//BANKTRANLIST/DTSTART') == '20250301'
+    assert raiz.findtext('.//LEDGERBAL/BALAMT') == '-81.50'
+
+
+def test_exportar_intercala_custos_fixos_por_data(cliente, cabecalhos):
+    for dia in (1, 10, 20):
+        cliente.post('/compras', json={'nome': f'Compra {dia}', 'quantidade': 1, 'valor_unitario': 10,
+                                       'data': f'{dia:02d}/03/2025', 'categoria': 'Mercado'}, headers=cabecalhos)
+    cliente.post('/custos-fixos', json={'nome': 'Luz', 'valor': 100, 'categoria': 'Casa', 'tipoRecorrencia': 'mensal',
+                                        'diaDoMes': 15, 'mesDeInicio': 1, 'anoDeInicio': 2025}, headers=cabecalhos)
+
+    # Cada resposta em streaming é lida antes da próxima requisição (o contexto fica aberto até o fim do corpo)
+    sem_fixos = cliente.get('/exportar?de=01/03/2025&ate=31/03/2025', headers=cabecalhos)
+    assert sem_fixos.headers['Content-Disposition'] == 'attachment; filename=compras.csv'
+    assert [linha[1] for linha in csv.reader(io.StringIO(sem_fixos.get_data(as_text=True)))][1:] == ['Compra 1', 'Compra 10', 'Compra 20']
+    com_fixos = cliente.get('/exportar?de=01/03/2025&ate=31/03/2025&fixos=1', headers=cabecalhos)
+    linhas = list(csv.reader(io.StringIO(com_fixos.get_data(as_text=True))))[1:]
+    assert [(linha[0], linha[1], linha[6]) for linha in linhas] == [
+        ('01/03/2025', 'Compra 1', 'compra'), ('10/03/2025', 'Compra 10', 'compra'),
+        ('15/03/2025', 'Luz (Fixo)', 'fixo'), ('20/03/2025', 'Compra 20', 'compra'),
+    ]
+
+
+def test_exportar_valida_parametros(cliente, cabecalhos):
+    assert cliente.get('/exportar?formato=xls', headers=cabecalhos).status_code == 400
+    assert cliente.get('/exportar?de=31/02/2025', headers=cabecalhos).status_code == 400
+    assert cliente.get('/exportar?de=10/03/2025&ate=01/03/2025', headers=cabecalhos).status_code == 400
+
+
+def inserir_compras_sinteticas(quantidade):
+    user_id = api.User.query.filter_by(email='teste@example.com').one().id
+    inicio = date(2000, 1, 1)
+    for deslocamento in range(0, quantidade, api.TAMANHO_LOTE_INSERCAO * 10):
+        api.db.session.execute(api.db.insert(api.Compra), [
+            {'nome': f'Item sintético {i}', 'quantidade': 1, 'valor_unitario': 9.9, 'categoria': 'Mercado',
+             'data': inicio + timedelta(days=i * 9000 // quantidade), 'user_id': user_id}
+            for i in range(deslocamento, min(deslocamento + api.TAMANHO_LOTE_INSERCAO * 10, quantidade))
+        ])
+    api.db.session.commit()
+
+
+def picos_da_exportacao(cliente, cabecalhos, formato, linhas):
+    # Pico de memória Python (bytes) ao passar por 10% e por 100% das linhas exportadas
+    tracemalloc.start()
+    try:
+        resposta = cliente.get(f'/exportar?formato={formato}', headers=cabecalhos, buffered=False)
+        lidas, pico_10 = 0, None
+        for pedaco in resposta.response:
+            lidas += pedaco.count(b'\n')
+            if pico_10 is None and lidas >= linhas // 10:
+                pico_10 = tracemalloc.get_traced_memory()[1]
+        resposta.close()
+        return resposta.status_code, lidas, pico_10, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('linhas', [50000, pytest.param(1000000, marks=pytest.mark.lento)])
+@pytest.mark.parametrize('formato', ['csv', 'ofx'])
+def test_memoria_da_exportacao_nao_cresce_com_o_historico(cliente, cabecalhos, formato, linhas):
+    inserir_compras_sinteticas(linhas)
+    status, lidas, pico_10, pico_final = picos_da_exportacao(cliente, cabecalhos, formato, linhas)
+    assert status == 200
+    assert lidas >= linhas
+    # Entre 10% e 100% das linhas o pico fica estável: o cursor do servidor entrega lotes de tamanho fixo
+    assert pico_final <= pico_10 + 256 * 1024, (pico_10, pico_final)
@@ -0,0 +1,76 @@
+import io
+import threading
+import time
+
+import api
+
+ITENS = [{'nome': 'PAO FRANCES', 'quantidade': 2, 'valor_unitario': 0.75}, {'nome': 'LEITE INTEGRAL', 'quantidade': 1, 'valor_unitario': 4.99}]
+
+
+def enviar_imagem(cliente, cabecalhos):
+    return cliente.post('/processar_imagem?assincrono=1', data={'comprovante': (io.BytesIO(b'imagem'), 'cupom.jpg')},
+                        headers=cabecalhos, content_type='multipart/form-data')
+
+
+def aguardar_job(cliente, cabecalhos, job_id, limite=5):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        job = cliente.get(f'/jobs/{job_id}', headers=cabecalhos).json
+        if job['status'] in ('concluido', 'erro'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job {job_id} não terminou')
+
+
+def test_job_assincrono_grava_as_compras(cliente, cabecalhos, monkeypatch):
+    # Vision/Gemini substituídos por um extrator fixo
+    imagens = []
+    monkeypatch.setattr(api, 'analisar_imagem_comprovante', lambda conteudo: imagens.append(conteudo) or
+                        {'data': '12/03/2025', 'itens_comprados': [dict(item) for item in ITENS]})
+
+    resposta = enviar_imagem(cliente, cabecalhos)
+    assert resposta.status_code == 202
+    job = aguardar_job(cliente, cabecalhos, resposta.json['jobId'])
+
+    assert job['status'] == 'concluido'
+    assert [item['nome'] for item in job['resultado']['itens_comprados']] == ['PAO FRANCES', 'LEITE INTEGRAL']
+    assert imagens == [b'imagem']
+    with api.app.app_context():
+        compras = api.Compra.query.order_by(api.Compra.id).all()
+        assert [(c.nome, float(c.quantidade), float(c.valor_unitario), c.data.isoformat()) for c in compras] == [
+            ('PAO FRANCES', 2.0, 0.75, '2025-03-12'), ('LEITE INTEGRAL', 1.0, 4.99, '2025-03-12')]
+
+
+def test_job_com_falha_na_extracao_termina_com_erro(cliente, cabecalhos, monkeypatch):
+    monkeypatch.setattr(api, 'analisar_imagem_comprovante', lambda conteudo: None)
+    job = aguardar_job(cliente, cabecalhos, enviar_imagem(cliente, cabecalhos).json['jobId'])
+    assert job['status'] == 'erro'
+    assert job['erro'] == 'Não foi possível extrair dados da imagem.'
+
+
+def test_job_de_outro_usuario_nao_e_encontrado(cliente, cabecalhos, monkeypatch):
+    monkeypatch.setattr(api, 'analisar_imagem_comprovante', lambda conteudo: None)
+    job_id = enviar_imagem(cliente, cabecalhos).json['jobId']
+    aguardar_job(cliente, cabecalhos, job_id)
+    cliente.post('/register', json={'email': 'outro@example.com', 'password': 'senha'})
+    outro = {'Authorization': 'Bearer ' + cliente.post('/login', json={'email': 'outro@example.com', 'password': 'senha'}).json['access_token']}
+    assert cliente.get(f'/jobs/{job_id}', headers=outro).status_code == 404
+    assert cliente.get('/jobs/inexistente', headers=cabecalhos).status_code == 404
+
+
+def test_fila_cheia_responde_503(cliente, cabecalhos, monkeypatch):
+    liberar = threading.Event()
+    monkeypatch.setattr(api, '_vagas_jobs', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(api, 'analisar_imagem_comprovante', lambda conteudo: liberar.wait(5) and None)
+
+    primeiro = enviar_imagem(cliente, cabecalhos)
+    segundo = enviar_imagem(cliente, cabecalhos)
+    liberar.set()
+
+    assert primeiro.status_code == 202
+    assert segundo.status_code == 503
+    aguardar_job(cliente, cabecalhos, primeiro.json['jobId'])
+    # A vaga volta quando o job termina
+    terceiro = enviar_imagem(cliente, cabecalhos)
+    assert terceiro.status_code == 202
+    aguardar_job(cliente, cabecalhos, terceiro.json['jobId'])
@@ -0,0 +1,65 @@
+import time
+
+import api
+import dados
+from conftest import ler_fixture
+
+CHAVES = [f'4325039301500600011365001000000{i:03d}1000001230' for i in range(1, 5)]
+
+
+def test_lote_importa_em_paralelo_e_relata_cada_chave(sefaz_local, cliente, cabecalhos, monkeypatch):
+    monkeypatch.setattr(api, 'NFCE_LOTE_WORKERS', 4)
+    sefaz_local.atraso = 0.3
+    # CHAVES[3] fica sem página (404): erro só dessa nota, as outras entram
+    for chave in CHAVES[:3]:
+        sefaz_local.pagina(f'/consulta?chNFe={chave}', ler_fixture('nfce_svrs.html'))
+    notas = [
+        CHAVES[0],
+        f'https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p={CHAVES[1]}|2|1|1|ABC',
+        CHAVES[2],
+        CHAVES[3],
+        CHAVES[0],
+        '123',
+        'http://127.0.0.1/admin',
+    ]
+
+    inicio = time.monotonic()
+    resposta = cliente.post('/processar_notas/lote', json={'notas': notas}, headers=cabecalhos)
+    duracao = time.monotonic() - inicio
+
+    assert resposta.status_code == 200
+    assert [r['status'] for r in resposta.json['resultados']] == ['importada', 'importada', 'importada', 'erro', 'duplicada', 'invalida', 'invalida']
+    assert resposta.json['importadas'] == 3
+    assert resposta.json['itensInseridos'] == 6
+    # Quatro consultas de 0,3 s em paralelo, sempre montadas a partir da chave
+    assert duracao < 4 * sefaz_local.atraso
+    assert sorted(sefaz_local.requisicoes) == sorted(f'/consulta?chNFe={chave}' for chave in CHAVES)
+    with api.app.app_context():
+        assert api.db.session.scalar(api.db.select(api.db.func.count()).select_from(api.Compra)) == 6
+
+
+def test_lote_ignora_chaves_ja_importadas(sefaz_local, cliente, cabecalhos):
+    sefaz_local.pagina('/consulta', ler_fixture('nfce_svrs.html'))
+    primeira = cliente.post('/processar_notas/lote', json={'notas': CHAVES[:2]}, headers=cabecalhos)
+    assert [r['status'] for r in primeira.json['resultados']] == ['importada', 'importada']
+    sefaz_local.requisicoes.clear()
+
+    segunda = cliente.post('/processar_notas/lote', json={'notas': CHAVES[:3]}, headers=cabecalhos)
+    assert [r['status'] for r in segunda.json['resultados']] == ['duplicada', 'duplicada', 'importada']
+    assert sefaz_local.requisicoes == [f'/consulta?chNFe={CHAVES[2]}']
+
+
+def test_lote_respeita_intervalo_por_host(sefaz_local, cliente, cabecalhos, monkeypatch):
+    monkeypatch.setattr(dados, 'NFCE_INTERVALO_POR_HOST', 0.2)
+    monkeypatch.setattr(dados, '_proximo_horario_por_host', {})
+    sefaz_local.pagina('/consulta', ler_fixture('nfce_svrs.html'))
+    cliente.post('/processar_notas/lote', json={'notas': CHAVES}, headers=cabecalhos)
+    instantes = sorted(sefaz_local.instantes)
+    assert len(instantes) == len(CHAVES)
+    assert min(b - a for a, b in zip(instantes, instantes[1:])) >= 0.15
+
+
+def test_lote_valida_entrada(cliente, cabecalhos):
+    assert cliente.post('/processar_notas/lote', json={'notas': []}, headers=cabecalhos).status_code == 400
+    grande = cliente.post('/processar_notas/lote', json={'notas': CHAVES * api.MAXIMO_NOTAS_POR_LOTE}, headers=cabecalhos)
+    assert grande.status_code == 413
@@ -0,0 +1,80 @@
+import pytest
+
+import dados
+from conftest import ler_fixture
+
+CHAVE = '43250393015006000113650010000001231000001230'
+
+
+def test_interpretar_pagina_nfce_do_portal_svrs():
+    nota = dados.interpretar_pagina_nfce(ler_fixture('nfce_svrs.html'))
+    assert nota['estabelecimento'] == 'COMPANHIA ZAFFARI COMERCIO E INDUSTRIA'
+    assert nota['data'] == '12/03/2025'
+    assert nota['chave'] == CHAVE
+    assert nota['valor_total'] == 53.82
+    assert nota['itens_comprados'] == [
+        {'nome': 'ARROZ TIO JOAO 5KG', 'quantidade': 2.0, 'valor_unitario': 24.9},
+        {'nome': 'BANANA PRATA KG', 'quantidade': 0.575, 'valor_unitario': 6.99},
+    ]
+
+
+def test_interpretar_pagina_sem_tabela_de_itens():
+    assert dados.interpretar_pagina_nfce(ler_fixture('nfce_rs_iframe.html')) is None
+
+
+@pytest.mark.parametrize('url, chave', [
+    (f'https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p={CHAVE}|2|1|1|ABCDEF', CHAVE),
+    (f'https://www.sefaz.rs.gov.br/NFCON/consultanfce.aspx?chNFe={CHAVE}', CHAVE),
+    ('https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=123|2|1', None),
+])
+def test_extrair_chave_acesso(url, chave):
+    assert dados.extrair_chave_acesso(url) == chave
+
+
+def test_segue_iframe_e_guarda_no_cache_pela_chave(sefaz_local):
+    sefaz_local.pagina('/consulta', ler_fixture('nfce_rs_iframe.html'))
+    sefaz_local.pagina('/danfe', ler_fixture('nfce_svrs.html'))
+    url = f'{sefaz_local.origem}/consulta?chNFe={CHAVE}'
+
+    primeira = dados.extrair_dados_nota_fiscal(url)
+    segunda = dados.extrair_dados_nota_fiscal(url)
+
+    assert [item['nome'] for item in primeira['itens_comprados']] == ['ARROZ TIO JOAO 5KG', 'BANANA PRATA KG']
+    assert segunda['itens_comprados'] == primeira['itens_comprados']
+    assert [caminho.split('?')[0] for caminho in sefaz_local.requisicoes] == ['/consulta', '/danfe']
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1:1/consulta',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://www.sefaz.rs.gov.br/NFCON/consultanfce.aspx',
+    'https://www.sefaz.rs.gov.br.exemplo.com/NFCON/consultanfce.aspx',
+    'https://www.sefaz.rs.gov.br@exemplo.com/NFCON/consultanfce.aspx',
+])
+def test_origens_nao_permitidas_sao_recusadas(url):
+    with pytest.raises(dados.UrlNaoPermitida):
+        dados.baixar_pagina_nfce(url)
+
+
+def test_nao_segue_iframe_nem_redirecionamento_para_outra_origem(sefaz_local):
+    sefaz_local.pagina('/iframe', '<html><body><iframe src="http://169.254.169.254/latest/meta-data/"></iframe></body></html>')
+    sefaz_local.pagina('/redireciona', '', status=302, Location='http://localhost:1/admin')
+    with pytest.raises(dados.UrlNaoPermitida):
+        dados.baixar_pagina_nfce(sefaz_local.origem + '/iframe')
+    with pytest.raises(dados.UrlNaoPermitida):
+        dados.baixar_pagina_nfce(sefaz_local.origem + '/redireciona')
+    assert dados.extrair_dados_nota_fiscal(f'{sefaz_local.origem}/iframe?chNFe={CHAVE}') is None
+
+
+def test_processar_nota_consulta_pela_chave_e_nao_pela_url_do_cliente(sefaz_local, cliente, cabecalhos):
+    sefaz_local.pagina('/consulta', ler_fixture('nfce_svrs.html'))
+
+    resposta = cliente.post('/processar_nota', json={'url': f'http://169.254.169.254/latest?chNFe={CHAVE}'}, headers=cabecalhos)
+    assert resposta.status_code == 200
+    assert sefaz_local.requisicoes == [f'/consulta?chNFe={CHAVE}']
+    assert len(cliente.get('/compras?mes=3&ano=2025', headers=cabecalhos).json) == 2
+
+    repetida = cliente.post('/processar_nota', json={'url': f'https://www.sefaz.rs.gov.br/NFCON/consultanfce.aspx?chNFe={CHAVE}'}, headers=cabecalhos)
+    assert repetida.status_code == 409
+    sem_chave = cliente.post('/processar_nota', json={'url': 'http://127.0.0.1/admin'}, headers=cabecalhos)
+    assert sem_chave.status_code == 400
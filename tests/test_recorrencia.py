@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+
+import api
+from recorrencia import matriz_custos_fixos, matriz_receitas, meses_do_intervalo, PERIODOS_CUSTO_FIXO, PERIODOS_RECEITA
+
+# Cinco anos de meses alvo: cobre início antes, durante e depois de cada período
+MESES = meses_do_intervalo(1, 2023, 12, 2027)
+INICIOS = [(mes, ano) for ano in (2024, 2025) for mes in range(1, 13)]
+
+
+@pytest.mark.parametrize('tipo', list(PERIODOS_CUSTO_FIXO) + ['unico', 'desconhecido'])
+def test_matriz_custos_fixos_equivale_a_deve_incluir_custo_fixo(tipo):
+    custos = [SimpleNamespace(tipo_recorrencia=tipo, mes_de_inicio=mes, ano_de_inicio=ano) for mes, ano in INICIOS]
+    matriz = matriz_custos_fixos(custos, MESES)
+    assert matriz.shape == (len(custos), len(MESES))
+    for i, custo in enumerate(custos):
+        for j, (mes, ano) in enumerate(MESES):
+            assert matriz[i, j] == api.deve_incluir_custo_fixo(custo, mes, ano), (tipo, custo, mes, ano)
+
+
+@pytest.mark.parametrize('tipo', list(PERIODOS_RECEITA) + ['desconhecido'])
+def test_matriz_receitas_recorrentes_equivale_a_deve_incluir_receita(tipo):
+    receitas = [SimpleNamespace(tipo_recorrencia=tipo, mes_de_inicio=mes, ano_de_inicio=ano, data_unica=None) for mes, ano in INICIOS]
+    matriz = matriz_receitas(receitas, MESES)
+    for i, receita in enumerate(receitas):
+        for j, (mes, ano) in enumerate(MESES):
+            assert matriz[i, j] == api.deve_incluir_receita(receita, mes, ano), (tipo, receita, mes, ano)
+
+
+def test_matriz_receitas_unicas_equivale_a_deve_incluir_receita():
+    datas = ['05/03/2025', '31/12/2023', '1/1/2024', '01/13/2025', 'invalida', None]
+    receitas = [SimpleNamespace(tipo_recorrencia='unico', mes_de_inicio=None, ano_de_inicio=None, data_unica=data) for data in datas]
+    matriz = matriz_receitas(receitas, MESES)
+    for i, receita in enumerate(receitas):
+        for j, (mes, ano) in enumerate(MESES):
+            assert matriz[i, j] == api.deve_incluir_receita(receita, mes, ano), (receita, mes, ano)
+
+
+def test_matrizes_vazias():
+    assert matriz_custos_fixos([], MESES).shape == (0, len(MESES))
+    assert matriz_receitas([], MESES).shape == (0, len(MESES))